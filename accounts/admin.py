@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from accounts.models import User, Profile
+from accounts.models import User, Profile, DataExport, DeletionJob
 
 # Register your models here.
 class CustomUserAdmin(UserAdmin):
@@ -32,4 +32,19 @@ class ProfileAdmin(admin.ModelAdmin):
         return request.user.is_staff
     
     def has_delete_permission(self, request, obj=None):
-        return request.user.is_superuser
\ No newline at end of file
+        return request.user.is_superuser
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'object_id', 'status', 'step', 'deleted', 'total', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('object_id',)
+
+
+
+@admin.register(DataExport)
+class DataExportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'size', 'created_at', 'expires_at')
+    list_filter = ('status',)
+    search_fields = ('user__username',)
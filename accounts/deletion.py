@@ -0,0 +1,144 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from connections.models import Connection
+from groups.models import Group, GroupMembership
+from notifications.models import Notification
+from posts.models import Comment, CommentReaction, Hashtag, Post, PostMedia, Reaction, SavedPost, SharedPost, SharedPostComment, SharedPostCommentReaction, SharedPostReaction
+from stories.models import Story, StoryReaction, StoryView
+from .models import BlockedUser, DeletionJob, Profile, User
+
+logger = logging.getLogger(__name__)
+
+
+def get_post_steps(posts):
+    """
+    Steps removing `posts` (a Post queryset, tombstones included), leaves
+    first, so deleting a batch never cascades into a large subtree
+    """
+
+    return [
+        ('comment_reactions', CommentReaction.objects.filter(comment__post__in=posts)),
+        # Newest first: replies go before the comments they answer
+        ('comments', Comment.objects.filter(post__in=posts).order_by('-id')),
+        ('reactions', Reaction.objects.filter(post__in=posts)),
+        ('shared_post_comment_reactions', SharedPostCommentReaction.objects.filter(shared_post_comment__shared_post__original_post__in=posts)),
+        ('shared_post_comments', SharedPostComment.objects.filter(shared_post__original_post__in=posts)),
+        ('shared_post_reactions', SharedPostReaction.objects.filter(shared_post__original_post__in=posts)),
+        ('shared_posts', SharedPost.objects.filter(original_post__in=posts)),
+        ('saved_posts', SavedPost.objects.filter(post__in=posts)),
+        ('hashtag_links', Hashtag.posts.through.objects.filter(post__in=posts)),
+        ('media', PostMedia.objects.filter(post__in=posts)),
+        ('posts', posts),
+    ]
+
+
+def get_account_posts(user_id):
+    # Groups cascade with their creator, taking other members' group posts along
+    return Post.all_objects.filter(Q(user_id=user_id) | Q(group__created_by_id=user_id))
+
+
+def get_account_steps(user_id):
+    """
+    Steps removing an account: its posts (as for a post), then the user's
+    activity elsewhere. Deleting the user row last cascades whatever is left.
+    """
+
+    return get_post_steps(get_account_posts(user_id)) + [
+        ('own_comment_reactions', CommentReaction.objects.filter(user_id=user_id)),
+        ('own_comments', Comment.objects.filter(user_id=user_id).order_by('-id')),
+        ('own_reactions', Reaction.objects.filter(user_id=user_id)),
+        ('own_shared_post_comment_reactions', SharedPostCommentReaction.objects.filter(Q(user_id=user_id) | Q(shared_post_comment__shared_post__user_id=user_id))),
+        ('own_shared_post_comments', SharedPostComment.objects.filter(Q(user_id=user_id) | Q(shared_post__user_id=user_id))),
+        ('own_shared_post_reactions', SharedPostReaction.objects.filter(Q(user_id=user_id) | Q(shared_post__user_id=user_id))),
+        ('own_shared_posts', SharedPost.objects.filter(user_id=user_id)),
+        ('own_saved_posts', SavedPost.objects.filter(user_id=user_id)),
+        ('story_views', StoryView.objects.filter(Q(user_id=user_id) | Q(story__user_id=user_id))),
+        ('story_reactions', StoryReaction.objects.filter(Q(user_id=user_id) | Q(story__user_id=user_id))),
+        ('stories', Story.objects.filter(user_id=user_id)),
+        ('notifications', Notification.objects.filter(user_id=user_id)),
+        ('connections', Connection.objects.filter(Q(requester_id=user_id) | Q(target_id=user_id))),
+        ('group_memberships', GroupMembership.objects.filter(Q(user_id=user_id) | Q(group__created_by_id=user_id))),
+        ('groups', Group.objects.filter(created_by_id=user_id)),
+        ('blocks', BlockedUser.objects.filter(Q(blocker_id=user_id) | Q(blocked_id=user_id))),
+        ('profile', Profile.objects.filter(user_id=user_id)),
+        ('user', User.objects.filter(id=user_id)),
+    ]
+
+
+def get_steps(job):
+    if job.kind == 'post':
+        return get_post_steps(Post.all_objects.filter(id=job.object_id))
+    return get_account_steps(job.object_id)
+
+
+def tombstone_post(post):
+    """Hides a post at once and queues its removal; returns the job"""
+
+    Post.all_objects.filter(id=post.id).update(deleted_at=timezone.now())
+    return DeletionJob.objects.create(kind='post', object_id=post.id)
+
+
+def tombstone_account(user):
+    """
+    Hides an account and its content at once, and queues its removal:
+    - The user can no longer log in or authenticate (is_active). Saved, so
+      post_save drops cached WebSocket authentication for the account
+    - Posts are tombstoned; stories expire
+    - Comments on other people's posts are hidden
+    The profile stays until the job's 'profile' step: the account's
+    remaining rows are still serialized (with the profile) until then.
+    Returns the job.
+    """
+
+    now = timezone.now()
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    get_account_posts(user.id).update(deleted_at=now)
+    Story.objects.filter(user_id=user.id, expires_at__gt=now).update(expires_at=now)
+    Comment.objects.filter(user_id=user.id).update(is_hidden=True)
+    return DeletionJob.objects.create(kind='account', object_id=user.id)
+
+
+def run_deletion_job(job, max_batches=None):
+    """
+    Works through a job's steps in batches of DELETION_BATCH_SIZE rows, each
+    batch in its own transaction, so no lock is held for long. Stops after
+    `max_batches` batches (None: runs to completion).
+    Steps only query what is left, so an interrupted job can be run again.
+    Returns True once the job is done.
+    """
+
+    steps = get_steps(job)
+    if job.total is None:
+        job.total = sum(queryset.count() for _, queryset in steps)
+    job.status = 'running'
+    job.save(update_fields=['status', 'total'])
+
+    batches = 0
+    for name, queryset in steps:
+        job.step = name
+        while max_batches is None or batches < max_batches:
+            with transaction.atomic():
+                ids = list(queryset.values_list('pk', flat=True)[:settings.DELETION_BATCH_SIZE])
+                if not ids:
+                    break
+                # _base_manager: tombstoned posts are invisible to Post.objects
+                queryset.model._base_manager.filter(pk__in=ids).delete()
+                batches += 1
+
+                job.progress[name] = job.progress.get(name, 0) + len(ids)
+                job.deleted += len(ids)
+                job.save(update_fields=['step', 'progress', 'deleted'])
+        else:
+            logger.info(f"Deletion job {job.id} paused at {name} ({job.deleted}/{job.total} rows)")
+            return False
+
+    job.status = 'done'
+    job.step = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'step', 'finished_at'])
+    logger.info(f"Deletion job {job.id} removed {job.deleted} rows")
+    return True
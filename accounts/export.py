@@ -0,0 +1,159 @@
+import time
+import logging
+import tempfile
+import zipfile
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import HttpRequest
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from connections.models import Connection
+from connections.serializers import ConnectionSerializer
+from notifications.models import Notification
+from notifications.serializer import NotificationSerializer
+from posts.models import Post, PostMedia, SavedPost
+from posts.serializers import PostSerializer, SavedPostSerializer
+from stories.models import Story
+from utils.aws import get_media_storage, upload_file_to_s3
+from .serializers import ProfileSerializer
+
+logger = logging.getLogger(__name__)
+
+POST_PREFETCH = [
+    'media', 'hashtags', 'shared_by', 'user__profile',
+    'comments__user__profile', 'comments__reactions__user__profile', 'reactions__user__profile',
+]
+
+
+def get_export_sections(user):
+    """(name, queryset, serializer class) of each list in the export, in order"""
+
+    return [
+        ('posts', Post.objects.filter(user=user).prefetch_related(*POST_PREFETCH), PostSerializer),
+        ('connections', Connection.objects.filter(Q(requester=user) | Q(target=user)).select_related('requester__profile'), ConnectionSerializer),
+        ('notifications', Notification.objects.filter(user=user), NotificationSerializer),
+        ('saved_posts', SavedPost.objects.filter(user=user).prefetch_related(
+            'post', *(f'post__{lookup}' for lookup in POST_PREFETCH)), SavedPostSerializer),
+    ]
+
+
+def iter_chunks(queryset, size):
+    """
+    Yields a queryset as lists of `size` rows, newest first, paging by
+    primary key (no OFFSET scans). Prefetches run once per chunk.
+    """
+
+    last_pk = None
+    while True:
+        page = queryset.order_by('-pk')
+        if last_pk is not None:
+            page = page.filter(pk__lt=last_pk)
+        chunk = list(page[:size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def iter_export_json(user, request):
+    """
+    Yields the user's data as one JSON document, in pieces: the profile,
+    then each section written chunk by chunk, so memory use does not grow
+    with the amount of data.
+    """
+
+    encoder = JSONEncoder()
+    context = {"request": request}
+
+    profile = getattr(user, 'profile', None)
+    profile_data = ProfileSerializer(profile, context=context).data if profile else None
+    yield f'{{"profile": {encoder.encode(profile_data)}'.encode()
+
+    for name, queryset, serializer_class in get_export_sections(user):
+        yield f', "{name}": ['.encode()
+        separator = ''
+        for chunk in iter_chunks(queryset, settings.DATA_EXPORT_CHUNK_SIZE):
+            items = serializer_class(chunk, many=True, context=context).data
+            yield (separator + ', '.join(encoder.encode(item) for item in items)).encode()
+            separator = ', '
+        yield b']'
+
+    yield b'}\n'
+
+
+async def iter_async(iterator):
+    """Pulls a sync iterator from the sync thread, one piece at a time"""
+
+    sentinel = object()
+    while True:
+        part = await sync_to_async(next)(iterator, sentinel)
+        if part is sentinel:
+            return
+        yield part
+
+
+def get_streaming_content(request, iterator):
+    """
+    Content for a StreamingHttpResponse. Under ASGI, Django would read a
+    sync iterator to the end before sending anything, so it is handed over
+    as an async one.
+    """
+
+    if isinstance(request, ASGIRequest):
+        return iter_async(iterator)
+    return iterator
+
+
+def get_export_request(user):
+    """A request as seen by the owner, so serializers show every field"""
+
+    request = Request(HttpRequest())
+    request.user = user
+    return request
+
+
+def get_media_keys(user):
+    """Storage keys of the originals the user uploaded (posts and stories)"""
+
+    keys = set(PostMedia.objects.filter(post__user=user).exclude(media_file='').values_list('media_file', flat=True))
+    keys.update(Story.objects.filter(user=user).exclude(media_files='').values_list('media_files', flat=True))
+    keys.discard(None)
+    return sorted(keys)
+
+
+def write_export_archive(user, file):
+    """
+    Writes a ZIP archive of the user's data to `file`: data.json (deflated,
+    streamed from iter_export_json) and the uploaded media under media/
+    (stored as is; images and videos are already compressed). Files are
+    copied from storage chunk by chunk.
+    """
+
+    storage = get_media_storage()
+    with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        with archive.open('data.json', 'w', force_zip64=True) as entry:
+            for part in iter_export_json(user, get_export_request(user)):
+                entry.write(part)
+
+        for key in get_media_keys(user):
+            info = zipfile.ZipInfo(f"media/{key}", date_time=time.localtime()[:6])
+            try:
+                with storage.open(key, 'rb') as stored, archive.open(info, 'w', force_zip64=True) as entry:
+                    for chunk in stored.chunks():
+                        entry.write(chunk)
+            except Exception as e:
+                logger.warning(f"Skipped {key} in the data export of user {user.id}: {e}")
+
+
+def build_export(export):
+    """Builds an export's archive and uploads it to media storage; returns (key, size)"""
+
+    with tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR) as file:
+        write_export_archive(export.user, file)
+        size = file.tell()
+        key, _ = upload_file_to_s3(
+            File(file, name=f"{export.id}.zip"), folder=f"exports/{export.user_id}")
+    return key, size
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+def copy_visibility(apps, schema_editor):
+    # Historical models have no custom save(): set the column from the JSON here
+    Profile = apps.get_model('accounts', 'Profile')
+    for visibility in ('friends', 'private'):
+        Profile.objects.filter(privacy_settings__profile_visibility=visibility).update(visibility=visibility)
+    Profile.objects.filter(privacy_settings__has_key='profile_visibility').exclude(
+        privacy_settings__profile_visibility__in=['public', 'friends'],
+    ).update(visibility='private')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_dataexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='visibility',
+            field=models.CharField(choices=[('public', 'Public'), ('friends', 'Friends'), ('private', 'Private')], db_index=True, default='public', max_length=10),
+        ),
+        migrations.RunPython(copy_visibility, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 import base64
+import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.utils import timezone
@@ -54,6 +55,16 @@ class User(AbstractUser):
         totp = pyotp.TOTP(secret)
         return totp.provisioning_uri(name=account_name, issuer_name="InstaClone")
 
+
+def get_profile_visibility(privacy_settings):
+    """Visibility set in privacy_settings: public when unset, private when unknown"""
+
+    visibility = (privacy_settings or {}).get("profile_visibility", "public")
+    if visibility in ('public', 'friends'):
+        return visibility
+    return 'private'
+
+
 class Profile(models.Model):
     """
     User Profile Model storing:
@@ -62,6 +73,12 @@ class Profile(models.Model):
     - Media URLs
     """
 
+    VISIBILITY_CHOICES = [
+        ('public', 'Public'),       # Anyone
+        ('friends', 'Friends'),     # Friends and followers
+        ('private', 'Private'),     # Only the owner
+    ]
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     full_name = models.CharField(max_length=255)
     username = models.CharField(max_length=150, unique=True)
@@ -80,9 +97,18 @@ class Profile(models.Model):
     education = models.CharField(max_length=255, blank=True)
     work = models.CharField(max_length=255, blank=True)
     privacy_settings = models.JSONField(default=dict)
+    # privacy_settings["profile_visibility"], kept as a column so queries can filter on it
+    visibility = models.CharField(max_length=10, choices=VISIBILITY_CHOICES, default='public', db_index=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        self.visibility = get_profile_visibility(self.privacy_settings)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'privacy_settings' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'visibility'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.username
     
@@ -101,4 +127,70 @@ class BlockedUser(models.Model):
         unique_together = ('blocker', 'blocked')
 
     def __str__(self):
-        return f"{self.blocker} blocked {self.blocked}"
\ No newline at end of file
+        return f"{self.blocker} blocked {self.blocked}"
+
+class DeletionJob(models.Model):
+    """
+    Background removal of a deleted post or account (accounts.deletion):
+    - The post or account is tombstoned (hidden) when the job is created
+    - Dependent rows are deleted in bounded batches, one transaction each
+    - Progress is recorded per step, so clients can poll it
+    """
+
+    KIND_CHOICES = [
+        ('post', 'Post'),
+        ('account', 'Account'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),     # Queued
+        ('running', 'Running'),     # Deleting in batches
+        ('done', 'Done'),           # Everything removed
+        ('failed', 'Failed'),       # Stopped; see error (safe to run again)
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # Unguessable: also the status URL
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()  # Post or user ID
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    step = models.CharField(max_length=50, blank=True)  # Step being processed
+    total = models.PositiveBigIntegerField(null=True, blank=True)  # Rows to delete, counted when the job starts
+    deleted = models.PositiveBigIntegerField(default=0)  # Rows deleted so far
+    progress = models.JSONField(default=dict, blank=True)  # {step: rows deleted}
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'object_id'])]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} ({self.status})"
+
+
+class DataExport(models.Model):
+    """
+    Archive of a user's data (JSON plus uploaded media), built in the
+    background (accounts.export) and kept in media storage until it expires
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),     # Queued
+        ('running', 'Running'),     # Archive being built
+        ('ready', 'Ready'),         # Downloadable until expires_at
+        ('failed', 'Failed'),       # See error
+        ('expired', 'Expired'),     # Archive deleted
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='data_exports')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    key = models.CharField(max_length=255, blank=True)  # Archive key in media storage
+    size = models.PositiveBigIntegerField(null=True, blank=True)  # Bytes
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Data export of {self.user.username} ({self.status})"
@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, Profile, BlockedUser
+from .models import User, Profile, BlockedUser, DataExport, DeletionJob
 from connections.models import Connection
 from django.db.models import Q
+from django.urls import reverse
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
@@ -109,8 +110,8 @@ class ProfileSerializer(serializers.ModelSerializer):
 
         profile_owner = instance.user
 
-        # Determine profile visibility: default to public if not set.
-        privacy = instance.privacy_settings.get("profile_visibility", "public")
+        # Profile visibility (from privacy_settings; public if not set)
+        privacy = instance.visibility
 
         # If the logged-in user is viewing their own profile, show everything.
         if request and profile_owner == request.user:
@@ -187,8 +188,7 @@ class UserSerializer(serializers.ModelSerializer):
 
         request = self.context.get("request")
         force_full = self.context.get("force_full", False)
-        privacy = instance.profile.privacy_settings.get(
-            "profile_visibility", 'public')
+        privacy = instance.profile.visibility
 
         if request and request.user == instance:
             return self.get_full_details(instance)
@@ -306,3 +306,26 @@ class ChangePasswordSerializer(serializers.Serializer):
         user.set_password(self.validated_data['new_password'])
         user.save()
         return user
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    """Progress of a background post or account deletion"""
+
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'kind', 'status', 'step', 'deleted', 'total', 'progress', 'error', 'created_at', 'finished_at']
+
+
+class DataExportSerializer(serializers.ModelSerializer):
+    """Status of a data export, with its download link once ready"""
+
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DataExport
+        fields = ['id', 'status', 'size', 'error', 'created_at', 'finished_at', 'expires_at', 'download_url']
+
+    def get_download_url(self, obj):
+        if obj.status != 'ready':
+            return None
+        return reverse('data-export-download', args=[obj.id])
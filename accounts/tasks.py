@@ -0,0 +1,83 @@
+import logging
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from notifications.models import Notification
+from notifications.utils import push_notification
+from uploads.cleanup import queue_deletion
+from . import deletion, export
+from .models import DataExport, DeletionJob
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def run_deletion_job(job_id):
+    """
+    Removes a tombstoned post or account in batches (see accounts.deletion).
+    Runs DELETION_BATCHES_PER_TASK batches, then queues itself again, so a
+    large account does not hold a worker for the whole deletion.
+    """
+
+    try:
+        job = DeletionJob.objects.get(id=job_id, status__in=('pending', 'running', 'failed'))
+    except DeletionJob.DoesNotExist:
+        return
+
+    try:
+        done = deletion.run_deletion_job(job, max_batches=settings.DELETION_BATCHES_PER_TASK)
+    except Exception as e:
+        logger.error(f"Error running deletion job {job.id}: {e}")
+        DeletionJob.objects.filter(id=job.id).update(status='failed', error=str(e)[:255])
+        return
+
+    # Media files of the deleted rows were queued by the delete signals and
+    # are removed by the scheduled drain (uploads.tasks.process_storage_deletions)
+    if not done:
+        run_deletion_job.delay(job_id)
+
+
+@shared_task(ignore_result=True)
+def build_data_export(export_id):
+    """
+    Builds a user's data archive (see accounts.export), then notifies the
+    user that it can be downloaded until it expires (DATA_EXPORT_EXPIRY).
+    """
+
+    updated = DataExport.objects.filter(id=export_id, status='pending').update(status='running')
+    if not updated:
+        return
+    data_export = DataExport.objects.select_related('user').get(id=export_id)
+
+    try:
+        data_export.key, data_export.size = export.build_export(data_export)
+    except Exception as e:
+        logger.error(f"Error building data export {data_export.id}: {e}")
+        data_export.status = 'failed'
+        data_export.error = str(e)[:255]
+        data_export.save(update_fields=['status', 'error'])
+        return
+
+    now = timezone.now()
+    data_export.status = 'ready'
+    data_export.finished_at = now
+    data_export.expires_at = now + timedelta(seconds=settings.DATA_EXPORT_EXPIRY)
+    data_export.save(update_fields=['key', 'size', 'status', 'finished_at', 'expires_at'])
+
+    notification = Notification.objects.create(
+        user_id=data_export.user_id, type='data_export',
+        message="Your data export is ready to download.")
+    push_notification(notification)
+
+
+@shared_task(ignore_result=True)
+def purge_expired_exports():
+    """Deletes the archives of expired data exports. Meant to run periodically."""
+
+    expired = DataExport.objects.filter(status='ready', expires_at__lte=timezone.now())
+    with transaction.atomic():
+        queue_deletion(expired.values_list('key', flat=True))
+        count = expired.update(status='expired')
+    logger.info(f"Expired {count} data exports")
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ProfileMediaUpdateView, RegisterView, LoginView, ProfileDetailView, UserDetailByidView, UserProfileView, VerifyEmailOTPView, ResendOTPView, ProfileUpdateView, UserSearchView, BlockedUserView, UnblockUserView, BlockedUserListView, PasswordResetConfirmView, PasswordResetRequestView, ChangePasswordView, Enable2FAView, AccountDeletionView, DownloadUserDataView, CustomTokenVerifyView, CheckUsernameView
+from .views import ProfileMediaUpdateView, RegisterView, LoginView, ProfileDetailView, UserDetailByidView, UserProfileView, VerifyEmailOTPView, ResendOTPView, ProfileUpdateView, UserSearchView, BlockedUserView, UnblockUserView, BlockedUserListView, PasswordResetConfirmView, PasswordResetRequestView, ChangePasswordView, Enable2FAView, AccountDeletionView, DeletionStatusView, DownloadUserDataView, DataExportView, DataExportDetailView, DataExportDownloadView, CustomTokenVerifyView, CheckUsernameView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 # Accounts Application URL Configuration
@@ -66,9 +66,23 @@ urlpatterns = [
     # POST: Enables Two-Factor Authentication (generates QR code)
 
     path('delete-account/', AccountDeletionView.as_view(), name="delete-account"),
+    # DELETE: Deletes the account; related data is removed in the background
+
+    path('deletions/<uuid:job_id>/', DeletionStatusView.as_view(), name="deletion-status"),
+    # GET: Progress of a post or account deletion
 
     path('download-data/', DownloadUserDataView.as_view(),
          name='download-user-data'),
+    # GET: Streams all personal data as one JSON file
+
+    path('download-data/exports/', DataExportView.as_view(), name='data-export'),
+    # POST: Prepares a ZIP archive (data and uploaded media) in the background
+
+    path('download-data/exports/<uuid:export_id>/', DataExportDetailView.as_view(), name='data-export-detail'),
+    # GET: Status of a prepared archive
+
+    path('download-data/exports/<uuid:export_id>/file/', DataExportDownloadView.as_view(), name='data-export-download'),
+    # GET: Downloads a ready archive
 
     path('profile/profile-update', ProfileMediaUpdateView.as_view(),
          name="profile-media-update"),
@@ -1,5 +1,5 @@
 import io
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.utils import timezone
 import pyotp
 import qrcode
@@ -8,24 +8,23 @@ from rest_framework import generics, status, permissions, filters
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework_simplejwt.views import TokenVerifyView
 
-from connections.serializers import ConnectionSerializer
-from notifications.models import Notification
-from notifications.serializer import NotificationSerializer
-from posts.models import Post, SavedPost
-from posts.serializers import PostSerializer, SavedPostSerializer
-from utils.aws import upload_file_to_s3
-from .serializers import ChangePasswordSerializer, ProfileMediaUpdateSerializer, RegisterSerializer, LoginSerializer, ProfileSerializer, UserSerializer, BlockedUserSerializer, PasswordResetRequestSerializer, PasswordResetConfirmSerializer
-from .models import User, Profile, BlockedUser
+from utils.aws import create_presigned_download, get_media_storage, upload_file_to_s3
+from utils.media import acquire_blobs, claim_direct_uploads
+from .deletion import tombstone_account
+from .export import get_streaming_content, iter_export_json
+from .tasks import build_data_export, run_deletion_job
+from .serializers import ChangePasswordSerializer, DataExportSerializer, DeletionJobSerializer, ProfileMediaUpdateSerializer, RegisterSerializer, LoginSerializer, ProfileSerializer, UserSerializer, BlockedUserSerializer, PasswordResetRequestSerializer, PasswordResetConfirmSerializer
+from .models import User, Profile, BlockedUser, DataExport, DeletionJob
 from rest_framework_simplejwt.tokens import RefreshToken
 import random
 from storages.backends.s3boto3 import S3Boto3Storage
 from django.core.files.base import ContentFile
-from django.core.mail import send_mail
+from notifications.email import queue_email
 from django.conf import settings
 from rest_framework.exceptions import PermissionDenied, NotFound
-from connections.models import Connection
 from django.db import transaction
 from rest_framework.pagination import PageNumberPagination
 from django.db.models import Q
@@ -33,6 +32,9 @@ from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from rest_framework.throttling import ScopedRateThrottle
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from realtime.events import group_send_many
 
 # Create your views here.
 
@@ -47,6 +49,17 @@ def get_tokens_for_user(user):
     }
 
 
+def notify_blocks_changed(*user_ids):
+    """Tells the users' open post streams to reload their block lists"""
+
+    async_to_sync(group_send_many)(
+        get_channel_layer(),
+        [f"posts_{user_id}" for user_id in user_ids],
+        {"type": "blocks_changed"},
+        settings.POST_FANOUT_CONCURRENCY,
+    )
+
+
 def generate_otp():
     """Generates a 6-digit random numeric OTP for email verification"""
     return str(random.randint(100000, 999999))
@@ -78,13 +91,12 @@ class RegisterView(generics.CreateAPIView):
         user.is_verified = False
         user.save()
 
-        # Send verification email
-        send_mail(
+        # Queue verification email (sent by the worker)
+        queue_email(
             subject="Your OTP for Email Verification",
             message=f"Your OTP is: {otp}. It is valid for 10 minutes.",
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email],
-            fail_silently=False,
         )
 
         # Return authentication tokens
@@ -176,13 +188,12 @@ class ResendOTPView(APIView):
         user.otp_created_at = timezone.now()
         user.save()
 
-        # Resend verification email
-        send_mail(
+        # Queue a new verification email
+        queue_email(
             subject="Your OTP for Email Verification",
             message=f"Your new OTP is: {otp}. It is valid for 10 minutes.",
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email],
-            fail_silently=False,
         )
 
         return Response({"message": "A new OTP has been sent to your email."}, status=status.HTTP_200_OK)
@@ -217,12 +228,11 @@ class LoginView(APIView):
                 user.email_otp = otp
                 user.otp_created_at = timezone.now()
                 user.save()
-                send_mail(
+                queue_email(
                     subject="Your Two-Factor Authentication OTP",
                     message=f"Your OTP is: {otp}. It is valid for 10 minutes.",
                     from_email=settings.DEFAULT_FROM_EMAIL,
                     recipient_list=[user.email],
-                    fail_silently=False,
                 )
                 return Response({"message": "OTP sent to email. Please provide the OTP to complete login."}, status=status.HTTP_201_CREATED)
             else:
@@ -270,7 +280,8 @@ class ProfileDetailView(generics.RetrieveAPIView):
         users_who_blocked_me = BlockedUser.objects.filter(
             blocked=user).values_list('blocker', flat=True)
 
-        return Profile.objects.exclude(user__in=blocked_users).exclude(user__in=users_who_blocked_me)
+        # Deleted accounts (is_active=False) keep their profile until the deletion job removes it
+        return Profile.objects.filter(user__is_active=True).exclude(user__in=blocked_users).exclude(user__in=users_who_blocked_me)
 
     def get_object(self):
         """Checks for blocking relationships before returning profile"""
@@ -303,7 +314,8 @@ class UserDetailByidView(generics.RetrieveAPIView):
         users_who_blocked_me = BlockedUser.objects.filter(
             blocked=user).values_list('blocker', flat=True)
 
-        return Profile.objects.exclude(user__in=blocked_users).exclude(user__in=users_who_blocked_me)
+        # Deleted accounts (is_active=False) keep their profile until the deletion job removes it
+        return Profile.objects.filter(user__is_active=True).exclude(user__in=blocked_users).exclude(user__in=users_who_blocked_me)
 
     def get_object(self):
         """Checks for blocking relationships before returning profile"""
@@ -351,6 +363,8 @@ class ProfileMediaUpdateView(APIView):
     Expects multipart/form-data with:
     - profile_picture: image file (optional)
     - cover_picture: image file (optional)
+    Or, for pictures uploaded straight to storage, JSON or form data with:
+    - profile_picture_upload_id / cover_picture_upload_id (optional)
     """
 
     permission_classes = [permissions.IsAuthenticated]
@@ -385,6 +399,23 @@ class ProfileMediaUpdateView(APIView):
             except Exception as e:
                 return Response({"error": f"Error uploading cover picture: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        # Pictures uploaded straight to storage (see uploads.views.DirectUploadView)
+        for field in ('profile_picture', 'cover_picture'):
+            upload_id = request.data.get(f'{field}_upload_id')
+            if not upload_id:
+                continue
+            upload = claim_direct_uploads(request.user, [upload_id])[0]
+            if not upload["error"] and upload["media_type"] != 'image':
+                upload["error"] = "Only images can be used."
+            if upload["error"]:
+                return Response({"error": f"Error attaching {field.replace('_', ' ')}: {upload['error']}"}, status=status.HTTP_400_BAD_REQUEST)
+            if upload["blob"]:
+                # Profile pictures are not tracked per row; keep the content for good
+                acquire_blobs([upload["blob"].id])
+            url = get_media_storage().url(upload["path"])
+            setattr(profile, f'{field}_url', url)
+            updated_fields[field] = url
+
         profile.save()
         return Response({"message": "Profile media updated successfully", "data": updated_fields}, status=status.HTTP_200_OK)
 
@@ -421,7 +452,7 @@ class UserSearchView(generics.ListAPIView):
         users_who_blocked_me = BlockedUser.objects.filter(
             blocked=user).values_list('blocker', flat=True)
 
-        return User.objects.exclude(id__in=blocked_users).exclude(id__in=users_who_blocked_me).filter(
+        return User.objects.filter(is_active=True).exclude(id__in=blocked_users).exclude(id__in=users_who_blocked_me).filter(
             Q(username__icontains=query) |
             Q(profile__full_name__icontains=query)
         ).distinct()
@@ -451,6 +482,7 @@ class BlockedUserView(APIView):
             return Response({"error": "User is already blocked"}, status=status.HTTP_400_BAD_REQUEST)
 
         BlockedUser.objects.create(blocker=request.user, blocked=blocked_user)
+        notify_blocks_changed(request.user.id, blocked_user.id)
         return Response({"message": "User blocked successfully"}, status=status.HTTP_201_CREATED)
 
 
@@ -480,6 +512,7 @@ class UnblockUserView(APIView):
             return Response({"error": "User is not blocked"}, status=status.HTTP_400_BAD_REQUEST)
 
         block_entry.delete()
+        notify_blocks_changed(request.user.id, blocked_user.id)
         return Response({"message": "User unblocked successfully"}, status=status.HTTP_200_OK)
 
 
@@ -523,8 +556,8 @@ class PasswordResetRequestView(generics.GenericAPIView):
         message = f"Hi {user.username},\n\nPlease click the link below to reset your password:\n{reset_link}\n\nIf you did not request a password reset, please ignore this email."
         from_email = settings.DEFAULT_FROM_EMAIL
         recipient_list = [email]
-        send_mail(subject=subject, message=message, from_email=from_email,
-                  recipient_list=recipient_list, fail_silently=False)
+        queue_email(subject=subject, message=message, from_email=from_email,
+                    recipient_list=recipient_list)
 
         return Response({"message": "Password reset link sent to your email."}, status=status.HTTP_200_OK)
 
@@ -596,6 +629,8 @@ class AccountDeletionView(generics.DestroyAPIView):
     Deletes the authenticated user's account along with all related data:
     - Profile, Posts, Saved Posts, Connections (sent and received)
     - Notifications, etc.
+    The account is hidden and logged out at once; its data is removed in
+    the background, in batches (see accounts.deletion).
     """
 
     permission_classes = [permissions.IsAuthenticated]
@@ -605,90 +640,107 @@ class AccountDeletionView(generics.DestroyAPIView):
         # Ensure only the authenticated user can delete their account.
         return self.request.user
 
-    @transaction.atomic
     def delete(self, request, *args, **kwargs):
         user = self.get_object()
+        with transaction.atomic():
+            job = tombstone_account(user)
+            transaction.on_commit(lambda: run_deletion_job.delay(job.id))
+        return Response({
+            "message": "Your account has been deleted. Related data is being removed.",
+            "deletion_id": job.id,
+            "status_url": reverse('deletion-status', args=[job.id]),
+        }, status=status.HTTP_202_ACCEPTED)
 
-        # Delete related data explicitly if not already cascading:
-        if hasattr(user, 'profile'):
-            user.profile.delete()
-
-        # Delete all posts (and cascade will handle media, reactions, comments, etc.)
-        user.posts.all().delete()
-
-        # Delete saved posts (if not cascading)
-        if hasattr(user, 'saved_posts'):
-            user.saved_posts.all().delete()
-
-        # Delete connections (both sent and received)
-        user.sent_requests.all().delete()
-        user.received_requests.all().delete()
 
-        # Delete notifications (assuming Notifications has on_delete=models.CASCADE for user, but do it explicitly)
-        user.notifications.all().delete()
+class DeletionStatusView(generics.RetrieveAPIView):
+    """
+    Progress of a post or account deletion. Open to anyone holding the
+    (unguessable) job ID, since a deleted account can no longer log in.
+    """
 
-        # Finally, delete the user account
-        self.perform_destroy(user)
-        return Response({"message": "Your account and all related data have been deleted."}, status=status.HTTP_200_OK)
+    permission_classes = [permissions.AllowAny]
+    queryset = DeletionJob.objects.all()
+    serializer_class = DeletionJobSerializer
+    lookup_url_kwarg = 'job_id'
 
 
 class DownloadUserDataView(APIView):
     """
-    Collects and returns all data for the authenticated user:
+    Streams all data for the authenticated user as a downloadable JSON file:
     - Profile details
     - Posts created by the user
     - Connections (both sent and received)
     - Notifications
     - Saved Posts
-    The data is returned as a downloadable JSON file.
+    The document is written chunk by chunk (see accounts.export), so large
+    accounts do not have to fit in memory. For an archive that also holds
+    uploaded media, use DataExportView.
     """
 
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-
-        # Profile Data (Assumes ProfileSerializer is used to serialize the user's profile)
-        profile_data = ProfileSerializer(
-            user.profile, context={'request': request}).data
-
-        # Posts created by the user
-        posts = Post.objects.filter(user=user).order_by('-created_at')
-        posts_data = PostSerializer(posts, many=True, context={
-                                    'request': request}).data
-
-        # Connections: both sent and received friend/follow requests.
-        connections = Connection.objects.filter(
-            Q(requester=user) | Q(target=user))
-        connections_data = ConnectionSerializer(
-            connections, many=True, context={'request': request}).data
-
-        # Notification for the user
-        notifications = Notification.objects.filter(
-            user=user).order_by('-created_at')
-        notifications_data = NotificationSerializer(
-            notifications, many=True, context={'request': request}).data
-
-        # Saved posts
-        saved_posts = SavedPost.objects.filter(user=user)
-        saved_posts_data = SavedPostSerializer(
-            saved_posts, many=True, context={"request": request}).data
-
-        # Aggredate all data
-        data = {
-            "profile": profile_data,
-            "posts": posts_data,
-            "connections": connections_data,
-            "notifications": notifications_data,
-            "saved_posts": saved_posts_data,
-        }
-
-        # Return as a downloadable JSON file with proper headers
-        response = Response(data, status=status.HTTP_200_OK)
+        content = iter_export_json(request.user, request)
+        response = StreamingHttpResponse(
+            get_streaming_content(request._request, content), content_type='application/json')
         response['Content-Disposition'] = 'attachment; filename="user_data.json"'
         return response
 
 
+class DataExportView(APIView):
+    """
+    Prepares a ZIP archive of the user's data and uploaded media in the
+    background. The user is notified when it is ready; a request made while
+    an export is in progress returns that export.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        with transaction.atomic():
+            data_export = DataExport.objects.select_for_update().filter(
+                user=request.user, status__in=('pending', 'running')).first()
+            created = data_export is None
+            if created:
+                data_export = DataExport.objects.create(user=request.user)
+                transaction.on_commit(lambda: build_data_export.delay(data_export.id))
+
+        serializer = DataExportSerializer(data_export, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+
+class DataExportDetailView(generics.RetrieveAPIView):
+    """Status of one of the user's data exports"""
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = DataExportSerializer
+    lookup_url_kwarg = 'export_id'
+
+    def get_queryset(self):
+        return DataExport.objects.filter(user=self.request.user)
+
+
+class DataExportDownloadView(APIView):
+    """
+    Downloads a ready archive: redirects to a short-lived presigned URL on
+    S3, or streams the file from local storage.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, export_id):
+        data_export = get_object_or_404(DataExport, id=export_id, user=request.user)
+        if data_export.status != 'ready' or data_export.expires_at <= timezone.now():
+            return Response({"error": f"This export is {data_export.status}."}, status=status.HTTP_409_CONFLICT)
+
+        filename = f"user_data_{data_export.created_at:%Y%m%d}.zip"
+        url = create_presigned_download(data_export.key, filename, expires_in=300)
+        if url:
+            return HttpResponseRedirect(url)
+        return FileResponse(
+            get_media_storage().open(data_export.key, 'rb'), as_attachment=True, filename=filename)
+
+
 class UserProfileView(APIView):
     """
     Returns authenticated user details
@@ -36,9 +36,8 @@ class ConnectionSerializer(serializers.ModelSerializer):
         else:
             days_remaining = None
 
-        # Get the sender's privacy settings from their profile (default to 'public')
-        privacy = obj.requester.profile.privacy_settings.get(
-            "profile_visibility", "public")
+        # The sender's profile visibility (from privacy_settings; public if not set)
+        privacy = obj.requester.profile.visibility
 
         # If the friend request has been accepted, always return full details.
         if obj.status == "accepted":
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ConnectionRequestView, ConnectionResponseView, ReceivedRequestsView, SentRequestsView, FriendListView, FollowUserView, UnfollowUserView, FollowingListView, FollowersListView
+from .views import ConnectionRequestView, ConnectionResponseView, ReceivedRequestsView, SentRequestsView, FriendListView, OnlineFriendsView, FollowUserView, UnfollowUserView, FollowingListView, FollowersListView
 
 # Connections Application URL Configuration
 # Handles social relationships and networking features
@@ -22,6 +22,9 @@ urlpatterns = [
     path('friends/', FriendListView.as_view(), name='friends-list'),
     # GET: List all accepted mutual friendships
 
+    path('friends/online/', OnlineFriendsView.as_view(), name='online-friends'),
+    # GET: List friends with an open WebSocket connection
+
     # ================ Following System =======================
     path('follow/', FollowUserView.as_view(), name='follow-user'),
     # POST: Establishes one-way following relationship
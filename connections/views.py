@@ -10,6 +10,7 @@ from rest_framework import generics, permissions
 from django.db import models
 from accounts.models import BlockedUser, User
 from rest_framework.pagination import PageNumberPagination
+from realtime.presence import get_connected_user_ids
 
 # Create your views here.
 class ConnectionRequestView(APIView):
@@ -194,6 +195,30 @@ class UnfollowUserView(APIView):
         return Response({"message": "You have unfollowed the user successfully."}, status=status.HTTP_200_OK)
 
 
+class OnlineFriendsView(APIView):
+    """
+    Lists friends who currently have an open WebSocket connection
+    - Presence comes from the cache, not the database
+    - Includes user details
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        pairs = Connection.objects.filter(
+            connection_type='friend', status='accepted'
+        ).filter(models.Q(requester=user) | models.Q(target=user)).values_list('requester_id', 'target_id')
+        friend_ids = {target if requester == user.id else requester for requester, target in pairs}
+
+        online_ids = get_connected_user_ids(friend_ids)
+        friends = User.objects.filter(id__in=online_ids).select_related('profile').order_by('username')
+        return Response({
+            "count": len(online_ids),
+            "results": UserSerializer(friends, many=True, context={'request': request}).data
+        }, status=status.HTTP_200_OK)
+
+
 class UserPagination(PageNumberPagination):
     """Custom pagination settings for user lists"""
 
@@ -179,8 +179,8 @@ class MostActiveMemberView(APIView):
         for membership in memberships:
             member_id = membership.user_id
             posts_count = Post.objects.filter(group=group, user_id=member_id).count()
-            comments_count = Comment.objects.filter(post__group=group, user_id=member_id).count()
-            reactions_count = Reaction.objects.filter(post__group=group, user_id=member_id).count()
+            comments_count = Comment.objects.filter(post__group=group, post__deleted_at__isnull=True, user_id=member_id).count()
+            reactions_count = Reaction.objects.filter(post__group=group, post__deleted_at__isnull=True, user_id=member_id).count()
             total_activity = posts_count + comments_count + reactions_count
             activity[member_id] = total_activity
 
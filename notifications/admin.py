@@ -1,5 +1,5 @@
 from django.contrib import admin
-from notifications.models import Notification
+from notifications.models import DigestRun, Notification, OutgoingEmail
 
 # Register your models here.
 @admin.register(Notification)
@@ -15,4 +15,17 @@ class NotificationAdmin(admin.ModelAdmin):
         return request.user.is_staff
     
     def has_delete_permission(self, request, obj=None):
-        return request.user.is_superuser
\ No newline at end of file
+        return request.user.is_superuser
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to')
+    readonly_fields = ('attempts', 'claimed_at', 'last_error', 'sent_at')
+
+@admin.register(DigestRun)
+class DigestRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'since', 'cutoff', 'status', 'digests_queued', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('last_user_id', 'digests_queued', 'started_at', 'finished_at')
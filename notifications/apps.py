@@ -5,6 +5,10 @@ class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
 
+    def ready(self):
+        # Keep the WebSocket auth cache in sync with account changes
+        from . import signals  # noqa: F401
+
     # def ready(self):
     #     from social_network.custom_admin import customize_admin_site
-    #     customize_admin_site()
\ No newline at end of file
+    #     customize_admin_site()
@@ -0,0 +1,120 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, message, recipient_list, from_email=None):
+    """
+    Queues an email for the background sender; same arguments as send_mail().
+    Sending starts once the current transaction commits.
+    """
+
+    # Imported here: the task module imports this one
+    from .tasks import send_queued_emails
+
+    email = OutgoingEmail.objects.create(
+        subject=subject, body=message, to=list(recipient_list), from_email=from_email or '')
+    transaction.on_commit(send_queued_emails.delay)
+    return email
+
+
+def queue_emails(emails):
+    """Queues many OutgoingEmail instances in one insert (e.g. digests)"""
+
+    from .tasks import send_queued_emails
+
+    created = OutgoingEmail.objects.bulk_create(emails)
+    if created:
+        transaction.on_commit(send_queued_emails.delay)
+    return created
+
+
+def get_retry_delay(attempts):
+    """Seconds before the next attempt: EMAIL_RETRY_BACKOFF, doubled per failure"""
+
+    return settings.EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1)
+
+
+def claim_due_emails():
+    """
+    Claims up to EMAIL_BATCH_SIZE due emails for this worker. Emails claimed
+    by a worker that died (older than EMAIL_SEND_TIMEOUT) are claimed again.
+    """
+
+    now = timezone.now()
+    OutgoingEmail.objects.filter(
+        status='sending', claimed_at__lt=now - timedelta(seconds=settings.EMAIL_SEND_TIMEOUT),
+    ).update(status='pending')
+
+    ids = list(OutgoingEmail.objects.filter(
+        status='pending', next_attempt_at__lte=now,
+    ).order_by('next_attempt_at').values_list('id', flat=True)[:settings.EMAIL_BATCH_SIZE])
+    # Only the rows still pending are ours; a concurrent worker may have taken some
+    OutgoingEmail.objects.filter(id__in=ids, status='pending').update(status='sending', claimed_at=now)
+    return list(OutgoingEmail.objects.filter(id__in=ids, status='sending', claimed_at=now))
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)[:255]
+    if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        email.status = 'failed'
+        logger.error(f"Giving up on email {email.id} after {email.attempts} attempts: {error}")
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = timezone.now() + timedelta(seconds=get_retry_delay(email.attempts))
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_email_batch():
+    """
+    Sends one batch of due emails over a single connection to the mail
+    backend (one SMTP handshake per batch, not per email).
+    A failed connection reschedules the whole batch; a rejected message
+    only itself. Returns (sent, failed, more due).
+    """
+
+    emails = claim_due_emails()
+    if not emails:
+        return 0, 0, False
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning(f"Could not connect to the mail server: {e}")
+        for email in emails:
+            record_failure(email, e)
+        return 0, len(emails), False
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                subject=email.subject, body=email.body, to=email.to,
+                from_email=email.from_email or settings.DEFAULT_FROM_EMAIL, connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                record_failure(email, e)
+                failed += 1
+                continue
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.attempts += 1
+            email.save(update_fields=['status', 'sent_at', 'attempts'])
+            sent += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    more = OutgoingEmail.objects.filter(status='pending', next_attempt_at__lte=timezone.now()).exists()
+    return sent, failed, more
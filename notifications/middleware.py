@@ -1,6 +1,11 @@
 import jwt
+import math
 import os
+import time
+import logging
+import threading
 import django
+from cachetools import TTLCache
 from django.core.exceptions import ImproperlyConfigured
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
@@ -12,28 +17,86 @@ if not settings.configured:
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_network.settings')
     django.setup()
 
+from realtime.metrics import LatencyMetric
+
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Recently authenticated users keyed by token ID (jti): {jti: (user, token_exp)}
+# Bounded in size and age so reconnect storms skip the database.
+user_cache = TTLCache(maxsize=settings.WS_AUTH_CACHE_SIZE, ttl=settings.WS_AUTH_CACHE_TTL)
+# Token IDs in user_cache per user, so invalidation does not scan it: {user_id: {jti}}
+# Refreshed whenever one of the user's tokens is cached, so it outlives them;
+# bounded by age only (one entry per user seen within WS_AUTH_CACHE_TTL).
+user_tokens = TTLCache(maxsize=math.inf, ttl=settings.WS_AUTH_CACHE_TTL)
+user_cache_lock = threading.Lock()
+
+# Time spent authenticating each WebSocket handshake
+handshake_latency = LatencyMetric("ws_handshake")
+
+
+def decode_token(token):
+    """Validates JWT signature and expiry; returns the payload or None"""
+
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except jwt.InvalidTokenError as e:
+        logger.info(f"Rejected WebSocket token: {e}")
+        return None
+
 
 @database_sync_to_async
-def get_user_for_token(token):
-    """Validates JWT and returns authenticated user"""
+def get_user_for_token(payload):
+    """Returns the active user a validated token belongs to"""
 
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        user = User.objects.get(id=payload.get("user_id"))
-        return user
-    except Exception as e:
+        return User.objects.get(id=payload.get("user_id"), is_active=True)
+    except User.DoesNotExist:
         return None
-    
+
+
+async def get_cached_user(token):
+    """Returns the token's user from the cache, falling back to the database"""
+
+    payload = decode_token(token)
+    if payload is None:
+        return None
+
+    key = payload.get("jti") or token
+    with user_cache_lock:
+        cached = user_cache.get(key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
+    user = await get_user_for_token(payload)
+    if user is not None:
+        with user_cache_lock:
+            user_cache[key] = (user, payload.get("exp", 0))
+            # Token IDs evicted from user_cache are dropped along the way
+            tokens = {jti for jti in user_tokens.get(user.id, ()) if jti in user_cache}
+            tokens.add(key)
+            user_tokens[user.id] = tokens
+    return user
+
+
+def invalidate_user(user_id):
+    """Drops every cached token of a user (password change, deletion, deactivation)"""
+
+    with user_cache_lock:
+        for key in user_tokens.pop(user_id, ()):
+            user_cache.pop(key, None)
+
 
 class JWTAuthMiddleware(BaseMiddleware):
     """
     WebSocket authentication middleware:
     - Extracts JWT from query parameters
     - Validates and sets user in connection scope
+    - Caches users per token ID for WS_AUTH_CACHE_TTL seconds
     """
 
     async def __call__(self, scope, receive, send):
+        started = time.perf_counter()
         query_string = scope.get("query_string", b"").decode("utf-8")
         token = None
         for param in query_string.split("&"):
@@ -42,9 +105,10 @@ class JWTAuthMiddleware(BaseMiddleware):
                 break
 
         if token:
-            user = await get_user_for_token(token)
+            user = await get_cached_user(token)
             scope["user"] = user if user else AnonymousUser()
         else:
             scope["user"] = AnonymousUser()
+        handshake_latency.observe(time.perf_counter() - started)
 
-        return await super().__call__(scope, receive, send)
\ No newline at end of file
+        return await super().__call__(scope, receive, send)
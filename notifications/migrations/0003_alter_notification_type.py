@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_alter_notification_message'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('friend_request', 'Friend Request'), ('like', 'Like'), ('comment', 'Comment'), ('reaction', 'Reaction'), ('tag', 'Tag'), ('group_invite', 'Group Invite'), ('group_update', 'Group Update'), ('follower_activity', 'Follower Activity'), ('data_export', 'Data Export')], max_length=50),
+        ),
+    ]
@@ -21,6 +21,7 @@ class Notification(models.Model):
         ('group_invite', 'Group Invite'),
         ('group_update', 'Group Update'),
         ('follower_activity', 'Follower Activity'),
+        ('data_export', 'Data Export'),
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -28,4 +29,67 @@ class Notification(models.Model):
     reference_id = models.IntegerField(null=True, blank=True)
     message = models.TextField(blank=True)
     is_read = models.BooleanField(default=False)
-    created_at = models.DateTimeField(default=timezone.now)
\ No newline at end of file
+    created_at = models.DateTimeField(default=timezone.now)
+
+class OutgoingEmail(models.Model):
+    """
+    Outbox of emails, sent by a background worker (notifications.email):
+    - Requests only queue messages; SMTP never runs on the request path
+    - One SMTP connection is reused for each batch
+    - Failed sends are retried with exponential backoff
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),     # Waiting for next_attempt_at
+        ('sending', 'Sending'),     # Claimed by a worker
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),       # Gave up after EMAIL_MAX_ATTEMPTS
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)  # Empty: DEFAULT_FROM_EMAIL
+    to = models.JSONField(default=list)  # Recipient addresses
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # When a worker took it
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
+
+class DigestRun(models.Model):
+    """
+    One run of the notification digest (notifications.digest), covering
+    unread notifications created in [since, cutoff):
+    - last_user_id checkpoints progress; a crashed run resumes after it
+    - At most one run is in progress at a time
+    """
+
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ]
+
+    since = models.DateTimeField()
+    cutoff = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    last_user_id = models.BigIntegerField(default=0)  # Users up to this ID are done
+    digests_queued = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status'], condition=models.Q(status='running'), name='one_running_digest'),
+        ]
+
+    def __str__(self):
+        return f"Digest {self.since:%Y-%m-%d %H:%M} - {self.cutoff:%Y-%m-%d %H:%M} ({self.status})"
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from accounts.models import User
+from .middleware import invalidate_user
+
+
+@receiver(post_save, sender=User)
+def invalidate_ws_auth_on_save(sender, instance, **kwargs):
+    # Password changes and deactivation both go through save()
+    invalidate_user(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_ws_auth_on_delete(sender, instance, **kwargs):
+    invalidate_user(instance.id)
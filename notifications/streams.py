@@ -0,0 +1,21 @@
+from realtime.streams import Stream
+
+
+class NotificationStream(Stream):
+    """
+    Streams the user's notifications as they are created, plus personal
+    updates such as story media becoming ready.
+    Payloads are encoded once by push_to_user() and forwarded unchanged.
+    """
+
+    name = 'notifications'
+    event_types = ('send_notification', 'story_media_ready')
+
+    async def open(self):
+        await self.join(f"notifications_{self.user.id}")
+
+    async def send_notification(self, event):
+        await self.deliver(event)
+
+    async def story_media_ready(self, event):
+        await self.deliver(event)
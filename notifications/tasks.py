@@ -0,0 +1,52 @@
+import logging
+from celery import shared_task
+from django.utils import timezone
+from .digest import run_digest
+from .email import send_email_batch
+from .models import Notification, OutgoingEmail
+from .utils import push_notification
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def send_queued_emails():
+    """
+    Sends due emails from the outbox, one batch (and one mail server
+    connection) per run. Queues itself again while emails are due, and
+    for the next retry after a failure.
+    """
+
+    sent, failed, more = send_email_batch()
+    if sent or failed:
+        logger.info(f"Sent {sent} emails, {failed} failed")
+
+    if more:
+        send_queued_emails.delay()
+        return
+
+    next_retry = OutgoingEmail.objects.filter(status='pending').order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    if failed and next_retry:
+        send_queued_emails.apply_async(countdown=max(0, (next_retry - timezone.now()).total_seconds()))
+
+
+@shared_task(ignore_result=True)
+def send_notification_digests():
+    """
+    Emails each user a digest of their unread notifications since the last
+    digest (see notifications.digest). Meant to run daily; a run that was
+    interrupted resumes from its checkpoint.
+    """
+
+    run_digest()
+
+
+@shared_task(ignore_result=True)
+def deliver_notification(notification_id):
+    """Pushes a stored notification to the recipient's WebSocket stream"""
+
+    notification = Notification.objects.filter(id=notification_id).first()
+    if notification is None:
+        # Deleted (e.g. with its account) before the worker got to it
+        return
+    push_notification(notification)
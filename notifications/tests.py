@@ -1,3 +1,211 @@
-from django.test import TestCase
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+from celery.schedules import crontab
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import Profile, User
+from posts.models import Post
+from social_network.celery import app
+from .email import queue_email, send_email_batch
+from .models import Notification, OutgoingEmail
 
-# Create your tests here.
+
+class CountingEmailBackend(EmailBackend):
+    """In-memory backend counting connections; rejects bounce@ recipients"""
+
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(to.startswith("bounce@") for to in message.to):
+                raise SMTPRecipientsRefused({message.to[0]: (550, b"No such user")})
+        return super().send_messages(messages)
+
+
+class UnreachableEmailBackend(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("Mail server down")
+
+
+def run_tasks_eagerly(test_case):
+    """Runs Celery tasks inline for one test, logging their errors as in production"""
+
+    for key, value in {"task_always_eager": True, "task_eager_propagates": False}.items():
+        test_case.addCleanup(app.conf.__setitem__, key, app.conf[key])
+        app.conf[key] = value
+
+
+def create_user(username):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="password")
+    Profile.objects.create(user=user, username=username)
+    return user
+
+
+class CeleryConfigTests(TestCase):
+    """Queue routing and the beat schedule point at real tasks"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        app.loader.import_default_modules()
+
+    def get_queue(self, task_name):
+        return app.amqp.router.route({}, task_name)["queue"].name
+
+    def test_routed_tasks_exist(self):
+        for task_name in settings.CELERY_TASK_ROUTES:
+            self.assertIn(task_name, app.tasks)
+
+    def test_routes(self):
+        self.assertEqual(self.get_queue("posts.tasks.process_post_media"), "media")
+        self.assertEqual(self.get_queue("posts.tasks.fan_out_new_post"), "fanout")
+        self.assertEqual(self.get_queue("notifications.tasks.deliver_notification"), "fanout")
+        self.assertEqual(self.get_queue("notifications.tasks.send_queued_emails"), "email")
+        self.assertEqual(self.get_queue("uploads.tasks.collect_media_garbage"), "maintenance")
+
+    def test_unrouted_tasks_use_default_queue(self):
+        self.assertEqual(self.get_queue("some.unrouted.task"), settings.CELERY_TASK_DEFAULT_QUEUE)
+
+    def test_beat_schedule(self):
+        for name, entry in settings.CELERY_BEAT_SCHEDULE.items():
+            self.assertIn(entry["task"], app.tasks, name)
+            self.assertIsInstance(entry["schedule"], (timedelta, crontab), name)
+
+
+class EagerTaskTests(TestCase):
+    """Tasks started from requests run inline when CELERY_TASK_ALWAYS_EAGER is set"""
+
+    def setUp(self):
+        run_tasks_eagerly(self)
+
+        self.author = create_user("author")
+        self.commenter = create_user("commenter")
+        self.post = Post.objects.create(user=self.author, content="Hello", visibility="public")
+        self.client = APIClient()
+        self.client.force_authenticate(self.commenter)
+
+    def comment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/api/posts/{self.post.id}/comment/", {"content": "Hi"}, format="json")
+
+    @mock.patch("notifications.tasks.push_notification")
+    def test_notification_delivered_by_task(self, push_notification):
+        response = self.comment()
+
+        self.assertEqual(response.status_code, 201)
+        notification = Notification.objects.get(user=self.author)
+        push_notification.assert_called_once_with(notification)
+
+    @mock.patch("notifications.tasks.push_notification", side_effect=ConnectionError("channel layer down"))
+    def test_failed_task_does_not_fail_request(self, push_notification):
+        response = self.comment()
+
+        self.assertEqual(response.status_code, 201)
+        push_notification.assert_called_once()
+        self.assertTrue(Notification.objects.filter(user=self.author).exists())
+
+
+@override_settings(
+    EMAIL_BACKEND="notifications.tests.CountingEmailBackend",
+    EMAIL_BATCH_SIZE=10, EMAIL_MAX_ATTEMPTS=3, EMAIL_RETRY_BACKOFF=30, EMAIL_SEND_TIMEOUT=300,
+)
+class EmailOutboxTests(TestCase):
+    """Emails are queued, sent in batches, retried with backoff, and sent once"""
+
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+
+    def queue(self, count, to="user{}@example.com"):
+        return [queue_email("Subject", "Body", [to.format(index)]) for index in range(count)]
+
+    def test_batch_uses_one_connection(self):
+        self.queue(5)
+
+        sent, failed, more = send_email_batch()
+
+        self.assertEqual((sent, failed, more), (5, 0, False))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertFalse(OutgoingEmail.objects.exclude(status="sent").exists())
+
+    @override_settings(EMAIL_BATCH_SIZE=2)
+    def test_more_due_after_full_batch(self):
+        self.queue(3)
+
+        self.assertEqual(send_email_batch(), (2, 0, True))
+        self.assertEqual(send_email_batch(), (1, 0, False))
+
+    def test_sent_emails_not_sent_again(self):
+        self.queue(2)
+        send_email_batch()
+
+        self.assertEqual(send_email_batch(), (0, 0, False))
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_BACKEND="notifications.tests.UnreachableEmailBackend")
+    def test_retry_with_backoff(self):
+        email, = self.queue(1)
+
+        for attempt in (1, 2):
+            OutgoingEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now())
+            before = timezone.now()
+            self.assertEqual(send_email_batch(), (0, 1, False))
+
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ("pending", attempt))
+            self.assertIn("Mail server down", email.last_error)
+            # 30s, then 60s
+            delay = (email.next_attempt_at - before).total_seconds()
+            self.assertAlmostEqual(delay, 30 * 2 ** (attempt - 1), delta=5)
+
+        # Not due yet: nothing is attempted
+        self.assertEqual(send_email_batch(), (0, 0, False))
+
+        OutgoingEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now())
+        send_email_batch()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("failed", 3))
+
+    def test_rejected_email_does_not_fail_batch(self):
+        self.queue(2)
+        bounced, = self.queue(1, to="bounce@example.com")
+
+        self.assertEqual(send_email_batch(), (2, 1, False))
+
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), ("pending", 1))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_no_duplicate_send_after_crash(self):
+        email, = self.queue(1)
+        # A worker claimed the email, then died before sending it
+        OutgoingEmail.objects.filter(id=email.id).update(status="sending", claimed_at=timezone.now())
+
+        # Within EMAIL_SEND_TIMEOUT the claim is respected
+        self.assertEqual(send_email_batch(), (0, 0, False))
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Afterwards the email is claimed again, and sent exactly once
+        OutgoingEmail.objects.filter(id=email.id).update(claimed_at=timezone.now() - timedelta(seconds=301))
+        self.assertEqual(send_email_batch(), (1, 0, False))
+        self.assertEqual(send_email_batch(), (0, 0, False))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sent_after_commit(self):
+        run_tasks_eagerly(self)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.queue(1)
+            self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutgoingEmail.objects.get().status, "sent")
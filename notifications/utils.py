@@ -0,0 +1,36 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from realtime.events import build_event
+from realtime.presence import get_reachable_user_ids
+from realtime.replay import record_events
+
+
+def push_to_user(user_id, event):
+    """
+    Sends a pre-built event to a user's notification stream, recorded for
+    replay. Offline users are skipped (see PRESENCE_SKIP_OFFLINE).
+    """
+
+    if not get_reachable_user_ids([user_id]):
+        return
+
+    seqs = record_events('notifications', [user_id], event)
+
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        f"notifications_{user_id}",
+        {**event, "seq": seqs[user_id]}
+    )
+
+
+def push_notification(notification):
+    """
+    Sends a stored notification to the recipient's WebSocket group.
+    Offline recipients are skipped; they read it from their notification list.
+    """
+
+    push_to_user(notification.user_id, build_event("send_notification", {
+        "id": notification.id,
+        "type": notification.type,
+        "message": notification.message,
+    }))
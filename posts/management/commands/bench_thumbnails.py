@@ -0,0 +1,129 @@
+import io
+import os
+import statistics
+import tempfile
+import time
+from multiprocessing import get_context
+from PIL import Image
+from django.core.management.base import BaseCommand
+from utils.images import decode_image, fit_image
+
+
+def thumbnail_verify_reopen(path, size):
+    """Previous CreateStoryView path: read, verify(), reopen, full decode"""
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    Image.open(io.BytesIO(data)).verify()
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    image.thumbnail((size, size))
+    return encode(image, image.format)
+
+
+def thumbnail_full_decode(path, size):
+    """Previous derivative path: decode every pixel, then shrink"""
+
+    with open(path, 'rb') as f:
+        image = Image.open(f)
+        image.load()
+    image.thumbnail((size, size))
+    return encode(image, image.format)
+
+
+def thumbnail_engine(path, size):
+    """utils.images: draft-mode decode with EXIF orientation, decoded once"""
+
+    with open(path, 'rb') as f:
+        image, image_format, _ = decode_image(f, max_edge=size)
+        image.load()
+    return encode(fit_image(image, size), image_format)
+
+
+def encode(image, image_format):
+    image_format = image_format or 'JPEG'
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.tell()
+
+
+CASES = {
+    'verify+reopen': thumbnail_verify_reopen,
+    'full-decode': thumbnail_full_decode,
+    'engine': thumbnail_engine,
+}
+
+
+def read_memory(field):
+    """Reads VmRSS/VmHWM (KiB) of the current process from /proc"""
+
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_case(case, path, size, repeat):
+    """
+    Runs in a fresh process and returns (median seconds, peak RSS growth in MB).
+    The peak (VmHWM) is reset first, so only this case is measured.
+    """
+
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+    baseline = read_memory('VmRSS')
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        CASES[case](path, size)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), (read_memory('VmHWM') - baseline) / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares peak memory (RSS) and time per image of the thumbnail engine "
+        "in utils.images against the previous decode paths. Uses the given "
+        "images, or generates JPEG and PNG test images of --megapixels. "
+        "Linux only (reads peak RSS from /proc)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Images to benchmark")
+        parser.add_argument('--megapixels', type=int, nargs='+', default=[12, 50])
+        parser.add_argument('--size', type=int, default=200, help="Thumbnail longest edge")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = options['paths'] or self.generate_images(directory, options['megapixels'])
+            self.stdout.write(f"{'image':<28} {'case':<15} {'time (ms)':>10} {'peak RSS (MB)':>14}")
+
+            context = get_context('spawn')
+            for path in paths:
+                for case in CASES:
+                    with context.Pool(1) as pool:
+                        seconds, peak_mb = pool.apply(
+                            run_case, (case, path, options['size'], options['repeat']))
+                    self.stdout.write(
+                        f"{os.path.basename(path):<28} {case:<15} "
+                        f"{seconds * 1000:>10.1f} {peak_mb:>14.1f}")
+
+    def generate_images(self, directory, megapixels):
+        """Noisy test images (noise keeps JPEG/PNG from compressing trivially)"""
+
+        paths = []
+        for mp in megapixels:
+            width = int((mp * 1_000_000 * 4 / 3) ** 0.5)
+            height = width * 3 // 4
+            self.stdout.write(f"Generating {width}x{height} test images...")
+            image = Image.effect_noise((width, height), 40).convert('RGB')
+            for image_format, extension in (('JPEG', 'jpg'), ('PNG', 'png')):
+                path = os.path.join(directory, f"{mp}mp.{extension}")
+                image.save(path, format=image_format)
+                paths.append(path)
+        return paths
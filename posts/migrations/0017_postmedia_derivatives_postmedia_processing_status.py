@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_sharedpost_parent_share'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmedia',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='postmedia',
+            name='processing_status',
+            field=models.CharField(choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=20),
+        ),
+    ]
@@ -4,12 +4,20 @@ from accounts.models import User
 from groups.models import Group
 
 # Create your models here.
+class PostManager(models.Manager):
+    """Hides tombstoned posts (deleted, waiting for background removal)"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Post(models.Model):
     """
     Core content model for user-generated posts:
     - Supports text content with media attachments
     - Configurable visibility settings
     - Group association for community posts
+    - Tombstoned on deletion (deleted_at), then removed in the background
     """
 
     VISIBILITY_CHOICES = [
@@ -24,11 +32,15 @@ class Post(models.Model):
     visibility = models.CharField(max_length=20, choices=VISIBILITY_CHOICES, default='public')  # Privacy settings
     created_at = models.DateTimeField(default=timezone.now)  # Creation timestamp
     updated_at = models.DateTimeField(auto_now=True)  # Last edit time
+    deleted_at = models.DateTimeField(null=True, blank=True)  # Tombstone: hidden everywhere once set
 
     # Metrics fields
     view_count = models.PositiveIntegerField(default=0)
     click_count = models.PositiveIntegerField(default=0)
 
+    objects = PostManager()
+    all_objects = models.Manager()  # Includes tombstoned posts
+
     class Meta:
         ordering = ['-created_at']  # Default chronological order
 
@@ -37,6 +49,8 @@ class PostMedia(models.Model):
     Stores media files associated with posts:
     - Supports images and videos
     - Maintains display order and thumbnails
+    - Tracks background generation of resized derivatives
+    - Points at a shared, deduplicated MediaBlob
     """
 
     MEDIA_TYPE_CHOICES = [
@@ -44,11 +58,20 @@ class PostMedia(models.Model):
         ('video', 'Video'),     # Support video formats
     ]
 
+    PROCESSING_STATUS_CHOICES = [
+        ('processing', 'Processing'),   # Derivatives are being generated
+        ('ready', 'Ready'),             # All derivatives available
+        ('failed', 'Failed'),           # Only the original is available
+    ]
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media')
     media_file = models.FileField(upload_to='post_media/', null=True, blank=True)
+    blob = models.ForeignKey('uploads.MediaBlob', on_delete=models.SET_NULL, null=True, blank=True, related_name='post_media')  # Shared stored content
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES)
     thumbnail_file = models.FileField(upload_to='post_media/thumbnails/',blank=True)
     order_index = models.IntegerField(default=0)  # Display order in post
+    processing_status = models.CharField(max_length=20, choices=PROCESSING_STATUS_CHOICES, default='ready')
+    derivatives = models.JSONField(default=dict, blank=True)  # {name: {"path", "width", "height"}}
     created_at = models.DateTimeField(default=timezone.now)
 
 class Reaction(models.Model):
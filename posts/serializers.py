@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import CommentReaction, Post, PostMedia, Reaction, Comment, Hashtag, SavedPost, SharedPost, SharedPostComment, SharedPostCommentReaction, SharedPostReaction
 from accounts.serializers import UserSerializer
+from utils.media import get_derivative_url, get_derivative_urls, get_srcset
 
 
 class PostMediaSerializer(serializers.ModelSerializer):
@@ -8,15 +9,19 @@ class PostMediaSerializer(serializers.ModelSerializer):
     Serializes media files with URLs:
     - Generates absolute URLs for media files
     - Includes thumbnail versions for images
+    - Includes resized derivatives once processing is done
+    - Picks WebP/AVIF variants from the Accept header or ?image_format=
     """
 
     media_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    derivatives = serializers.SerializerMethodField()
 
     class Meta:
         model = PostMedia
-        fields = ['id', 'media_url', 'media_type',
-                  'thumbnail_url', 'order_index', 'created_at']
+        fields = ['id', 'media_url', 'media_type', 'thumbnail_url', 'srcset', 'order_index',
+                  'processing_status', 'derivatives', 'created_at']
 
     def get_media_url(self, obj):
         """Returns full URL for media file"""
@@ -28,14 +33,27 @@ class PostMediaSerializer(serializers.ModelSerializer):
         return None
 
     def get_thumbnail_url(self, obj):
-        """Returns thumbnail URL for images"""
+        """Returns thumbnail URL for images, in the client's preferred format"""
 
+        url = get_derivative_url(obj.derivatives, 'thumbnail', self.context.get('request'))
+        if url:
+            return url
         if obj.thumbnail_file:
             thumbnailurl = obj.thumbnail_file.url
             # print(thumbnailurl)
             return thumbnailurl
         return None
 
+    def get_srcset(self, obj):
+        """Returns every generated size in the client's preferred format"""
+
+        return get_srcset(obj.derivatives, self.context.get('request'))
+
+    def get_derivatives(self, obj):
+        """Returns {name: {url, width, height, bytes, variants}} for each generated size"""
+
+        return get_derivative_urls(obj.derivatives)
+
 
 class ReactionSerializer(serializers.ModelSerializer):
     """
@@ -0,0 +1,187 @@
+import asyncio
+import time
+from collections import deque
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from accounts.models import BlockedUser
+from groups.models import Group
+from realtime.events import build_batch_frame
+from realtime.groups import PUBLIC_TOPIC, parse_topic, public_shard_group, topic_group
+from realtime.streams import Stream
+
+
+@database_sync_to_async
+def get_blocked_user_ids(user_id):
+    """Returns IDs of users blocked by, or blocking, the given user"""
+
+    blocks = BlockedUser.objects.filter(
+        Q(blocker_id=user_id) | Q(blocked_id=user_id)
+    ).values_list('blocker_id', 'blocked_id')
+    return {blocked if blocker == user_id else blocker for blocker, blocked in blocks}
+
+
+@database_sync_to_async
+def can_view_group(user_id, group_id):
+    """Public groups are open to everyone, others to approved members only"""
+
+    return Group.objects.filter(id=group_id).filter(
+        Q(privacy='public') |
+        Q(memberships__user_id=user_id, memberships__status='approved')
+    ).exists()
+
+
+class PostStream(Stream):
+    """
+    Streams new posts to the connected user:
+    - Personal group with own, friends' and followers' posts
+    - Topic subscriptions: sharded public feed, authors, hashtags, groups
+    - Drops broadcasts from blocked users
+    - Batches broadcasts into one digest frame per interval under load
+    - Sends media_ready updates once a post's image derivatives exist
+
+    Client messages (JSON):
+    - {"action": "subscribe", "topic": "hashtag:django"}
+    - {"action": "unsubscribe", "topic": "public"}
+    - {"action": "digest", "interval": 5}  (0 turns explicit digest mode off)
+    """
+
+    name = 'posts'
+    event_types = (
+        'new_post', 'broadcast_post', 'media_ready', 'broadcast_media_ready', 'blocks_changed')
+
+    async def open(self):
+        self.topics = {}
+        self.blocked_ids = await get_blocked_user_ids(self.user.id)
+        self.recent_post_ids = deque(maxlen=256)
+
+        self.digest_interval = 0
+        self.digest_buffer = []
+        self.digest_task = None
+        self.window_start = time.monotonic()
+        self.window_count = 0
+
+        await self.join(f'posts_{self.user.id}')
+        await self.subscribe(PUBLIC_TOPIC)
+
+    async def close(self):
+        if self.digest_task:
+            self.digest_task.cancel()
+        self.topics = {}
+        await super().close()
+
+    async def handle(self, message):
+        action = message.get('action')
+        if action == 'subscribe':
+            error = await self.subscribe(message.get('topic'))
+        elif action == 'unsubscribe':
+            error = await self.unsubscribe(message.get('topic'))
+        elif action == 'digest':
+            error = self.set_digest_interval(message.get('interval'))
+        else:
+            return "Unknown action."
+
+        if not error:
+            await self.reply({"type": action, "topics": sorted(self.topics)})
+        return error
+
+    async def subscribe(self, topic):
+        """Joins a topic's broadcast group; returns an error message or None"""
+
+        if topic in self.topics:
+            return None
+        parsed = parse_topic(topic)
+        if parsed is None:
+            return "Invalid topic."
+        if len(self.topics) >= settings.MAX_TOPIC_SUBSCRIPTIONS:
+            return "Too many subscriptions."
+
+        kind, value = parsed
+        if kind == PUBLIC_TOPIC:
+            group = public_shard_group(self.user.id)
+        else:
+            if kind == 'group' and not await can_view_group(self.user.id, int(value)):
+                return "You are not a member of this group."
+            group = topic_group(kind, value)
+
+        self.topics[topic] = group
+        await self.join(group)
+        return None
+
+    async def unsubscribe(self, topic):
+        """Leaves a topic's broadcast group; returns an error message or None"""
+
+        group = self.topics.pop(topic, None)
+        if group is None:
+            return "Not subscribed."
+        await self.leave(group)
+        return None
+
+    def set_digest_interval(self, interval):
+        """Turns explicit digest mode on (seconds) or off (0)"""
+
+        try:
+            interval = float(interval)
+        except (TypeError, ValueError):
+            return "Interval must be a number of seconds."
+        if not 0 <= interval <= settings.POST_DIGEST_MAX_INTERVAL:
+            return f"Interval must be between 0 and {settings.POST_DIGEST_MAX_INTERVAL} seconds."
+        self.digest_interval = interval
+        return None
+
+    def is_duplicate(self, post_id):
+        """A post can reach a socket through several groups; send it once"""
+
+        if post_id in self.recent_post_ids:
+            return True
+        self.recent_post_ids.append(post_id)
+        return False
+
+    def in_digest_mode(self):
+        """Explicitly requested, or automatic when broadcasts exceed the threshold"""
+
+        now = time.monotonic()
+        if now - self.window_start >= 1:
+            self.window_start, self.window_count = now, 0
+        self.window_count += 1
+        return self.digest_interval > 0 or self.window_count > settings.POST_DIGEST_THRESHOLD
+
+    async def flush_digest_later(self):
+        await asyncio.sleep(self.digest_interval or settings.POST_DIGEST_INTERVAL)
+        events, self.digest_buffer = self.digest_buffer, []
+        self.digest_task = None
+        if events:
+            await self.deliver(build_batch_frame("new_post_digest", "posts", events))
+
+    async def new_post(self, event):
+        # Payload was encoded once at publish time; forward it unchanged
+        if self.is_duplicate(event.get('post_id')):
+            return
+        await self.deliver(event)
+
+    async def broadcast_post(self, event):
+        """Public/topic broadcasts: block-filtered and digest-batched"""
+
+        if event['author_id'] in self.blocked_ids or self.is_duplicate(event['post_id']):
+            return
+
+        if self.in_digest_mode():
+            self.digest_buffer.append(event)
+            if self.digest_task is None:
+                self.digest_task = asyncio.create_task(self.flush_digest_later())
+        else:
+            await self.deliver(event)
+
+    async def media_ready(self, event):
+        if not self.is_duplicate(('media_ready', event['post_id'])):
+            await self.deliver(event)
+
+    async def broadcast_media_ready(self, event):
+        if event['author_id'] in self.blocked_ids:
+            return
+        await self.media_ready(event)
+
+    async def blocks_changed(self, event):
+        """Reloads the block list after the user blocks or is blocked by someone"""
+
+        self.blocked_ids = await get_blocked_user_ids(self.user.id)
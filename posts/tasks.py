@@ -0,0 +1,162 @@
+import logging
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Q, Case, When, F
+from connections.models import Connection
+from groups.models import Group
+from realtime.events import build_event, group_send_many, send_to_groups
+from realtime.groups import public_shard_groups, topic_group
+from realtime.presence import get_reachable_user_ids
+from realtime.replay import record_events
+from utils.media import adopt_blob, build_blob_derivatives
+from .models import Post
+from .serializers import PostMediaSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def get_post_recipient_ids(user_id):
+    """
+    Returns IDs of everyone who should receive a user's 'friends' posts:
+    - Accepted friends, whichever side sent the request
+    - Accepted followers of the user
+    Resolved in a single query without loading User objects.
+    """
+
+    return Connection.objects.filter(
+        Q(requester_id=user_id, connection_type='friend') | Q(target_id=user_id),
+        status='accepted'
+    ).annotate(
+        recipient_id=Case(
+            When(requester_id=user_id, then=F('target_id')),
+            default=F('requester_id'),
+        )
+    ).values_list('recipient_id', flat=True).distinct()
+
+
+def get_broadcast_groups(author_id, post_data):
+    """
+    Returns the broadcast groups for a public post:
+    - Every public shard, plus the author and hashtag topics
+    - Only the group topic for posts in private/secret groups
+    """
+
+    group_id = post_data.get('group')
+    if group_id and Group.objects.filter(id=group_id).exclude(privacy='public').exists():
+        return [topic_group('group', group_id)]
+
+    groups = public_shard_groups()
+    groups.append(topic_group('author', author_id))
+    groups.extend(topic_group('hashtag', tag) for tag in post_data.get('tags', []))
+    if group_id:
+        groups.append(topic_group('group', group_id))
+    return groups
+
+
+def deliver_post_event(author_id, visibility, post_data, event, broadcast_type):
+    """
+    Delivers an event about a post to everyone who can see the post:
+    - Always the author's own group
+    - Sharded public and topic groups for public posts (as `broadcast_type`)
+    - Each friend's and follower's group for 'friends' posts
+    Offline recipients are skipped (see PRESENCE_SKIP_OFFLINE); they see the
+    post in their feed instead.
+    Returns the number of personal and broadcast groups sent to.
+    """
+
+    channel_layer = get_channel_layer()
+
+    recipient_ids = [author_id]
+    if visibility == 'friends':
+        recipient_ids.extend(get_post_recipient_ids(author_id))
+    recipient_ids = get_reachable_user_ids(recipient_ids)
+
+    # Personal deliveries are recorded so reconnecting clients can replay them
+    seqs = record_events('posts', recipient_ids, event)
+    personal = [
+        (f"posts_{recipient_id}", {**event, "seq": seqs[recipient_id]})
+        for recipient_id in recipient_ids
+    ]
+
+    broadcast_groups = []
+    if visibility == 'public':
+        broadcast_groups = get_broadcast_groups(author_id, post_data)
+
+    async def deliver():
+        await send_to_groups(
+            channel_layer, personal, settings.POST_FANOUT_CONCURRENCY)
+        await group_send_many(
+            channel_layer, broadcast_groups, {**event, "type": broadcast_type},
+            settings.POST_FANOUT_CONCURRENCY)
+
+    # One event loop for the whole fan-out
+    async_to_sync(deliver)()
+    return len(personal), len(broadcast_groups)
+
+
+@shared_task(ignore_result=True)
+def fan_out_new_post(author_id, visibility, post_data):
+    """Delivers a newly created post to every interested WebSocket group"""
+
+    # Encoded once; personal and broadcast messages share the same payload
+    event = build_event(
+        "new_post",
+        {"type": "new_post", "post": post_data},
+        post_id=post_data['id'],
+        author_id=author_id,
+    )
+    personal, broadcast = deliver_post_event(
+        author_id, visibility, post_data, event, "broadcast_post")
+
+    logger.info(
+        f"Fanned out post {post_data['id']} from user {author_id} to "
+        f"{personal} personal and {broadcast} broadcast groups")
+
+
+@shared_task(ignore_result=True)
+def process_post_media(post_id):
+    """
+    Processes a post's media in the 'processing' state, then tells the post's
+    audience with a media_ready event:
+    - Direct uploads are hashed and deduplicated
+    - Images get their derivatives (generated once per distinct content)
+    """
+
+    try:
+        post = Post.objects.get(id=post_id)
+    except Post.DoesNotExist:
+        # Deleted before the worker got to it
+        return
+
+    for media in post.media.filter(processing_status='processing').select_related('blob'):
+        try:
+            if media.blob is None:
+                # Uploaded straight to storage: deduplicated here, off the web workers
+                media.blob = adopt_blob(media.media_file.name, media.media_type)
+                media.media_file.name = media.blob.path
+            if media.media_type == 'image':
+                # Shared with every duplicate of this content
+                media.derivatives = build_blob_derivatives(media.blob, "post_media")
+                media.thumbnail_file.name = media.derivatives.get('thumbnail', {}).get('path', '')
+            media.processing_status = 'ready'
+        except Exception as e:
+            logger.error(f"Error processing post media {media.id}: {e}")
+            media.processing_status = 'failed'
+        media.save(update_fields=[
+            'blob', 'media_file', 'derivatives', 'thumbnail_file', 'processing_status'])
+
+    medias = PostMediaSerializer(post.media.order_by('order_index'), many=True).data
+    event = build_event(
+        "media_ready",
+        {"type": "media_ready", "post_id": post.id, "medias": medias},
+        post_id=post.id,
+        author_id=post.user_id,
+    )
+    post_data = {
+        "id": post.id,
+        "group": post.group_id,
+        "tags": list(post.hashtags.values_list('name', flat=True)),
+    }
+    deliver_post_event(post.user_id, post.visibility, post_data, event, "broadcast_media_ready")
@@ -1,28 +1,29 @@
-import io
 from django.forms import ValidationError
 from rest_framework import generics, status, permissions, filters
-from channels.layers import get_channel_layer
 from django.shortcuts import get_object_or_404
-from PIL import Image
+from django.urls import reverse
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from accounts.models import BlockedUser, User
 from accounts.serializers import UserSerializer
-from utils.aws import upload_file_to_s3
+from utils.media import acquire_blobs, claim_direct_uploads, get_blob_media_fields, get_upload_ids, upload_media_files
+from .tasks import fan_out_new_post, process_post_media
+from accounts.deletion import tombstone_post
+from accounts.tasks import run_deletion_job
 from .serializers import CommentReactionSerializer, PostSerializer, ReactionSerializer, CommentSerializer, HashtagSerializer, SavedPostSerializer, SharedPostCommentReactionSerializer, SharedPostCommentSerializer, SharedPostReactionSerializer, SharedPostSerializer
 from .models import CommentReaction, Post, Hashtag, PostMedia, Reaction, SavedPost, SharedPost, SharedPostComment, SharedPostCommentReaction, SharedPostReaction
 from django.utils import timezone
 from django.db.models import Q, Count, Case, When, Value, F, IntegerField
 from posts.models import Comment
 from notifications.models import Notification
+from notifications.tasks import deliver_notification
 from connections.models import Connection
 from django.core.files.storage import default_storage
-from rest_framework.parsers import MultiPartParser, FormParser
-from asgiref.sync import async_to_sync
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.db import transaction
 from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
 import logging
 from storages.backends.s3boto3 import S3Boto3Storage
@@ -35,134 +36,70 @@ logger = logging.getLogger(__name__)
 class PostCreateView(generics.CreateAPIView):
     """
     Handles post creation with media uploads:
-    - Processes multiple media files
-    - Generates thumbnails for images
+    - Uploads multiple media files concurrently
+    - Stores each distinct content once (see uploads.models.MediaBlob)
+    - Generates image thumbnails and other sizes in the background
     - Stores files in S3-compatible storage
+    - Accepts files uploaded straight to storage by ID ('upload_ids', see
+      uploads.views.DirectUploadView), so the request itself stays small
+    - Reports files that failed to upload in 'failed_media'
     """
 
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser)
+    parser_classes = (MultiPartParser, FormParser, JSONParser)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if self.failed_media:
+            response.data["failed_media"] = self.failed_media
+        return response
 
     def perform_create(self, serializer):
-        """Processes and uploads media files to cloud storage"""
+        """Uploads media files concurrently, then attaches them in one query"""
 
         media_files = self.request.FILES.getlist('media_files')
         post = serializer.save(user=self.request.user)
-        user = post.user
-        channel_layer = get_channel_layer()
+
+        uploads = upload_media_files(media_files)
+        uploads += claim_direct_uploads(
+            self.request.user, get_upload_ids(self.request.data), start_index=len(uploads))
+        medias = []
+        for upload in uploads:
+            if upload["error"]:
+                continue
+            # Images get their thumbnail and other sizes from a worker, unless
+            # the same content was uploaded before and already has them
+            fields = get_blob_media_fields(upload["blob"], upload["media_type"])
+            medias.append(PostMedia(
+                post=post,
+                blob=upload["blob"],
+                media_type=upload["media_type"],
+                media_file=upload["path"],
+                thumbnail_file=fields["thumbnail"],
+                order_index=upload["index"],
+                processing_status=fields["processing_status"],
+                derivatives=fields["derivatives"],
+            ))
+        PostMedia.objects.bulk_create(medias)
+        acquire_blobs([media.blob_id for media in medias if media.blob_id])
+
+        # Failed files are reported without failing the post
+        self.failed_media = [
+            {"index": upload["index"], "file": upload["name"], "error": upload["error"]}
+            for upload in uploads if upload["error"]
+        ]
+
+        # Serialize once (after media is attached) and hand the WebSocket
+        # fan-out to a background worker so the request does not wait on it.
         post_data = PostSerializer(
             post, context={"request": self.request}).data
+        transaction.on_commit(lambda: fan_out_new_post.delay(
+            post.user_id, post.visibility, post_data))
 
-        print(f"\n=========== New Post Created ==========")
-        print(f"Author: {user.id} | Visibility: {post.visibility}")
-
-        for file in media_files:
-            media_type = 'image' if file.name.lower().endswith(
-                ('jpg', 'jpeg', 'png', 'gif')) else 'video'
-
-            try:
-                saved_path, s3_url = upload_file_to_s3(
-                    file, folder="post_media")
-                logger.info(f"File uploaded to s3: {s3_url}")
-
-                media = PostMedia.objects.create(
-                    post=post,
-                    media_type=media_type
-                )
-
-                media.media_file.name = saved_path
-                media.save()
-
-                if media_type == 'image':
-                    file.seek(0)
-                    try:
-                        image = Image.open(file)
-                        image.thumbnail((200, 200))
-                        thumb_io = io.BytesIO()
-                        image_format = image.format if image.format else 'JPEG'
-                        image.save(thumb_io, format=image_format)
-                        thumb_file = ContentFile(
-                            thumb_io.getvalue(), name=f"thumb_{file.name}")
-
-                        thumb_path, thumb_url = upload_file_to_s3(
-                            thumb_file, folder='post_media/thumbnails')
-                        media.thumbnail_file.name = thumb_path
-                        media.save()
-                        logger.info(f"Thumbnail saved to S3: {thumb_url}")
-                    except Exception as e:
-                        logger.error(
-                            f"Error generating thumbnail for {file.name}: {e}")
-
-            except Exception as e:
-                logger.error(f"Error uploading file {file.name}: {e}")
-
-        # channel_layer = get_channel_layer()
-        # print(f"Channel Layer: {channel_layer}")
-        # print(f"Sending to group: posts_{post.user.id}")
-        # async_to_sync(channel_layer.group_send)(
-        #     f"posts_{post.user.id}",
-        #     {
-        #         "type": "new_post",
-        #         "post": PostSerializer(post, context={"request": self.request}).data,
-        #     }
-        # )
-        print(f"Sending to author (user {user.id})")
-        async_to_sync(channel_layer.group_send)(
-            f"posts_{user.id}",
-            {
-                "type": "new_post",
-                "post": post_data
-            }
-        )
-
-        if post.visibility == "public":
-            print("\nHandling PUBLIC post")
-            async_to_sync(channel_layer.group_send)(
-                "public_posts",
-                {
-                    "type": "new_post",
-                    "post": post_data
-                }
-            )
-
-        elif post.visibility == 'friends':
-            print("\nChecking friends...")
-
-            friends = set()
-            connections = Connection.objects.filter(
-                (Q(requester=user) | Q(target=user)),
-                connection_type='friend',
-                status='accepted'
-            )
-            print(f"Found {connections.count()} connections")
-
-            for conn in connections:
-                friend = conn.target if conn.requester == user else conn.requester
-                friends.add(friend)
-                print(f" - Friend: {friend.id}")
-
-            followers = set()
-            if post.visibility == "friends":
-                followers = User.objects.filter(
-                    sent_requests__target=user,
-                    sent_requests__connection_type='follower',
-                    sent_requests__status='accepted'
-                )
-                print(f"Found {followers.count()} followers")
-
-            receivers = friends.union(followers)
-            print(f"\nTotal receivers: {len(receivers)}")
-
-            for receiver in receivers:
-                print(f"Sending to user {receiver.id}")
-                async_to_sync(channel_layer.group_send)(
-                    f"posts_{receiver.id}",
-                    {
-                        "type": "new_post",
-                        "post": post_data
-                    }
-                )
+        # Queued after the fan-out so media_ready follows new_post
+        if any(media.processing_status == 'processing' for media in medias):
+            transaction.on_commit(lambda: process_post_media.delay(post.id))
 
 
 class FeedPagination(PageNumberPagination):
@@ -239,8 +176,9 @@ class FeedView(APIView):
             post['item_type'] = 'post'
 
         # Retrieve shared posts.
+        # Shares of deleted (tombstoned) posts disappear with the post
         shared_qs = SharedPost.objects.select_related(
-            'user', 'original_post').all().order_by('-created_at')
+            'user', 'original_post').filter(original_post__deleted_at__isnull=True).order_by('-created_at')
 
         # Exclude shared posts if the sharer or the original post's user is blocked
         shared_qs = shared_qs.exclude(
@@ -305,18 +243,7 @@ class ReactionView(APIView):
                         reference_id=post.id,
                         message=f"{request.user.username} updated their reaction on your post."
                     )
-                    channel_layer = get_channel_layer()
-                    async_to_sync(channel_layer.group_send)(
-                        f"notifications_{notification.user.id}",
-                        {
-                            "type": "send_notification",
-                            "notification": {
-                                "id": notification.id,
-                                "type": notification.type,
-                                "message": notification.message,
-                            }
-                        }
-                    )
+                    transaction.on_commit(lambda: deliver_notification.delay(notification.id))
                 return Response({"message": "Reaction updated.", "reaction": serializer.data}, status=status.HTTP_200_OK)
         else:
             serializer = ReactionSerializer(
@@ -330,18 +257,7 @@ class ReactionView(APIView):
                     reference_id=post.id,
                     message=f"{request.user.username} updated their reaction on your post."
                 )
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{notification.user.id}",
-                    {
-                        "type": "send_notification",
-                        "notification": {
-                                "id": notification.id,
-                                "type": notification.type,
-                                "message": notification.message,
-                        }
-                    }
-                )
+                transaction.on_commit(lambda: deliver_notification.delay(notification.id))
 
         return Response({'message': 'Reaction recorder'}, status=status.HTTP_200_OK)
 
@@ -376,18 +292,7 @@ class CommentView(APIView):
                 )
 
             if notification:
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    f"notifications_{notification.user.id}",
-                    {
-                        "type": "send_notification",
-                        "notification": {
-                            "id": notification.id,
-                            "type": notification.type,
-                            "message": notification.message
-                        }
-                    }
-                )
+                transaction.on_commit(lambda: deliver_notification.delay(notification.id))
 
             return Response({"message": "Comment added.", "comment": CommentSerializer(comment).data}, status=status.HTTP_201_CREATED)
 
@@ -397,7 +302,7 @@ class CommentView(APIView):
         """Retrieves comments with privacy checks"""
         post_owner = request.user
         comments = Comment.objects.filter(
-            post_id=post_id, parent=None).order_by('-created_at')
+            post_id=post_id, post__deleted_at__isnull=True, parent=None).order_by('-created_at')
 
         if not request.user.is_authenticated or post_owner != request.user:
             comments = comments.filter(is_hidden=False)
@@ -436,7 +341,7 @@ class ToggleCommentVisibilityView(APIView):
 
     def patch(self, request, comment_id):
         """Toggles comment's hidden status"""
-        comment = get_object_or_404(Comment, id=comment_id)
+        comment = get_object_or_404(Comment, id=comment_id, post__deleted_at__isnull=True)
         if comment.post.user != request.user:
             return Response({"error": "You do not have permission to hide/unhide this comment."}, status=status.HTTP_403_FORBIDDEN)
 
@@ -461,10 +366,15 @@ class PostDeleteView(generics.DestroyAPIView):
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        self.perform_destroy(instance)
+        with transaction.atomic():
+            # Hidden at once; comments, reactions, shares and media are removed in batches
+            job = tombstone_post(instance)
+            transaction.on_commit(lambda: run_deletion_job.delay(job.id))
         return Response({
-            "message": "Post deleted successfully."
-        }, status=status.HTTP_200_OK)
+            "message": "Post deleted successfully.",
+            "deletion_id": job.id,
+            "status_url": reverse('deletion-status', args=[job.id]),
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class PostPagination(PageNumberPagination):
@@ -486,7 +396,7 @@ class UserPostListView(generics.ListAPIView):
         """Applies privacy rules and blocking filters"""
         username = self.kwargs.get("username")
         try:
-            viewed_user = User.objects.get(username=username)
+            viewed_user = User.objects.get(username=username, is_active=True)
         except User.DoesNotExist:
             raise NotFound("User Not Found.")
 
@@ -501,11 +411,7 @@ class UserPostListView(generics.ListAPIView):
         if viewed_user.id in blocked_by_user or viewed_user.id in blocked_by_others:
             raise NotFound("This profile is not available")
 
-        privacy = 'public'
-
-        if viewed_user.profile.privacy_settings:
-            privacy = viewed_user.profile.privacy_settings.get(
-                "profile_visibility", "public")
+        privacy = viewed_user.profile.visibility
 
         if privacy == "public":
             return Post.objects.filter(user=viewed_user, visibility='public').order_by('-created_at')
@@ -594,7 +500,7 @@ class SavedPostListView(generics.ListAPIView):
         """Applies blocking filters to saved posts"""
         user = self.request.user
         queryset = SavedPost.objects.filter(
-            user=user).select_related('post', 'post__user')
+            user=user, post__deleted_at__isnull=True).select_related('post', 'post__user')
         blocked_by_user = BlockedUser.objects.filter(
             blocker=user).values_list('blocked', flat=True)
         blocked_by_others = BlockedUser.objects.filter(
@@ -655,7 +561,7 @@ class SharePostView(generics.CreateAPIView):
             'is_shared', 'false').lower() == "true"
 
         if is_shared:
-            shared_instance = get_object_or_404(SharedPost, id=post_id)
+            shared_instance = get_object_or_404(SharedPost, id=post_id, original_post__deleted_at__isnull=True)
             post = shared_instance.original_post
             parent_share = shared_instance
         else:
@@ -684,7 +590,7 @@ class UserSharedPostsView(generics.ListAPIView):
 
     def get_queryset(self):
         user_id = self.kwargs.get("user_id")
-        return SharedPost.objects.filter(user__id=user_id).order_by('-created_at')
+        return SharedPost.objects.filter(user__id=user_id, original_post__deleted_at__isnull=True).order_by('-created_at')
 
 
 class SharedPostReactionView(APIView):
@@ -697,7 +603,7 @@ class SharedPostReactionView(APIView):
 
     def post(self, request, shared_post_id):
         # Ensure the shared post exists.
-        shared_post = get_object_or_404(SharedPost, id=shared_post_id)
+        shared_post = get_object_or_404(SharedPost, id=shared_post_id, original_post__deleted_at__isnull=True)
 
         reaction_type = request.data.get('type')
         if not reaction_type:
@@ -746,7 +652,7 @@ class SharedPostCommentView(APIView):
 
     def post(self, request, shared_post_id):
         # Ensure the shared post exists.
-        shared_post = get_object_or_404(SharedPost, id=shared_post_id)
+        shared_post = get_object_or_404(SharedPost, id=shared_post_id, original_post__deleted_at__isnull=True)
         # Prepare data: add the shared_post ID to the data.
         data = request.data.copy()
         data['shared_post'] = shared_post_id
@@ -765,7 +671,7 @@ class CommentReactionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, comment_id):
-        comment = get_object_or_404(Comment, id=comment_id)
+        comment = get_object_or_404(Comment, id=comment_id, post__deleted_at__isnull=True)
         reaction_type = request.data.get('type')
 
         if not reaction_type:
@@ -819,7 +725,7 @@ class SharedPostCommentReactionView(APIView):
 
     def post(self, request, shared_comment_id):
         shared_comment = get_object_or_404(
-            SharedPostComment, id=shared_comment_id)
+            SharedPostComment, id=shared_comment_id, shared_post__original_post__deleted_at__isnull=True)
 
         reaction_type = request.data.get('type')
         if not reaction_type:
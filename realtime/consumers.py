@@ -0,0 +1,296 @@
+import json
+import asyncio
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from .events import ENCODINGS, build_stream_frame, encode_payload
+from .presence import heartbeat, mark_offline, mark_online
+from .replay import current_seq, get_missed_events
+from .streams import FlowControl, get_stream_classes
+
+
+class EncodedEventMixin:
+    """
+    Consumer mixin for forwarding pre-encoded events:
+    - Negotiates the wire format from the `encoding` query parameter
+    - Sends the payload as encoded at publish time, without re-serializing
+    """
+
+    encoding = 'json'
+
+    def negotiate_encoding(self):
+        """Picks the client's requested encoding if the server supports it"""
+
+        params = parse_qs(self.scope.get("query_string", b"").decode("utf-8"))
+        requested = params.get("encoding", ["json"])[0]
+        self.encoding = requested if requested in ENCODINGS else 'json'
+
+    async def forward(self, event):
+        """Sends an event's pre-encoded payload in the negotiated format"""
+
+        if self.encoding == 'msgpack' and "bytes" in event:
+            await self.send(bytes_data=event["bytes"])
+        else:
+            await self.send(text_data=event["text"])
+
+
+class StreamConsumer(EncodedEventMixin, AsyncWebsocketConsumer):
+    """
+    Multiplexed WebSocket carrying several named streams (see REALTIME_STREAMS)
+    over one authenticated connection.
+
+    Client messages (JSON):
+    - {"action": "subscribe", "stream": "posts"}
+    - {"action": "unsubscribe", "stream": "notifications"}
+    - {"action": "credit", "stream": "posts", "credits": 20}
+    - {"action": "resume", "last_seq": 41}
+    - {"action": "heartbeat"}  (optional; the server refreshes presence itself)
+    - {"stream": "posts", "data": {...}}  (passed to the stream itself)
+
+    Server frames: {"stream": "<name>", "seq": <id>, "payload": <event>}
+    ('seq' is present on per-user events, which are kept for replay)
+
+    Streams can also be opened on connect with ?streams=posts,notifications,
+    and missed events replayed with ?last_seq=41.
+    A stream is unthrottled until the client first grants credits; from then
+    on each frame costs one credit and excess frames wait in a bounded buffer.
+    """
+
+    # Streams opened on every connection, before any ?streams= ones
+    default_streams = ()
+    # Wrap frames in a {"stream", "payload"} envelope
+    enveloped = True
+
+    async def connect(self):
+        self.user = self.scope.get("user")
+        if self.user is None or self.user.is_anonymous:
+            await self.close()
+            return
+
+        self.negotiate_encoding()
+        self.stream_classes = get_stream_classes()
+        self.event_types = {
+            event_type
+            for stream_class in self.stream_classes.values()
+            for event_type in stream_class.event_types
+        }
+        self.streams = {}
+        self.handlers = {}
+        self.flow = {}
+        # Highest sequence ID sent by replay; older live copies are dropped
+        self.replayed_through = 0
+
+        await self.go_online()
+        for name in self.get_initial_streams():
+            await self.open_stream(name)
+        await self.accept()
+
+        last_seq = self.get_last_seq()
+        if last_seq is not None:
+            await self.resume(last_seq)
+
+    async def disconnect(self, close_code):
+        for name in list(getattr(self, 'streams', {})):
+            await self.close_stream(name)
+        if getattr(self, 'heartbeat_task', None):
+            self.heartbeat_task.cancel()
+            await sync_to_async(mark_offline)(self.user.id)
+
+    async def go_online(self):
+        """
+        Registers the connection with the presence service and keeps it alive.
+        Events published while the user was offline may have been skipped, so
+        replay only covers sequence IDs issued from here on.
+        """
+
+        came_online = await sync_to_async(mark_online)(self.user.id)
+        self.online_since = 0
+        if came_online and settings.PRESENCE_SKIP_OFFLINE:
+            self.online_since = await sync_to_async(current_seq)(self.user.id)
+        self.heartbeat_task = asyncio.create_task(self.keep_alive())
+
+    async def keep_alive(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_HEARTBEAT_INTERVAL)
+            await sync_to_async(heartbeat)(self.user.id)
+
+    def get_initial_streams(self):
+        params = parse_qs(self.scope.get("query_string", b"").decode("utf-8"))
+        requested = [
+            name for value in params.get("streams", []) for name in value.split(",")]
+        return [*self.default_streams, *requested]
+
+    def get_last_seq(self):
+        params = parse_qs(self.scope.get("query_string", b"").decode("utf-8"))
+        try:
+            return int(params["last_seq"][0])
+        except (KeyError, ValueError):
+            return None
+
+    async def dispatch(self, message):
+        """Routes channel layer events to the stream that handles them"""
+
+        if message["type"] in getattr(self, 'event_types', ()):
+            stream = self.handlers.get(message["type"])
+            # Events still in flight for a closed stream are dropped
+            if stream is not None:
+                await getattr(stream, message["type"])(message)
+            return
+        await super().dispatch(message)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or '')
+            if not isinstance(message, dict):
+                raise ValueError
+        except ValueError:
+            await self.send(text_data=json.dumps({"type": "error", "error": "Invalid message."}))
+            return
+
+        if message.get("action") == 'heartbeat':
+            await sync_to_async(heartbeat)(self.user.id)
+            await self.send(text_data=json.dumps({"type": "heartbeat"}))
+            return
+        await self.handle_message(message)
+
+    async def handle_message(self, message):
+        name = message.get("stream")
+
+        if "data" in message:
+            stream = self.streams.get(name)
+            if stream is None or not isinstance(message["data"], dict):
+                error = "Not subscribed." if stream is None else "Invalid message."
+                await self.send(text_data=json.dumps(
+                    {"type": "error", "stream": name, "error": error}))
+                return
+            await self.handle_stream_message(stream, message["data"])
+            return
+
+        action = message.get("action")
+        if action == 'subscribe':
+            error = await self.open_stream(name)
+        elif action == 'unsubscribe':
+            error = await self.close_stream(name)
+        elif action == 'credit':
+            error = await self.grant_credits(name, message.get("credits"))
+        elif action == 'resume':
+            last_seq = message.get("last_seq")
+            if not isinstance(last_seq, int) or last_seq < 0:
+                error = "last_seq must be a non-negative integer."
+            else:
+                await self.resume(last_seq)
+                return
+        else:
+            error = "Unknown action."
+
+        if error:
+            content = {"type": "error", "action": action, "stream": name, "error": error}
+        else:
+            content = {"type": action, "stream": name, "streams": sorted(self.streams)}
+        await self.send(text_data=json.dumps(content))
+
+    async def handle_stream_message(self, stream, data):
+        error = await stream.handle(data)
+        if error:
+            await stream.reply({"type": "error", "action": data.get("action"), "error": error})
+
+    async def open_stream(self, name):
+        if name in self.streams:
+            return None
+        stream_class = self.stream_classes.get(name)
+        if stream_class is None:
+            return "Unknown stream."
+
+        stream = stream_class(self)
+        self.streams[name] = stream
+        self.flow[name] = FlowControl()
+        for event_type in stream_class.event_types:
+            self.handlers[event_type] = stream
+        await stream.open()
+        return None
+
+    async def close_stream(self, name):
+        stream = self.streams.pop(name, None)
+        if stream is None:
+            return "Not subscribed."
+
+        for event_type in stream.event_types:
+            self.handlers.pop(event_type, None)
+        self.flow.pop(name, None)
+        await stream.close()
+        return None
+
+    async def grant_credits(self, name, credits):
+        flow = self.flow.get(name)
+        if flow is None:
+            return "Not subscribed."
+        if not isinstance(credits, int) or not 0 < credits <= settings.STREAM_MAX_CREDITS:
+            return f"Credits must be an integer between 1 and {settings.STREAM_MAX_CREDITS}."
+
+        flow.grant(credits)
+        stream = self.streams[name]
+        while flow.buffer and flow.can_send():
+            flow.consume()
+            await self.forward(self.frame(stream, flow.buffer.popleft()))
+
+        if flow.dropped:
+            await stream.reply({"type": "overflow", "dropped": flow.dropped})
+            flow.dropped = 0
+        return None
+
+    async def resume(self, last_seq):
+        """
+        Replays buffered per-user events newer than `last_seq` for the open
+        streams. Tells the client to refetch when the gap is no longer buffered.
+        """
+
+        events, current = await sync_to_async(get_missed_events)(self.user.id, last_seq)
+        if last_seq < self.online_since:
+            events = None
+        if events is None:
+            self.replayed_through = current
+            await self.send(text_data=json.dumps({"type": "resync_required", "last_seq": current}))
+            return
+
+        for seq, name, encoded in events:
+            stream = self.streams.get(name)
+            if stream is not None:
+                await self.deliver(stream, {**encoded, "seq": seq})
+        self.replayed_through = events[-1][0] if events else last_seq
+        await self.send(text_data=json.dumps(
+            {"type": "resume", "replayed": len(events), "last_seq": current}))
+
+    def frame(self, stream, encoded):
+        return build_stream_frame(stream.name, encoded) if self.enveloped else encoded
+
+    async def deliver(self, stream, encoded):
+        """Sends a stream's pre-encoded payload, or buffers it without credits"""
+
+        if encoded.get("seq", self.replayed_through + 1) <= self.replayed_through:
+            return
+
+        flow = self.flow[stream.name]
+        if not flow.can_send():
+            flow.hold(encoded)
+            return
+        flow.consume()
+        await self.forward(self.frame(stream, encoded))
+
+    async def reply(self, stream, content):
+        await self.forward(self.frame(stream, encode_payload(content)))
+
+
+class SingleStreamConsumer(StreamConsumer):
+    """
+    Serves exactly one stream with bare (un-enveloped) frames, for clients of
+    the per-stream endpoints. Every client message goes to that stream.
+    """
+
+    enveloped = False
+
+    def get_initial_streams(self):
+        return list(self.default_streams)
+
+    async def handle_message(self, message):
+        await self.handle_stream_message(self.streams[self.default_streams[0]], message)
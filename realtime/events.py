@@ -0,0 +1,101 @@
+import asyncio
+import json
+import logging
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; clients fall back to JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Wire formats a client may negotiate on connect
+ENCODINGS = ('json', 'msgpack') if msgpack else ('json',)
+
+
+def encode_payload(payload):
+    """
+    Encodes a WebSocket payload once for every supported wire format:
+    - 'text': JSON string (always present)
+    - 'bytes': msgpack binary (only when msgpack is installed)
+    """
+
+    encoded = {"text": json.dumps(payload, cls=DjangoJSONEncoder)}
+    if msgpack is not None:
+        encoded["bytes"] = msgpack.packb(payload, default=str)
+    return encoded
+
+
+def build_event(handler, payload, **meta):
+    """
+    Builds a channel layer message carrying a pre-encoded payload.
+    `handler` is the consumer method name that forwards it (e.g. 'new_post').
+    Extra keyword arguments travel alongside the payload for server-side
+    filtering and are never sent to the client.
+    """
+
+    return {"type": handler, **meta, **encode_payload(payload)}
+
+
+def build_batch_frame(frame_type, key, events):
+    """
+    Joins several pre-encoded events into one frame without decoding them:
+    {"type": frame_type, key: [event, ...]}
+    Returns a dict with the same 'text'/'bytes' keys as encode_payload().
+    """
+
+    frame = {"text": '{"type": %s, "%s": [%s]}' % (
+        json.dumps(frame_type), key, ", ".join(event["text"] for event in events))}
+
+    if msgpack is not None and all("bytes" in event for event in events):
+        packer = msgpack.Packer()
+        frame["bytes"] = b"".join([
+            packer.pack_map_header(2),
+            packer.pack("type"), packer.pack(frame_type),
+            packer.pack(key), packer.pack_array_header(len(events)),
+            *(event["bytes"] for event in events),
+        ])
+    return frame
+
+
+def build_stream_frame(stream, encoded):
+    """
+    Wraps a pre-encoded payload in a multiplexing envelope without decoding it:
+    {"stream": stream, "seq": seq, "payload": payload}
+    'seq' is only present for events recorded for replay.
+    """
+
+    seq = encoded.get("seq")
+    header = {"stream": stream} if seq is None else {"stream": stream, "seq": seq}
+    frame = {"text": '%s, "payload": %s}' % (json.dumps(header)[:-1], encoded["text"])}
+
+    if msgpack is not None and "bytes" in encoded:
+        packer = msgpack.Packer()
+        frame["bytes"] = b"".join([
+            packer.pack_map_header(len(header) + 1),
+            *(packer.pack(item) for pair in header.items() for item in pair),
+            packer.pack("payload"), encoded["bytes"],
+        ])
+    return frame
+
+
+async def group_send_many(channel_layer, groups, message, concurrency):
+    """Sends one message to many groups concurrently with bounded parallelism"""
+
+    await send_to_groups(channel_layer, ((group, message) for group in groups), concurrency)
+
+
+async def send_to_groups(channel_layer, group_messages, concurrency):
+    """Sends (group, message) pairs concurrently with bounded parallelism"""
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(group, message):
+        async with semaphore:
+            try:
+                await channel_layer.group_send(group, message)
+            except Exception as e:
+                logger.error(f"Error sending to group {group}: {e}")
+
+    await asyncio.gather(*(send(group, message) for group, message in group_messages))
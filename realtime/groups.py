@@ -0,0 +1,48 @@
+import re
+from django.conf import settings
+
+# Topic a PostConsumer joins by default: the (sharded) public post feed
+PUBLIC_TOPIC = 'public'
+
+# Topics that can be followed by ID or name, e.g. "author:5", "hashtag:django"
+TOPIC_KINDS = ('author', 'hashtag', 'group')
+
+# Channel layer group names only allow ASCII letters, digits, '-', '_' and '.'
+TOPIC_VALUE_PATTERN = re.compile(r'^[A-Za-z0-9_]{1,80}$')
+
+
+def public_shard_group(user_id):
+    """Returns the public broadcast shard a user's connections join"""
+
+    return f"public_posts_{user_id % settings.PUBLIC_POST_SHARDS}"
+
+
+def public_shard_groups():
+    """Returns every public broadcast shard (a publish goes to all of them)"""
+
+    return [f"public_posts_{shard}" for shard in range(settings.PUBLIC_POST_SHARDS)]
+
+
+def topic_group(kind, value):
+    """Returns the channel group for an author/hashtag/group topic"""
+
+    return f"topic_{kind}_{str(value).lower()}"
+
+
+def parse_topic(topic):
+    """
+    Splits a client topic string into (kind, value).
+    Returns None for malformed or unsupported topics.
+    """
+
+    if topic == PUBLIC_TOPIC:
+        return PUBLIC_TOPIC, None
+    if not isinstance(topic, str) or ':' not in topic:
+        return None
+
+    kind, value = topic.split(':', 1)
+    if kind not in TOPIC_KINDS or not TOPIC_VALUE_PATTERN.match(value):
+        return None
+    if kind in ('author', 'group') and not value.isdigit():
+        return None
+    return kind, value
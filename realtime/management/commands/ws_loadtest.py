@@ -0,0 +1,251 @@
+import asyncio
+import json
+import time
+import tracemalloc
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import Profile, User
+from connections.models import Connection
+from realtime.metrics import LatencyMetric
+from social_network.celery import app as celery_app
+
+# Marker put in each generated post's content so receipts can be matched
+POST_MARKER = "loadtest:"
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests WebSocket delivery in-process: connects simulated clients to "
+        "ws/posts/ and ws/notifications/, creates posts and reactions through the "
+        "API and reports fan-out latency, throughput and memory per connection. "
+        "Runs against a throwaway test database with the in-memory channel layer, "
+        "a local cache and eager Celery tasks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000,
+                            help="Simulated users, each opening every endpoint")
+        parser.add_argument('--endpoints', default='posts,notifications',
+                            help="Comma-separated endpoints each user connects to")
+        parser.add_argument('--authors', type=int, default=10,
+                            help="Users (out of --clients) who create the posts")
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--reactions', type=int, default=100)
+        parser.add_argument('--visibility', choices=['public', 'friends'], default='public')
+        parser.add_argument('--interval', type=float, default=0.0,
+                            help="Seconds to wait between triggered actions")
+        parser.add_argument('--connect-concurrency', type=int, default=100)
+        parser.add_argument('--settle', type=float, default=3.0,
+                            help="Stop once no message arrived for this many seconds")
+        parser.add_argument('--timeout', type=float, default=120.0)
+
+    def handle(self, *args, **options):
+        endpoints = [name for name in options['endpoints'].split(',') if name]
+        if not set(endpoints) <= {'posts', 'notifications'}:
+            raise CommandError("Endpoints must be 'posts' and/or 'notifications'.")
+        if not 0 < options['authors'] < options['clients']:
+            raise CommandError("--authors must be between 1 and --clients - 1.")
+        options['endpoints'] = endpoints
+
+        overrides = override_settings(
+            CHANNEL_LAYERS={"default": {
+                "BACKEND": "channels.layers.InMemoryChannelLayer",
+                "CONFIG": {"capacity": max(100, options['posts'] + options['reactions'] + 10)},
+            }},
+            CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "ws-loadtest",
+            }},
+        )
+        eager = celery_app.conf.task_always_eager
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        overrides.enable()
+        celery_app.conf.task_always_eager = True
+        try:
+            self.stdout.write(f"Creating {options['clients']} users...")
+            users = self.create_users(options)
+            report = asyncio.run(self.run(users, options))
+        finally:
+            celery_app.conf.task_always_eager = eager
+            overrides.disable()
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        self.print_report(report)
+
+    def create_users(self, options):
+        """Creates users with profiles; every non-author befriends one author"""
+
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(username=f"load{i}", email=f"load{i}@example.com", password=password)
+            for i in range(options['clients'])
+        ])
+        Profile.objects.bulk_create([Profile(user=user, username=user.username) for user in users])
+
+        authors = users[:options['authors']]
+        Connection.objects.bulk_create([
+            Connection(requester=authors[i % len(authors)], target=user,
+                       connection_type='friend', status='accepted')
+            for i, user in enumerate(users[len(authors):])
+        ])
+        return users
+
+    async def run(self, users, options):
+        from social_network.asgi import application
+        from notifications.middleware import handshake_latency
+
+        authors = users[:options['authors']]
+        reactors = users[len(authors):]
+        tokens = {user.id: str(AccessToken.for_user(user)) for user in users}
+
+        connect_latency = LatencyMetric("connect")
+        semaphore = asyncio.Semaphore(options['connect_concurrency'])
+
+        async def connect(user, endpoint):
+            async with semaphore:
+                communicator = WebsocketCommunicator(
+                    application, f"/ws/{endpoint}/?token={tokens[user.id]}")
+                started = time.perf_counter()
+                connected, _ = await communicator.connect(timeout=options['timeout'])
+                connect_latency.observe(time.perf_counter() - started)
+                return (endpoint, communicator) if connected else None
+
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        results = await asyncio.gather(*(
+            connect(user, endpoint) for user in users for endpoint in options['endpoints']))
+        memory_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        sockets = [result for result in results if result]
+        self.stdout.write(f"Connected {len(sockets)}/{len(results)} sockets.")
+
+        sent_at = {}
+        post_latency = LatencyMetric("post_fanout")
+        notification_latency = LatencyMetric("notification")
+        stats = {"frames": 0, "last": None}
+
+        def record(key, metric, received_at):
+            if key in sent_at:
+                metric.observe(received_at - sent_at[key])
+
+        async def read(communicator):
+            while True:
+                text = await communicator.receive_from(timeout=options['timeout'])
+                received_at = time.perf_counter()
+                stats["frames"] += 1
+                stats["last"] = received_at
+                try:
+                    payload = json.loads(text)
+                except (TypeError, ValueError):
+                    continue
+                posts = payload.get("posts", [payload.get("post")] if "post" in payload else [])
+                for post in posts:
+                    content = post.get("post", post).get("content", "")
+                    record(content, post_latency, received_at)
+                if payload.get("type") == 'reaction':
+                    record(payload.get("message", "").split(" ")[0], notification_latency, received_at)
+
+        readers = [asyncio.create_task(read(communicator)) for _, communicator in sockets]
+
+        client = APIClient()
+
+        def create_post(author, index):
+            client.force_authenticate(author)
+            response = client.post('/api/posts/', {
+                "content": f"{POST_MARKER}{index}", "visibility": options['visibility'],
+            }, format='multipart')
+            return response.data.get("id")
+
+        def react(reactor, post_id):
+            client.force_authenticate(reactor)
+            client.post(f'/api/posts/{post_id}/react/', {"type": "like"}, format='json')
+
+        started = time.perf_counter()
+        post_ids = []
+        for index in range(options['posts']):
+            sent_at[f"{POST_MARKER}{index}"] = time.perf_counter()
+            post_ids.append(await sync_to_async(create_post)(authors[index % len(authors)], index))
+            await asyncio.sleep(options['interval'])
+
+        # One reaction per reactor, so the notification's username identifies it
+        reactions = min(options['reactions'], len(reactors)) if post_ids else 0
+        for index in range(reactions):
+            reactor = reactors[index]
+            sent_at[reactor.username] = time.perf_counter()
+            await sync_to_async(react)(reactor, post_ids[index % len(post_ids)])
+            await asyncio.sleep(options['interval'])
+        triggered = time.perf_counter()
+
+        # Wait for deliveries to settle (digests flush on a timer)
+        while time.perf_counter() - started < options['timeout']:
+            await asyncio.sleep(0.2)
+            last = stats["last"] or triggered
+            if time.perf_counter() - max(last, triggered) >= options['settle']:
+                break
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        await asyncio.gather(
+            *(communicator.disconnect() for _, communicator in sockets), return_exceptions=True)
+
+        post_sockets = sum(1 for endpoint, _ in sockets if endpoint == 'posts')
+        if 'posts' not in options['endpoints']:
+            expected_posts = 0
+        elif options['visibility'] == 'public':
+            expected_posts = options['posts'] * post_sockets
+        else:
+            # The author plus the reactors befriended to them (see create_users)
+            expected_posts = sum(
+                1 + len(range(index % len(authors), len(reactors), len(authors)))
+                for index in range(options['posts']))
+        notification_sockets = 'notifications' in options['endpoints']
+
+        duration = (stats["last"] or triggered) - started
+        return {
+            "sockets": len(sockets),
+            "connect": connect_latency.summary(),
+            "handshake_auth": handshake_latency.summary(),
+            "memory_per_connection": (memory_after - memory_before) / max(len(sockets), 1),
+            "posts": post_latency.summary(),
+            "expected_posts": expected_posts,
+            "notifications": notification_latency.summary(),
+            "expected_notifications": reactions if notification_sockets else 0,
+            "frames": stats["frames"],
+            "duration": duration,
+            "messages_per_second": stats["frames"] / duration if duration > 0 else 0,
+        }
+
+    def print_report(self, report):
+        def latency(summary):
+            if not summary["count"]:
+                return "none received"
+            return (f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+                    f"p99 {summary['p99_ms']} ms, max {summary['max_ms']} ms")
+
+        self.stdout.write(self.style.SUCCESS("WebSocket load test results"))
+        self.stdout.write(f"  Sockets:               {report['sockets']}")
+        self.stdout.write(f"  Connect:               {latency(report['connect'])}")
+        self.stdout.write(f"  Handshake auth:        {latency(report['handshake_auth'])}")
+        self.stdout.write(f"  Memory per connection: {report['memory_per_connection'] / 1024:.1f} KiB")
+        self.stdout.write(
+            f"  Post deliveries:       {report['posts']['count']}/{report['expected_posts']}, "
+            f"{latency(report['posts'])}")
+        self.stdout.write(
+            f"  Notifications:         {report['notifications']['count']}/"
+            f"{report['expected_notifications']}, {latency(report['notifications'])}")
+        self.stdout.write(
+            f"  Throughput:            {report['frames']} frames in {report['duration']:.2f} s "
+            f"({report['messages_per_second']:.0f} msg/s)")
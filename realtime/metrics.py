@@ -0,0 +1,40 @@
+import threading
+from collections import deque
+
+
+class LatencyMetric:
+    """
+    In-process latency recorder for real-time code paths:
+    - Keeps the most recent samples in a bounded window
+    - Reports count and percentiles in milliseconds
+    """
+
+    def __init__(self, name, window=10000):
+        self.name = name
+        self.count = 0
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.samples.append(seconds)
+
+    def summary(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            count = self.count
+        if not samples:
+            return {"name": self.name, "count": count}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3)
+
+        return {
+            "name": self.name,
+            "count": count,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
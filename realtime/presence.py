@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.cache import cache
+
+# Open WebSocket connections per user:
+#   realtime:presence:<user_id>  -> connection count
+# The key lives for PRESENCE_TTL seconds and is refreshed by heartbeats, so
+# connections lost without a disconnect (crashed process) expire on their own.
+# After the last disconnect it is kept at 0 for PRESENCE_GRACE seconds, during
+# which the user still counts as reachable for fan-out and replay.
+PRESENCE_KEY = "realtime:presence:{user_id}"
+
+
+def mark_online(user_id):
+    """Registers a new connection; returns True if the user was offline"""
+
+    key = PRESENCE_KEY.format(user_id=user_id)
+    came_online = cache.add(key, 0, timeout=settings.PRESENCE_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, timeout=settings.PRESENCE_TTL)
+    cache.touch(key, settings.PRESENCE_TTL)
+    return came_online
+
+
+def heartbeat(user_id):
+    """Keeps an open connection's presence alive"""
+
+    key = PRESENCE_KEY.format(user_id=user_id)
+    if not cache.touch(key, settings.PRESENCE_TTL):
+        cache.add(key, 1, timeout=settings.PRESENCE_TTL)
+
+
+def mark_offline(user_id):
+    """Unregisters a connection; the last one starts the grace period"""
+
+    key = PRESENCE_KEY.format(user_id=user_id)
+    try:
+        remaining = cache.decr(key)
+    except ValueError:
+        return
+    if remaining <= 0:
+        cache.set(key, 0, timeout=settings.PRESENCE_GRACE)
+
+
+def get_presence(user_ids):
+    """Returns {user_id: connection count} for users online or in grace"""
+
+    keys = {PRESENCE_KEY.format(user_id=user_id): user_id for user_id in user_ids}
+    return {keys[key]: count for key, count in cache.get_many(keys).items()}
+
+
+def get_connected_user_ids(user_ids):
+    """Users with at least one open connection (shown as online)"""
+
+    return {user_id for user_id, count in get_presence(user_ids).items() if count > 0}
+
+
+def get_reachable_user_ids(user_ids):
+    """
+    Users worth a live delivery: connected or recently disconnected.
+    Everyone counts as reachable unless PRESENCE_SKIP_OFFLINE is enabled.
+    """
+
+    user_ids = list(user_ids)
+    if not settings.PRESENCE_SKIP_OFFLINE:
+        return user_ids
+    present = get_presence(user_ids)
+    return [user_id for user_id in user_ids if user_id in present]
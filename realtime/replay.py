@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+# Per-user sequence counter and ring buffer slots:
+#   realtime:seq:<user_id>          -> last sequence ID issued
+#   realtime:buf:<user_id>:<slot>   -> (seq, stream, encoded payload)
+SEQ_KEY = "realtime:seq:{user_id}"
+SLOT_KEY = "realtime:buf:{user_id}:{slot}"
+
+
+def next_seq(user_id):
+    """Issues the user's next monotonically increasing sequence ID"""
+
+    key = SEQ_KEY.format(user_id=user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # First event for this user; add() keeps a concurrent first writer's value
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def next_seqs(user_ids):
+    """
+    Issues the next sequence ID of each user, as {user_id: seq}. On Redis
+    the increments go out in one pipelined round trip, however many users;
+    other backends fall back to one next_seq() per user.
+    """
+
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if not isinstance(backend, RedisCache):
+        return {user_id: next_seq(user_id) for user_id in user_ids}
+
+    # INCR creates a missing counter at 0 first, and integers are stored
+    # unserialized, so these stay readable through the cache API
+    pipeline = backend._cache.get_client(write=True).pipeline(transaction=False)
+    for user_id in user_ids:
+        pipeline.incr(backend.make_and_validate_key(SEQ_KEY.format(user_id=user_id)))
+    return dict(zip(user_ids, pipeline.execute()))
+
+
+def current_seq(user_id):
+    return cache.get(SEQ_KEY.format(user_id=user_id), 0)
+
+
+def record_events(stream, user_ids, event):
+    """
+    Appends one pre-encoded event to each user's ring buffer. On Redis this
+    takes two round trips (sequence IDs, then slots), however many users.
+    Returns {user_id: seq} so live deliveries can carry the same IDs.
+    """
+
+    size = settings.REPLAY_BUFFER_SIZE
+    encoded = {key: event[key] for key in ("text", "bytes") if key in event}
+
+    seqs = next_seqs(list(user_ids))
+    slots = {
+        SLOT_KEY.format(user_id=user_id, slot=seq % size): (seq, stream, encoded)
+        for user_id, seq in seqs.items()
+    }
+
+    cache.set_many(slots, timeout=settings.REPLAY_TTL)
+    return seqs
+
+
+def get_missed_events(user_id, last_seq):
+    """
+    Returns (events, current_seq) for everything after `last_seq`, where
+    events is a list of (seq, stream, encoded payload) in order.
+    Returns (None, current_seq) when the gap is no longer fully buffered and
+    the client has to refetch instead.
+    """
+
+    current = current_seq(user_id)
+    if last_seq > current:
+        # Counter was reset (cache flushed); nothing we hold is reliable
+        return None, current
+    if current - last_seq > settings.REPLAY_BUFFER_SIZE:
+        return None, current
+
+    size = settings.REPLAY_BUFFER_SIZE
+    wanted = range(last_seq + 1, current + 1)
+    keys = [SLOT_KEY.format(user_id=user_id, slot=seq % size) for seq in wanted]
+    slots = cache.get_many(keys)
+
+    events = []
+    for seq, key in zip(wanted, keys):
+        entry = slots.get(key)
+        if entry is None or entry[0] != seq:
+            # A later entry exists, so this one was evicted or overwritten
+            if any(slots.get(later) for later in keys[len(events) + 1:]):
+                return None, current
+            # Only trailing entries are missing: still being written by a
+            # publisher and about to arrive live
+            break
+        events.append(entry)
+    return events, current
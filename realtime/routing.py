@@ -0,0 +1,7 @@
+from django.urls import re_path
+from .consumers import StreamConsumer
+
+# Multiplexed WebSocket endpoint carrying every stream over one connection
+websocket_urlpatterns = [
+    re_path(r'^ws/stream/$', StreamConsumer.as_asgi()),
+]
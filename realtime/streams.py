@@ -0,0 +1,89 @@
+from collections import deque
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Stream:
+    """
+    A named stream of events carried over a WebSocket connection.
+
+    Subclasses declare the channel layer event types they handle in
+    `event_types` and implement a method per type. The owning consumer
+    routes those events here and takes care of encoding, envelopes and
+    flow control.
+    """
+
+    name = None
+    event_types = ()
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.user = consumer.user
+        self.groups = set()
+
+    async def join(self, group):
+        self.groups.add(group)
+        await self.consumer.channel_layer.group_add(group, self.consumer.channel_name)
+
+    async def leave(self, group):
+        self.groups.discard(group)
+        await self.consumer.channel_layer.group_discard(group, self.consumer.channel_name)
+
+    async def open(self):
+        """Joins the stream's groups; called when the client subscribes"""
+
+    async def close(self):
+        """Leaves every group; called on unsubscribe and disconnect"""
+
+        for group in list(self.groups):
+            await self.leave(group)
+
+    async def handle(self, message):
+        """Handles a client message for this stream; returns an error or None"""
+
+        return "Unknown action."
+
+    async def deliver(self, encoded):
+        """Sends a pre-encoded payload to the client, subject to flow control"""
+
+        await self.consumer.deliver(self, encoded)
+
+    async def reply(self, content):
+        """Sends a control reply (acks, errors); bypasses flow control"""
+
+        await self.consumer.reply(self, content)
+
+
+class FlowControl:
+    """
+    Credit-based flow control for one stream:
+    - Unlimited until the client grants credits for the first time
+    - Each delivered frame consumes one credit
+    - Without credits, frames queue in a bounded buffer (oldest dropped)
+    """
+
+    def __init__(self):
+        self.credits = None
+        self.buffer = deque(maxlen=settings.STREAM_BUFFER_SIZE)
+        self.dropped = 0
+
+    def can_send(self):
+        return self.credits is None or self.credits > 0
+
+    def consume(self):
+        if self.credits is not None:
+            self.credits -= 1
+
+    def hold(self, encoded):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(encoded)
+
+    def grant(self, credits):
+        self.credits = (self.credits or 0) + credits
+
+
+def get_stream_classes():
+    """Returns {name: Stream subclass} from the REALTIME_STREAMS setting"""
+
+    return {name: import_string(path) for name, path in settings.REALTIME_STREAMS.items()}
@@ -15,6 +15,7 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 import notifications.routing
 from notifications.middleware import JWTAuthMiddleware
 import posts.routing
+import realtime.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_network.settings')
 
@@ -22,7 +23,8 @@ application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": JWTAuthMiddleware(
         URLRouter(
-            notifications.routing.websocket_urlpatterns + posts.routing.websocket_urlpatterns
+            notifications.routing.websocket_urlpatterns + posts.routing.websocket_urlpatterns +
+            realtime.routing.websocket_urlpatterns
         )
     ),
 })
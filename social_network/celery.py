@@ -0,0 +1,12 @@
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_network.settings')
+
+app = Celery('social_network')
+
+# Read all CELERY_* options from Django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Discover tasks.py modules in installed apps
+app.autodiscover_tasks()
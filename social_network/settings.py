@@ -13,6 +13,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 from datetime import timedelta
+from celery.schedules import crontab
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -57,6 +60,8 @@ INSTALLED_APPS = [
     'groups',
     'notifications',
     'stories',
+    'realtime',
+    'uploads',
 ]
 
 MIDDLEWARE = [
@@ -148,6 +153,15 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Shared by web, ASGI and Celery processes (WebSocket replay buffers etc.),
+# so use a networked cache such as Redis outside single-process development.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -207,7 +221,7 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
 
 
 REST_FRAMEWORK = {
@@ -261,8 +275,83 @@ AWS_DEFAULT_ACL = os.getenv("AWS_DEFAULT_ACL")
 AWS_LOCATION = os.getenv("AWS_LOCATION")
 AWS_S3_SIGNATURE_VERSION = os.getenv("AWS_S3_SIGNATURE_VERSION")
 DEFAULT_FILE_STORAGE = os.getenv("DEFAULT_FILE_STORAGE")
+# S3-compatible stand-in (MinIO, LocalStack); unset for AWS itself
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL")
+
+# Connections kept per boto3 client; raise alongside parallel uploads
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_S3_MAX_POOL_CONNECTIONS", 20))
+AWS_S3_CLIENT_CONFIG = Config(
+    s3={"addressing_style": AWS_S3_ADDRESSING_STYLE},
+    signature_version=AWS_S3_SIGNATURE_VERSION,
+    max_pool_connections=AWS_S3_MAX_POOL_CONNECTIONS,
+)
+# Multipart uploads: files above the threshold are sent in chunks, at most
+# chunk size x concurrency bytes in memory per upload
+AWS_S3_MULTIPART_THRESHOLD = int(os.getenv("AWS_S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+AWS_S3_MULTIPART_CHUNKSIZE = int(os.getenv("AWS_S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024))
+AWS_S3_MULTIPART_CONCURRENCY = int(os.getenv("AWS_S3_MULTIPART_CONCURRENCY", 4))
+AWS_S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=AWS_S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=AWS_S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=AWS_S3_MULTIPART_CONCURRENCY,
+)
+
+# Storage used by utils.aws for uploaded media. uploads.storage.LocalMediaStorage
+# keeps it on the local disk (MEDIA_ROOT), served from MEDIA_URL (set MEDIA_URL=/media/)
+MEDIA_STORAGE_BACKEND = os.getenv("MEDIA_STORAGE_BACKEND", "storages.backends.s3boto3.S3Boto3Storage")
+MEDIA_STORAGE_OPTIONS = {}
+# Local media: hand files to the front proxy (nginx internal location, e.g.
+# /protected-media/) instead of sending them from Django; empty to disable
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+MEDIA_CACHE_CONTROL = os.getenv("MEDIA_CACHE_CONTROL", "public, max-age=86400")
+# Uploads running in parallel per process (shared by all requests)
+MEDIA_UPLOAD_WORKERS = int(os.getenv("MEDIA_UPLOAD_WORKERS", 8))
+# Uploads are hashed (SHA-256) as they stream in, for content-addressed storage
+FILE_UPLOAD_HANDLERS = [
+    "uploads.handlers.HashingMemoryFileUploadHandler",
+    "uploads.handlers.HashingTemporaryFileUploadHandler",
+]
+# Direct-to-storage uploads (api/uploads/): largest file and slot lifetime (seconds)
+MEDIA_DIRECT_UPLOAD_MAX_SIZE = int(os.getenv("MEDIA_DIRECT_UPLOAD_MAX_SIZE", 100 * 1024 * 1024))
+MEDIA_DIRECT_UPLOAD_EXPIRY = int(os.getenv("MEDIA_DIRECT_UPLOAD_EXPIRY", 900))
+# Resumable uploads (api/uploads/resumable/): chunk size, largest file, slot
+# lifetime (seconds), and the spool directory for received chunks, which must
+# be shared by the web and Celery worker processes
+MEDIA_RESUMABLE_CHUNK_SIZE = int(os.getenv("MEDIA_RESUMABLE_CHUNK_SIZE", 8 * 1024 * 1024))
+MEDIA_RESUMABLE_UPLOAD_MAX_SIZE = int(os.getenv("MEDIA_RESUMABLE_UPLOAD_MAX_SIZE", 2 * 1024 * 1024 * 1024))
+MEDIA_RESUMABLE_UPLOAD_EXPIRY = int(os.getenv("MEDIA_RESUMABLE_UPLOAD_EXPIRY", 24 * 60 * 60))
+MEDIA_UPLOAD_SPOOL_DIR = os.getenv("MEDIA_UPLOAD_SPOOL_DIR", os.path.join(BASE_DIR, "spool"))
+# On-demand resizing (api/uploads/transform/): largest edge that can be
+# requested, and the local LRU disk cache of rendered images (size in bytes)
+MEDIA_TRANSFORM_MAX_EDGE = int(os.getenv("MEDIA_TRANSFORM_MAX_EDGE", 4096))
+MEDIA_TRANSFORM_CACHE_DIR = os.getenv("MEDIA_TRANSFORM_CACHE_DIR", os.path.join(BASE_DIR, "transform_cache"))
+MEDIA_TRANSFORM_CACHE_SIZE = int(os.getenv("MEDIA_TRANSFORM_CACHE_SIZE", 1024 * 1024 * 1024))
+# Storage cleanup (uploads.cleanup): unreferenced blobs and unreferenced files
+# under MEDIA_GC_PREFIXES are deleted after MEDIA_GC_GRACE seconds; deletions
+# are sent in batches (at most 1000, the S3 DeleteObjects limit) and retried
+# up to MEDIA_DELETE_MAX_ATTEMPTS times
+MEDIA_GC_GRACE = int(os.getenv("MEDIA_GC_GRACE", 24 * 60 * 60))
+MEDIA_GC_PREFIXES = os.getenv(
+    "MEDIA_GC_PREFIXES", "blobs/,post_media/,stories/,uploads/,profile_pictures/,cover_pictures/,exports/").split(",")
+MEDIA_DELETE_BATCH_SIZE = min(int(os.getenv("MEDIA_DELETE_BATCH_SIZE", 1000)), 1000)
+MEDIA_DELETE_MAX_ATTEMPTS = int(os.getenv("MEDIA_DELETE_MAX_ATTEMPTS", 5))
+# Largest image accepted, in pixels; checked from the header before decoding
+MEDIA_MAX_PIXELS = int(os.getenv("MEDIA_MAX_PIXELS", 64_000_000))
+# Image derivatives generated in the background: name -> longest edge (px)
+MEDIA_DERIVATIVES = {
+    name: int(size) for name, size in (
+        rung.split(":") for rung in
+        os.getenv("MEDIA_DERIVATIVES", "thumbnail:200,feed:1080,full:2048").split(",")
+    )
+}
+# Extra formats stored for every derivative (webp, avif); unsupported ones are skipped
+MEDIA_VARIANT_FORMATS = [
+    variant_format for variant_format in os.getenv("MEDIA_VARIANT_FORMATS", "webp").split(",")
+    if variant_format
+]
+MEDIA_VARIANT_QUALITY = int(os.getenv("MEDIA_VARIANT_QUALITY", 80))
 
-MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/"
+MEDIA_URL = os.getenv("MEDIA_URL", f"https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/")
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -271,9 +360,115 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
-CELERY_ACCEPT_CONTENT = [os.getenv("CELERY_ACCEPT_CONTENT")]
-CELERY_TASK_SERIALIZER = os.getenv("CELERY_TASK_SERIALIZER")
-CELERY_RESULT_SERIALIZER = os.getenv("CELERY_RESULT_SERIALIZER")
+CELERY_ACCEPT_CONTENT = [os.getenv("CELERY_ACCEPT_CONTENT", "json")]
+CELERY_TASK_SERIALIZER = os.getenv("CELERY_TASK_SERIALIZER", "json")
+CELERY_RESULT_SERIALIZER = os.getenv("CELERY_RESULT_SERIALIZER", "json")
+# Run tasks inline instead of through the broker: the default when no broker
+# is configured (local development, tests)
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "False" if CELERY_BROKER_URL else "True") == "True"
+# Raise errors of eager tasks to the caller. Off by default: tasks are mostly
+# started from on_commit callbacks, where an error would turn a request whose
+# data is already saved into a 500. Failures are logged either way.
+CELERY_TASK_EAGER_PROPAGATES = os.getenv("CELERY_TASK_EAGER_PROPAGATES", "False") == "True"
+
+# Heavy work goes to its own queue, so a backlog of one kind (e.g. media
+# processing) does not hold up the others. Anything unrouted uses "default".
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_ROUTES = {
+    "posts.tasks.process_post_media": {"queue": "media"},
+    "stories.tasks.process_story_media": {"queue": "media"},
+    "uploads.tasks.assemble_resumable_upload": {"queue": "media"},
+    "accounts.tasks.build_data_export": {"queue": "media"},
+    "posts.tasks.fan_out_new_post": {"queue": "fanout"},
+    "notifications.tasks.deliver_notification": {"queue": "fanout"},
+    "notifications.tasks.send_queued_emails": {"queue": "email"},
+    "notifications.tasks.send_notification_digests": {"queue": "email"},
+    "accounts.tasks.run_deletion_job": {"queue": "maintenance"},
+    "accounts.tasks.purge_expired_exports": {"queue": "maintenance"},
+    "uploads.tasks.purge_expired_uploads": {"queue": "maintenance"},
+    "uploads.tasks.process_storage_deletions": {"queue": "maintenance"},
+    "uploads.tasks.collect_media_garbage": {"queue": "maintenance"},
+}
+# Long tasks are acknowledged once finished, so a worker that dies mid-task
+# does not lose it; workers take one task at a time so short ones are not
+# stuck behind a prefetched long one
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Periodic jobs, run by `celery -A social_network beat`
+NOTIFICATION_DIGEST_HOUR = int(os.getenv("NOTIFICATION_DIGEST_HOUR", 8))
+CELERY_BEAT_SCHEDULE = {
+    # Picks up emails whose retry was scheduled by a worker that has since restarted
+    "send-queued-emails": {
+        "task": "notifications.tasks.send_queued_emails",
+        "schedule": timedelta(minutes=1),
+    },
+    "send-notification-digests": {
+        "task": "notifications.tasks.send_notification_digests",
+        "schedule": crontab(hour=NOTIFICATION_DIGEST_HOUR, minute=0),
+    },
+    "process-storage-deletions": {
+        "task": "uploads.tasks.process_storage_deletions",
+        "schedule": timedelta(minutes=10),
+    },
+    "purge-expired-uploads": {
+        "task": "uploads.tasks.purge_expired_uploads",
+        "schedule": timedelta(hours=1),
+    },
+    "purge-expired-exports": {
+        "task": "accounts.tasks.purge_expired_exports",
+        "schedule": timedelta(hours=1),
+    },
+    "collect-media-garbage": {
+        "task": "uploads.tasks.collect_media_garbage",
+        "schedule": crontab(hour=3, minute=30),
+    },
+}
+
+# Deleted posts and accounts are tombstoned, then removed in the background in
+# batches of DELETION_BATCH_SIZE rows (one transaction each); a task runs
+# DELETION_BATCHES_PER_TASK batches before queueing the rest
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", 500))
+DELETION_BATCHES_PER_TASK = int(os.getenv("DELETION_BATCHES_PER_TASK", 100))
+# Data exports: rows serialized per query while streaming, and how long a
+# prepared archive stays downloadable (seconds)
+DATA_EXPORT_CHUNK_SIZE = int(os.getenv("DATA_EXPORT_CHUNK_SIZE", 100))
+DATA_EXPORT_EXPIRY = int(os.getenv("DATA_EXPORT_EXPIRY", 7 * 24 * 60 * 60))
+
+# Maximum number of concurrent channel layer sends during post fan-out
+POST_FANOUT_CONCURRENCY = int(os.getenv("POST_FANOUT_CONCURRENCY", 100))
+
+# Public posts are broadcast to this many shard groups; each connection joins one
+PUBLIC_POST_SHARDS = int(os.getenv("PUBLIC_POST_SHARDS", 16))
+# Topic (author/hashtag/group) subscriptions allowed per connection
+MAX_TOPIC_SUBSCRIPTIONS = int(os.getenv("MAX_TOPIC_SUBSCRIPTIONS", 50))
+# Broadcasts per second above which a connection switches to digest frames
+POST_DIGEST_THRESHOLD = int(os.getenv("POST_DIGEST_THRESHOLD", 20))
+# Seconds between digest frames (automatic mode) and upper bound for clients
+POST_DIGEST_INTERVAL = float(os.getenv("POST_DIGEST_INTERVAL", 2))
+POST_DIGEST_MAX_INTERVAL = 60
+
+# Streams available on the multiplexed ws/stream/ endpoint
+REALTIME_STREAMS = {
+    'posts': 'posts.streams.PostStream',
+    'notifications': 'notifications.streams.NotificationStream',
+}
+# Frames buffered per stream while a client is out of credits (oldest dropped)
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", 100))
+# Largest single credit grant a client may send
+STREAM_MAX_CREDITS = 1000
+# Recent per-user events kept for replay after a reconnect, and for how long
+REPLAY_BUFFER_SIZE = int(os.getenv("REPLAY_BUFFER_SIZE", 200))
+REPLAY_TTL = int(os.getenv("REPLAY_TTL", 60 * 60 * 24))
+# Authenticated WebSocket users cached per token ID (count, seconds)
+WS_AUTH_CACHE_SIZE = int(os.getenv("WS_AUTH_CACHE_SIZE", 10000))
+WS_AUTH_CACHE_TTL = int(os.getenv("WS_AUTH_CACHE_TTL", 60))
+# Presence: key lifetime, heartbeat period and post-disconnect grace (seconds)
+PRESENCE_TTL = int(os.getenv("PRESENCE_TTL", 90))
+PRESENCE_HEARTBEAT_INTERVAL = int(os.getenv("PRESENCE_HEARTBEAT_INTERVAL", 30))
+PRESENCE_GRACE = int(os.getenv("PRESENCE_GRACE", 120))
+# Skip live delivery to offline users; needs a cache shared with Celery workers
+PRESENCE_SKIP_OFFLINE = os.getenv("PRESENCE_SKIP_OFFLINE", "False") == "True"
 
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND")
 EMAIL_HOST = os.getenv("EMAIL_HOST")
@@ -282,3 +477,14 @@ EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS")
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")  # Your email
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")  # App password
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL")  # Your email
+# Outbox (notifications.email): emails sent per connection, attempts before
+# giving up, first retry delay (doubled per failure) and how long a claimed
+# email may stay unsent before another worker retries it (seconds)
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_RETRY_BACKOFF = int(os.getenv("EMAIL_RETRY_BACKOFF", 30))
+EMAIL_SEND_TIMEOUT = int(os.getenv("EMAIL_SEND_TIMEOUT", 300))
+# Notification digests: window of the first run (seconds; later runs start
+# where the previous one ended), and users handled per grouped query
+NOTIFICATION_DIGEST_INTERVAL = int(os.getenv("NOTIFICATION_DIGEST_INTERVAL", 24 * 60 * 60))
+NOTIFICATION_DIGEST_BATCH_SIZE = int(os.getenv("NOTIFICATION_DIGEST_BATCH_SIZE", 500))
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from social_network.custom_admin import custom_admin_site
 from django.conf import settings
-from django.conf.urls.static import static
+from uploads.urls import media_urlpatterns
 
 urlpatterns = [
     path('admin/', custom_admin_site.urls),
@@ -13,4 +13,5 @@ urlpatterns = [
     path('api/groups/', include('groups.urls')),
     path('api/notifications/', include('notifications.urls')),
     path('api/stories/', include('stories.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('api/uploads/', include('uploads.urls')),
+] + media_urlpatterns(settings.MEDIA_URL)
\ No newline at end of file
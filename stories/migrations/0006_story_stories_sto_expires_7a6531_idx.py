@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0005_story_blob'),
+        ('uploads', '0004_storagedeletion_mediablob_released_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['expires_at', 'user'], name='stories_sto_expires_7a6531_idx'),
+        ),
+    ]
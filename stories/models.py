@@ -5,13 +5,26 @@ from accounts.models import User
 
 # Create your models here.
 class Story(models.Model):
+    PROCESSING_STATUS_CHOICES = [
+        ('processing', 'Processing'),   # Derivatives are being generated
+        ('ready', 'Ready'),             # All derivatives available
+        ('failed', 'Failed'),           # Only the original is available
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="stories")
     media_files = models.FileField(upload_to='stories/', null=True, blank=True)
+    blob = models.ForeignKey('uploads.MediaBlob', on_delete=models.SET_NULL, null=True, blank=True, related_name='stories')  # Shared stored content
     thumbnail_file = models.FileField(upload_to='stories/thumbnails/', null=True, blank=True)
+    processing_status = models.CharField(max_length=20, choices=PROCESSING_STATUS_CHOICES, default='ready')
+    derivatives = models.JSONField(default=dict, blank=True)  # {name: {"path", "width", "height"}}
     content = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
+    class Meta:
+        # Active stories by author (see ListStoryView)
+        indexes = [models.Index(fields=['expires_at', 'user'])]
+
     def save(self, *args, **kwargs):
         if not self.expires_at:
             self.expires_at = timezone.now() + timezone.timedelta(hours=24)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Story, StoryReaction
+from utils.media import get_derivative_urls, get_srcset
 
 class StoryReactionSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -10,6 +11,8 @@ class StoryReactionSerializer(serializers.ModelSerializer):
 
 class StorySerializer(serializers.ModelSerializer):
     media_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    derivatives = serializers.SerializerMethodField()
     seen_count = serializers.SerializerMethodField()
     reaction_count = serializers.SerializerMethodField()
     is_seen = serializers.SerializerMethodField()
@@ -21,9 +24,9 @@ class StorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Story
         fields = ['id', 'user', 'media_files', 'thumbnail_file',
-                  'media_url', 'content', 'created_at', 'expires_at', 'seen_count', 'reaction_count', 'is_seen', 'react', 'viewers_list', 'reactors_list']
+                  'media_url', 'srcset', 'processing_status', 'derivatives', 'content', 'created_at', 'expires_at', 'seen_count', 'reaction_count', 'is_seen', 'react', 'viewers_list', 'reactors_list']
         
-        read_only_fields = ['user', 'created_at', 'expires_at', 'seen_count', 'reaction_count', 'is_seen', 'react', 'viewers_list', 'reactors_list']
+        read_only_fields = ['user', 'processing_status', 'created_at', 'expires_at', 'seen_count', 'reaction_count', 'is_seen', 'react', 'viewers_list', 'reactors_list']
 
     def get_media_url(self, obj):
         if obj.media_files and hasattr(obj.media_files, 'url'):
@@ -31,6 +34,12 @@ class StorySerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.media_files.url) if request else obj.media_files.url
         return None
 
+    def get_srcset(self, obj):
+        return get_srcset(obj.derivatives, self.context.get('request'))
+
+    def get_derivatives(self, obj):
+        return get_derivative_urls(obj.derivatives)
+
     def get_seen_count(self, obj):
         return obj.views.count()
     
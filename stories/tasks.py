@@ -0,0 +1,46 @@
+import logging
+from celery import shared_task
+from notifications.utils import push_to_user
+from realtime.events import build_event
+from utils.media import adopt_blob, build_blob_derivatives, get_media_type, get_derivative_urls
+from .models import Story
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def process_story_media(story_id):
+    """
+    Processes a story in the 'processing' state (deduplicates a direct
+    upload, generates image derivatives), then tells its owner with a
+    media_ready event.
+    """
+
+    try:
+        story = Story.objects.select_related('blob').get(id=story_id, processing_status='processing')
+    except Story.DoesNotExist:
+        return
+
+    try:
+        if story.blob is None:
+            # Uploaded straight to storage: deduplicated here, off the web workers
+            story.blob = adopt_blob(story.media_files.name, get_media_type(story.media_files.name))
+            story.media_files.name = story.blob.path
+        if story.blob.media_type == 'image':
+            # Shared with every duplicate of this content
+            story.derivatives = build_blob_derivatives(story.blob, "stories")
+            story.thumbnail_file.name = story.derivatives.get('thumbnail', {}).get('path')
+        story.processing_status = 'ready'
+    except Exception as e:
+        logger.error(f"Error processing story {story.id}: {e}")
+        story.processing_status = 'failed'
+    story.save(update_fields=[
+        'blob', 'media_files', 'derivatives', 'thumbnail_file', 'processing_status'])
+
+    push_to_user(story.user_id, build_event("story_media_ready", {
+        "type": "media_ready",
+        "story_id": story.id,
+        "processing_status": story.processing_status,
+        "thumbnail_url": story.thumbnail_file.url if story.thumbnail_file else None,
+        "derivatives": get_derivative_urls(story.derivatives),
+    }))
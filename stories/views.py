@@ -1,18 +1,16 @@
 from rest_framework import generics, permissions, status
 from django.utils import timezone
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from .models import Story, StoryView, StoryReaction
 from .serializers import StoryReactionSerializer, StorySerializer
 from rest_framework.views import APIView
-import io
 import logging
-from django.conf import settings
-from django.core.files.base import ContentFile
-from storages.backends.s3boto3 import S3Boto3Storage
-from PIL import Image
-from django.db.models import Q
+from utils.media import acquire_blobs, claim_direct_uploads, get_blob_media_fields, get_upload_ids, upload_media_files
+from django.db import transaction
+from .tasks import process_story_media
+from django.db.models import Exists, OuterRef, Q
 from accounts.models import BlockedUser
 from connections.models import Connection
 
@@ -22,65 +20,52 @@ logger = logging.getLogger(__name__)
 
 
 class CreateStoryView(generics.CreateAPIView):
+    """
+    Creates a story from an uploaded file, or from a file uploaded straight
+    to storage ('upload_ids', see uploads.views.DirectUploadView)
+    """
+
     serializer_class = StorySerializer
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser)
+    parser_classes = (MultiPartParser, FormParser, JSONParser)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if self.failed_media:
+            response.data["failed_media"] = self.failed_media
+        return response
 
     def perform_create(self, serializer):
         media_files = self.request.FILES.getlist("media_files")
         story = serializer.save(user=self.request.user)
 
-        s3_storage = S3Boto3Storage(
-            bucket_name=settings.AWS_STORAGE_BUCKET_NAME)
-
-        for file in media_files:
-            media_type = 'image' if file.name.lower().endswith(
-                ("jpg", "jpeg", "png", "gif")) else "video"
-
-            try:
-                file.seek(0)
-                data = file.read()
-                if not data:
-                    logger.error(f"No data read from file: {file.name}")
-                    print(f'No data read from file: {file.name}')
-                    continue
-                file_content = ContentFile(data)
-
-                file_path = s3_storage.save(
-                    f"stories/{file.name}", file_content)
-                s3_url = s3_storage.url(file_path)
-                logger.info(f"Story file saved to S3: {s3_url}")
-
-                story.media_files.name = file_path
-                story.save()
-
-                if media_type == 'image':
-                    try:
-
-                        image = Image.open(io.BytesIO(data))
-                        image.verify()
-
-                        image = Image.open(io.BytesIO(data))
-                        image.thumbnail((200, 200))
-
-                        thumb_io = io.BytesIO()
-                        image_format = image.format if image.format else 'JPEG'
-                        image.save(thumb_io, format=image_format)
-                        thumb_file = ContentFile(
-                            thumb_io.getvalue(), name=f"thumb_{file.name}")
-
-                        thumb_path = s3_storage.save(
-                            f"stories/thumbnails/{thumb_file.name}", thumb_file)
-                        story.thumbnail_file.name = thumb_path
-                        story.save()
-                        logger.info(
-                            f"Thumbnail saved to S3: {s3_storage.url(thumb_path)}")
-                    except Exception as e:
-                        logger.error(
-                            f"Error generating thumbnail for {file.name}: {e}")
-
-            except Exception as e:
-                logger.error(f"Error uploading story file {file.name}: {e}")
+        uploads = upload_media_files(media_files)
+        uploads += claim_direct_uploads(
+            self.request.user, get_upload_ids(self.request.data), start_index=len(uploads))
+
+        # A story holds one file; as before, the last uploaded one wins
+        uploaded = [upload for upload in uploads if not upload["error"]]
+        if uploaded:
+            upload = uploaded[-1]
+            # Thumbnail and other sizes are generated by a worker, unless the
+            # same content was uploaded before and already has them
+            fields = get_blob_media_fields(upload["blob"], upload["media_type"])
+            story.blob = upload["blob"]
+            story.media_files.name = upload["path"]
+            story.thumbnail_file.name = fields["thumbnail"]
+            story.processing_status = fields["processing_status"]
+            story.derivatives = fields["derivatives"]
+            story.save(update_fields=[
+                "blob", "media_files", "thumbnail_file", "processing_status", "derivatives"])
+            if story.blob_id:
+                acquire_blobs([story.blob_id])
+            if story.processing_status == 'processing':
+                transaction.on_commit(lambda: process_story_media.delay(story.id))
+
+        self.failed_media = [
+            {"index": upload["index"], "file": upload["name"], "error": upload["error"]}
+            for upload in uploads if upload["error"]
+        ]
 
 
 class ListStoryView(generics.ListAPIView):
@@ -88,55 +73,31 @@ class ListStoryView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        now = timezone.now()
+        """
+        Unexpired stories the viewer may see, in one query:
+        - Their own
+        - Public profiles' stories
+        - Friends-only profiles' stories, for friends and followers
+        Users blocking or blocked by the viewer are left out.
+        """
 
-        all_stories = Story.objects.filter(
-            expires_at__gt=now).order_by('-created_at')
         request_user = self.request.user
 
-        blocked_by_user = BlockedUser.objects.filter(
-            blocker=request_user).values_list("blocked", flat=True)
-        blocked_by_others = BlockedUser.objects.filter(
-            blocked=request_user).values_list("blocker", flat=True)
-        blocked_ids = set(list(blocked_by_user) + list(blocked_by_others))
-
-        allowed_ids = []
-        for story in all_stories:
-            if story.user.id in blocked_ids:
-                continue
-
-            if story.user == request_user:
-                allowed_ids.append(story.pk)
-                continue
-
-            privacy = 'public'
-            if story.user.profile.privacy_settings:
-                privacy = story.user.profile.privacy_settings.get(
-                    "profile_visibility", "public")
-
-            if privacy == "public":
-                allowed_ids.append(story.pk)
-
-            elif privacy == "friends":
-                is_friend = Connection.objects.filter(
-                    Q(requester=request_user, target=story.user) |
-                    Q(requester=story.user, target=request_user),
-                    status='accepted',
-                    connection_type='friend'
-                ).exists()
-
-                is_follower = Connection.objects.filter(
-                    requester=request_user,
-                    target=story.user,
-                    status='accepted',
-                    connection_type='follower'
-                ).exists()
-                if is_friend or is_follower:
-                    allowed_ids.append(story.pk)
-            elif privacy == 'private':
-                continue
-
-        return Story.objects.filter(pk__in=allowed_ids).order_by("-created_at")
+        blocked = BlockedUser.objects.filter(
+            Q(blocker=request_user, blocked=OuterRef('user')) |
+            Q(blocker=OuterRef('user'), blocked=request_user)
+        )
+        connected = Connection.objects.filter(
+            Q(requester=request_user, target=OuterRef('user'), connection_type__in=['friend', 'follower']) |
+            Q(requester=OuterRef('user'), target=request_user, connection_type='friend'),
+            status='accepted',
+        )
+
+        return Story.objects.filter(expires_at__gt=timezone.now()).filter(
+            Q(user=request_user) |
+            Q(user__profile__visibility='public') |
+            Q(user__profile__visibility='friends') & Exists(connected)
+        ).exclude(Exists(blocked)).order_by('-created_at')
 
 
 class StoryDeleteView(generics.DestroyAPIView):
@@ -157,6 +118,7 @@ class StoryDeleteView(generics.DestroyAPIView):
         story = self.get_object()
         if timezone.now() > story.expires_at:
             return Response({"error": "Story has already expired and cannot be manually deleted."}, status=status.HTTP_400_BAD_REQUEST)
+        # Media files are queued for deletion; the scheduled drain removes them
         self.perform_destroy(story)
         return Response({"message": "Story deleted successfully."}, status=status.HTTP_200_OK)
 
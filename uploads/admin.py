@@ -0,0 +1,24 @@
+from django.contrib import admin
+from uploads.models import DirectUpload, MediaBlob, StorageDeletion
+
+# Register your models here.
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'media_type', 'size', 'ref_count', 'released_at', 'created_at')
+    list_filter = ('media_type',)
+    search_fields = ('sha256', 'path')
+    readonly_fields = ('sha256', 'path', 'size', 'ref_count', 'released_at', 'derivatives', 'created_at')
+
+
+@admin.register(DirectUpload)
+class DirectUploadAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'filename', 'media_type', 'status', 'expires_at')
+    list_filter = ('status', 'media_type')
+    search_fields = ('user__username', 'filename', 'key')
+
+
+@admin.register(StorageDeletion)
+class StorageDeletionAdmin(admin.ModelAdmin):
+    list_display = ('key', 'attempts', 'last_error', 'created_at')
+    search_fields = ('key',)
@@ -0,0 +1,192 @@
+import os
+import re
+import logging
+from datetime import timedelta
+from urllib.parse import unquote, urlsplit
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from accounts.models import DataExport, Profile
+from posts.models import PostMedia
+from stories.models import Story
+from utils.aws import delete_stored_files, iter_stored_files
+from utils.media import get_derivative_paths
+from .models import DirectUpload, MediaBlob, StorageDeletion
+
+logger = logging.getLogger(__name__)
+
+# Derivatives are named <stem>_<size or 'original'>.<ext>; blob stems are SHA-256 digests
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def queue_deletion(keys):
+    """Adds storage keys to the deletion queue (already queued keys are ignored)"""
+
+    keys = {key for key in keys if key}
+    StorageDeletion.objects.bulk_create(
+        [StorageDeletion(key=key) for key in keys], ignore_conflicts=True)
+    return len(keys)
+
+
+def get_derivative_stem(key):
+    if '/derivatives/' not in key:
+        return None
+    return os.path.splitext(os.path.basename(key))[0].rsplit('_', 1)[0]
+
+
+class ReferenceIndex:
+    """
+    Answers "is this storage key still used?" in a few queries per batch
+    of keys:
+    - Blob files, and derivatives of existing blobs (by the SHA-256 stem)
+    - Media and thumbnails of rows without a blob (stored before
+      deduplication), and their derivatives
+    - Direct uploads still waiting to be confirmed
+    - Data export archives that have not expired
+    - Profile and cover pictures (stored as URLs)
+
+    Keys of media without a blob and of profiles are loaded once per index;
+    both sets are small or shrinking.
+    """
+
+    def __init__(self):
+        self.legacy_keys = set()
+        for model, file_fields in ((PostMedia, ('media_file', 'thumbnail_file')), (Story, ('media_files', 'thumbnail_file'))):
+            for row in model.objects.filter(blob__isnull=True).values(*file_fields, 'derivatives').iterator():
+                self.legacy_keys.update(row[field] for field in file_fields if row[field])
+                self.legacy_keys.update(get_derivative_paths(row['derivatives']))
+
+        # A URL's path ends with the key; index every suffix of it
+        self.profile_keys = set()
+        for urls in Profile.objects.values_list('profile_picture_url', 'cover_picture_url').iterator():
+            for url in urls:
+                if not url:
+                    continue
+                parts = unquote(urlsplit(url).path).strip('/').split('/')
+                self.profile_keys.update('/'.join(parts[index:]) for index in range(len(parts)))
+
+    def get_referenced(self, keys):
+        keys = set(keys)
+        referenced = keys & (self.legacy_keys | self.profile_keys)
+
+        referenced.update(MediaBlob.objects.filter(path__in=keys).values_list('path', flat=True))
+
+        stems = {key: get_derivative_stem(key) for key in keys}
+        shas = {stem for stem in stems.values() if stem and SHA256_RE.match(stem)}
+        live_shas = set(MediaBlob.objects.filter(sha256__in=shas).values_list('sha256', flat=True))
+        referenced.update(key for key, stem in stems.items() if stem in live_shas)
+
+        referenced.update(DirectUpload.objects.filter(
+            key__in=keys, status__in=('receiving', 'assembling', 'pending'),
+            expires_at__gt=timezone.now(),
+        ).values_list('key', flat=True))
+        referenced.update(DataExport.objects.filter(
+            key__in=keys, status='ready',
+        ).values_list('key', flat=True))
+        return referenced
+
+
+def collect_orphaned_blobs():
+    """
+    Deletes blobs without references for longer than MEDIA_GC_GRACE, and
+    queues their files. The grace period keeps content around for uploads
+    that are about to reuse it.
+    Returns the number of blobs collected.
+    """
+
+    cutoff = timezone.now() - timedelta(seconds=settings.MEDIA_GC_GRACE)
+    candidates = MediaBlob.objects.annotate(
+        idle_since=Coalesce('released_at', 'created_at'),
+    ).filter(
+        ref_count=0, idle_since__lt=cutoff,
+        # Never drop a blob a row still points at, whatever its counter says
+        post_media__isnull=True, stories__isnull=True,
+    )
+
+    collected = 0
+    for blob in candidates.iterator():
+        with transaction.atomic():
+            # Skipped if a reference was taken since the query
+            deleted, _ = MediaBlob.objects.filter(id=blob.id, ref_count=0).delete()
+            if deleted:
+                queue_deletion({blob.path} | get_derivative_paths(blob.derivatives))
+                collected += 1
+    return collected
+
+
+def scan_storage():
+    """
+    Reconciles storage with the database: queues every file under
+    MEDIA_GC_PREFIXES that is older than MEDIA_GC_GRACE and no longer
+    referenced. Files are checked in pages of MEDIA_DELETE_BATCH_SIZE.
+    Returns the number of keys queued.
+    """
+
+    cutoff = timezone.now() - timedelta(seconds=settings.MEDIA_GC_GRACE)
+    index = ReferenceIndex()
+    queued = 0
+
+    def check(page):
+        return queue_deletion(set(page) - index.get_referenced(page))
+
+    for prefix in settings.MEDIA_GC_PREFIXES:
+        page = []
+        for key, modified in iter_stored_files(prefix):
+            if modified >= cutoff:
+                continue
+            page.append(key)
+            if len(page) == settings.MEDIA_DELETE_BATCH_SIZE:
+                queued += check(page)
+                page = []
+        if page:
+            queued += check(page)
+    return queued
+
+
+def process_deletion_queue(max_batches=None):
+    """
+    Drains the deletion queue in batches of MEDIA_DELETE_BATCH_SIZE keys
+    (at most 1000: one S3 DeleteObjects request per batch).
+    Keys referenced again since they were queued are dropped from the queue
+    without being deleted; failed keys are retried on later runs, up to
+    MEDIA_DELETE_MAX_ATTEMPTS times.
+    Each batch is claimed with row locks, skipping rows another drain holds,
+    so concurrent drains never work on the same keys.
+    Returns the number of keys deleted.
+    """
+
+    index = None
+    deleted = 0
+    batches = 0
+    last_id = 0
+
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            batch = list(StorageDeletion.objects.select_for_update(skip_locked=True).filter(
+                id__gt=last_id, attempts__lt=settings.MEDIA_DELETE_MAX_ATTEMPTS,
+            ).order_by('id')[:settings.MEDIA_DELETE_BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            batches += 1
+
+            # Built on the first non-empty batch: an empty queue costs one query
+            if index is None:
+                index = ReferenceIndex()
+            referenced = index.get_referenced(item.key for item in batch)
+            keys = [item.key for item in batch if item.key not in referenced]
+            errors = delete_stored_files(keys) if keys else {}
+
+            done = [item.id for item in batch if item.key not in errors]
+            StorageDeletion.objects.filter(id__in=done).delete()
+            for item in batch:
+                if item.key in errors:
+                    StorageDeletion.objects.filter(id=item.id).update(
+                        attempts=F('attempts') + 1, last_error=errors[item.key][:255])
+
+        deleted += len(keys) - len(errors)
+        logger.info(f"Deleted {len(keys) - len(errors)} stored files ({len(referenced)} still in use, {len(errors)} failed)")
+
+    return deleted
@@ -0,0 +1,37 @@
+import hashlib
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingUploadHandlerMixin:
+    """
+    Computes the SHA-256 of each uploaded file while the request body streams
+    in, and exposes it as `file.sha256`. Only the handler that stores a chunk
+    hashes it, so every byte is hashed exactly once.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Before super(): the memory handler ends new_file() by raising
+        # StopFutureHandlers when it takes the file
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        chunk = super().receive_data_chunk(raw_data, start)
+        if chunk is None:
+            # Consumed by this handler rather than passed down the chain
+            self.sha256.update(raw_data)
+        return chunk
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
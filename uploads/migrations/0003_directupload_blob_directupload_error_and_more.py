@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0002_directupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='directupload',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='direct_uploads', to='uploads.mediablob'),
+        ),
+        migrations.AddField(
+            model_name='directupload',
+            name='error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='directupload',
+            name='kind',
+            field=models.CharField(choices=[('presigned', 'Presigned'), ('resumable', 'Resumable')], default='presigned', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='directupload',
+            name='size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='directupload',
+            name='key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='directupload',
+            name='status',
+            field=models.CharField(choices=[('receiving', 'Receiving'), ('assembling', 'Assembling'), ('pending', 'Pending'), ('confirmed', 'Confirmed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,89 @@
+import uuid
+from django.db import models
+from django.utils import timezone
+from accounts.models import User
+
+# Create your models here.
+class MediaBlob(models.Model):
+    """
+    One stored media file, shared by every upload of the same bytes:
+    - Stored once under a key derived from the SHA-256 of its content
+    - Reference-counted by the PostMedia and Story rows pointing at it
+    - Keeps the derivatives generated for it, so duplicates reuse them
+    - Collected (with its files) once unreferenced for MEDIA_GC_GRACE
+    """
+
+    MEDIA_TYPE_CHOICES = [
+        ('image', 'Image'),
+        ('video', 'Video'),
+    ]
+
+    sha256 = models.CharField(max_length=64, unique=True)  # Hex digest of the content
+    path = models.CharField(max_length=255)  # Key in media storage
+    size = models.PositiveBigIntegerField()  # Bytes
+    media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES)
+    ref_count = models.PositiveIntegerField(default=0)  # Media rows using this blob
+    released_at = models.DateTimeField(null=True, blank=True)  # Last time a reference was dropped
+    derivatives = models.JSONField(default=dict, blank=True)  # Same shape as PostMedia.derivatives
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
+class DirectUpload(models.Model):
+    """
+    An upload slot for a file that does not travel in the request creating
+    the post, story or profile media:
+    - 'presigned': the client uploads to `key` with a presigned form
+    - 'resumable': the client sends numbered chunks to the API, which are
+      spooled locally and assembled by a worker (uploads.tasks)
+    - Confirmed by passing its ID when creating a post, story or profile media
+    - Each slot can be confirmed once, before it expires
+    """
+
+    KIND_CHOICES = [
+        ('presigned', 'Presigned'),
+        ('resumable', 'Resumable'),
+    ]
+
+    STATUS_CHOICES = [
+        ('receiving', 'Receiving'),     # Resumable: chunks still arriving
+        ('assembling', 'Assembling'),   # Resumable: worker is storing the file
+        ('pending', 'Pending'),         # Waiting for the client to confirm
+        ('confirmed', 'Confirmed'),     # Attached to a post, story or profile
+        ('failed', 'Failed'),           # Resumable: assembly failed (see error)
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='direct_uploads')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='presigned')
+    key = models.CharField(max_length=255, blank=True)  # Key in media storage
+    blob = models.ForeignKey(MediaBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='direct_uploads')  # Set once the content is deduplicated
+    filename = models.CharField(max_length=255)  # Name the client uploaded
+    content_type = models.CharField(max_length=100)
+    media_type = models.CharField(max_length=10, choices=MediaBlob.MEDIA_TYPE_CHOICES)
+    size = models.PositiveBigIntegerField(null=True, blank=True)  # Declared size (resumable)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+
+class StorageDeletion(models.Model):
+    """
+    Queue of storage keys to delete, drained in batches (uploads.cleanup):
+    - Filled when media rows are deleted and by the garbage-collection scan
+    - Keys referenced again by the time a batch runs are skipped, not deleted
+    """
+
+    key = models.CharField(max_length=255, unique=True)  # Key in media storage
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,38 @@
+from django.conf import settings
+from rest_framework import serializers
+from utils.media import get_media_type
+
+
+class DirectUploadSerializer(serializers.Serializer):
+    """
+    Validates a request for a direct upload slot:
+    - Images and videos only, with a matching Content-Type
+    - Size capped by MEDIA_DIRECT_UPLOAD_MAX_SIZE
+    """
+
+    # Setting holding the largest accepted size
+    max_size_setting = 'MEDIA_DIRECT_UPLOAD_MAX_SIZE'
+
+    filename = serializers.CharField(max_length=200)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, value):
+        max_size = getattr(settings, self.max_size_setting)
+        if value > max_size:
+            raise serializers.ValidationError(f"Files are limited to {max_size} bytes.")
+        return value
+
+    def validate(self, data):
+        media_type = get_media_type(data["filename"])
+        if not data["content_type"].startswith(f"{media_type}/"):
+            raise serializers.ValidationError(
+                f"Content type does not match the {media_type} file name.")
+        data["media_type"] = media_type
+        return data
+
+
+class ResumableUploadSerializer(DirectUploadSerializer):
+    """Same checks for resumable uploads, capped by MEDIA_RESUMABLE_UPLOAD_MAX_SIZE"""
+
+    max_size_setting = 'MEDIA_RESUMABLE_UPLOAD_MAX_SIZE'
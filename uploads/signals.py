@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from utils.media import get_derivative_paths, release_blobs
+from .cleanup import queue_deletion
+
+
+@receiver(post_delete, sender='posts.PostMedia')
+@receiver(post_delete, sender='stories.Story')
+def release_media_blob(sender, instance, **kwargs):
+    # Also runs for rows removed by cascade (e.g. deleting a post or a user)
+    if instance.blob_id:
+        # The blob's files are collected once it stays unreferenced (uploads.cleanup)
+        release_blobs([instance.blob_id])
+        return
+
+    # Media stored before deduplication belongs to this row alone
+    media_file = instance.media_file if sender._meta.model_name == 'postmedia' else instance.media_files
+    queue_deletion({media_file.name, instance.thumbnail_file.name} | get_derivative_paths(instance.derivatives))
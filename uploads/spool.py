@@ -0,0 +1,112 @@
+import os
+import math
+import shutil
+import hashlib
+from django.conf import settings
+
+# Bytes copied per read when streaming chunks to and from disk
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class ChunkError(ValueError):
+    """Raised for a chunk that does not fit the upload (index or length)"""
+
+
+def get_spool_dir(upload_id):
+    return os.path.join(settings.MEDIA_UPLOAD_SPOOL_DIR, str(upload_id))
+
+
+def get_chunk_count(size):
+    return max(1, math.ceil(size / settings.MEDIA_RESUMABLE_CHUNK_SIZE))
+
+
+def get_chunk_length(size, index):
+    """Expected length of chunk `index`: full chunks, except possibly the last"""
+
+    chunk_size = settings.MEDIA_RESUMABLE_CHUNK_SIZE
+    if not 0 <= index < get_chunk_count(size):
+        raise ChunkError(f"Chunk index must be between 0 and {get_chunk_count(size) - 1}.")
+    return min(chunk_size, size - index * chunk_size)
+
+
+def write_chunk(upload, index, stream, length):
+    """
+    Streams one chunk from the request body to the spool. Written to a
+    temporary file and renamed, so a dropped connection never leaves a
+    partial chunk behind; re-sending a chunk replaces it.
+    """
+
+    expected = get_chunk_length(upload.size, index)
+    if length != expected:
+        raise ChunkError(f"Chunk {index} must be {expected} bytes.")
+
+    spool_dir = get_spool_dir(upload.id)
+    os.makedirs(spool_dir, exist_ok=True)
+    path = os.path.join(spool_dir, f"{index}.part")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+
+    received = 0
+    try:
+        with open(temp_path, 'wb') as part:
+            while received < length:
+                data = stream.read(min(COPY_BUFFER_SIZE, length - received))
+                if not data:
+                    break
+                part.write(data)
+                received += len(data)
+        if received != length:
+            raise ChunkError(f"Chunk {index} ended after {received} of {length} bytes.")
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def get_received_chunks(upload):
+    """Indexes of the chunks stored so far, sorted"""
+
+    try:
+        names = os.listdir(get_spool_dir(upload.id))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-len('.part')]) for name in names if name.endswith('.part'))
+
+
+def get_received_offset(upload, received_chunks):
+    """Bytes received contiguously from the start: where the client resumes"""
+
+    count = 0
+    for expected, index in enumerate(received_chunks):
+        if index != expected:
+            break
+        count += 1
+    return min(upload.size, count * settings.MEDIA_RESUMABLE_CHUNK_SIZE)
+
+
+def assemble(upload):
+    """
+    Concatenates the chunks into one spooled file, hashing it on the way.
+    Each chunk is deleted once copied, so the spool never holds two copies.
+    Returns (path, sha256 hex digest, size).
+    """
+
+    spool_dir = get_spool_dir(upload.id)
+    path = os.path.join(spool_dir, 'assembled')
+    digest = hashlib.sha256()
+    size = 0
+
+    with open(path, 'wb') as assembled:
+        for index in range(get_chunk_count(upload.size)):
+            part_path = os.path.join(spool_dir, f"{index}.part")
+            with open(part_path, 'rb') as part:
+                while data := part.read(COPY_BUFFER_SIZE):
+                    digest.update(data)
+                    assembled.write(data)
+                    size += len(data)
+            os.remove(part_path)
+
+    return path, digest.hexdigest(), size
+
+
+def remove(upload_id):
+    shutil.rmtree(get_spool_dir(upload_id), ignore_errors=True)
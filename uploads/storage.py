@@ -0,0 +1,31 @@
+import os
+import uuid
+from django.core.files.storage import FileSystemStorage
+
+
+class LocalMediaStorage(FileSystemStorage):
+    """
+    Media on the local disk, as a drop-in for S3Boto3Storage behind
+    utils.aws.get_media_storage (MEDIA_STORAGE_BACKEND):
+    - Files live under MEDIA_ROOT and are served from MEDIA_URL by
+      uploads.views.serve_media (Range, conditional requests, X-Accel-Redirect)
+    - Saving to an existing key replaces it, as on S3, so content-addressed
+      blobs and derivatives keep their names
+    - Writes are atomic: readers never see a half-written file
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def _save(self, name, content):
+        # Written beside the target, then renamed over it
+        directory, basename = os.path.split(name)
+        temp_name = os.path.join(directory, f".{basename}.{uuid.uuid4().hex}.tmp")
+        super()._save(temp_name, content)
+        try:
+            os.replace(self.path(temp_name), self.path(name))
+        except OSError:
+            self.delete(temp_name)
+            raise
+        return name
@@ -0,0 +1,87 @@
+import logging
+from celery import shared_task
+from django.core.files import File
+from django.utils import timezone
+from utils.media import register_blob, store_media_file
+from uploads import cleanup, spool
+from .models import DirectUpload, MediaBlob
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def assemble_resumable_upload(upload_id):
+    """
+    Assembles a completed resumable upload off the request path:
+    - Concatenates and hashes the spooled chunks
+    - Checks the size against the one declared
+    - Stores the content, unless a blob with the same content exists
+    The slot then becomes 'pending', ready to be confirmed with a post,
+    story or profile media.
+    """
+
+    try:
+        upload = DirectUpload.objects.get(id=upload_id, status='assembling')
+    except DirectUpload.DoesNotExist:
+        return
+
+    try:
+        path, sha256, size = spool.assemble(upload)
+        if size != upload.size:
+            raise ValueError(f"Received {size} bytes, expected {upload.size}.")
+
+        blob = MediaBlob.objects.filter(sha256=sha256).first()
+        if blob is None:
+            with open(path, 'rb') as assembled:
+                saved_path = store_media_file(File(assembled, name=upload.filename), sha256)
+            blob = register_blob(sha256, saved_path, size, upload.media_type)
+
+        upload.blob = blob
+        upload.key = blob.path
+        upload.status = 'pending'
+    except Exception as e:
+        logger.error(f"Error assembling upload {upload.id}: {e}")
+        upload.status = 'failed'
+        upload.error = str(e)[:255]
+    finally:
+        spool.remove(upload.id)
+
+    upload.save(update_fields=['blob', 'key', 'status', 'error'])
+
+
+@shared_task(ignore_result=True)
+def purge_expired_uploads():
+    """
+    Deletes spooled chunks of resumable uploads that expired before being
+    finished. Meant to run periodically.
+    """
+
+    expired = DirectUpload.objects.filter(
+        kind='resumable', status='receiving', expires_at__lte=timezone.now())
+    for upload_id in expired.values_list('id', flat=True):
+        spool.remove(upload_id)
+    count = expired.update(status='failed', error="Expired before completion.")
+    logger.info(f"Purged {count} expired resumable uploads")
+
+
+@shared_task(ignore_result=True)
+def process_storage_deletions():
+    """Deletes queued storage keys in batches (see uploads.cleanup)"""
+
+    deleted = cleanup.process_deletion_queue()
+    logger.info(f"Deleted {deleted} queued files from storage")
+
+
+@shared_task(ignore_result=True)
+def collect_media_garbage():
+    """
+    Reconciles storage with the database, then drains the deletion queue:
+    - Deletes blobs unreferenced for longer than MEDIA_GC_GRACE
+    - Queues files under MEDIA_GC_PREFIXES nothing refers to any more
+    Meant to run periodically.
+    """
+
+    collected = cleanup.collect_orphaned_blobs()
+    queued = cleanup.scan_storage()
+    deleted = cleanup.process_deletion_queue()
+    logger.info(f"Collected {collected} blobs, queued {queued} orphaned files, deleted {deleted} files")
@@ -0,0 +1,303 @@
+import io
+import os
+import json
+import base64
+import shutil
+import tempfile
+import tracemalloc
+from datetime import timedelta
+from unittest import mock
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import Profile, User
+from posts.models import PostMedia
+from utils.aws import get_media_storage, upload_file_to_s3
+from .models import DirectUpload
+
+CHUNK_SIZE = 1000
+MB = 1024 * 1024
+
+# S3 stand-in: a real S3Boto3Storage whose client calls are answered locally
+S3_STORAGE_OPTIONS = {
+    "bucket_name": "test-media",
+    "access_key": "test",
+    "secret_key": "test",
+    "region_name": "us-east-1",
+    "location": "",
+    "transfer_config": TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=2),
+}
+
+
+def create_user(username):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="password")
+    Profile.objects.create(user=user, username=username)
+    return user
+
+
+class UploadTestCase(TestCase):
+    """Media storage and the upload spool in temporary directories"""
+
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_dir, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+
+        storage_settings = override_settings(
+            **self.get_storage_settings(),
+            MEDIA_UPLOAD_SPOOL_DIR=self.spool_dir,
+            MEDIA_RESUMABLE_CHUNK_SIZE=CHUNK_SIZE,
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+
+        self.user = create_user("uploader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_storage_settings(self):
+        return {
+            "MEDIA_STORAGE_BACKEND": "django.core.files.storage.FileSystemStorage",
+            "MEDIA_STORAGE_OPTIONS": {"location": self.media_dir, "base_url": "/media/"},
+        }
+
+
+class ResumableUploadCompleteTests(UploadTestCase):
+
+    def start_upload(self, data):
+        response = self.client.post("/api/uploads/resumable/", {
+            "filename": "clip.mp4", "content_type": "video/mp4", "size": len(data),
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def put_chunks(self, upload_id, data, indexes):
+        for index in indexes:
+            chunk = data[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+            response = self.client.generic(
+                "PUT", f"/api/uploads/resumable/{upload_id}/chunks/{index}/", chunk,
+                content_type="application/octet-stream")
+            self.assertEqual(response.status_code, 200)
+
+    def complete(self, upload_id):
+        return self.client.post(f"/api/uploads/resumable/{upload_id}/complete/")
+
+    def test_missing_chunks(self):
+        data = os.urandom(2500)
+        upload_id = self.start_upload(data)
+        self.put_chunks(upload_id, data, [0, 2])
+
+        response = self.complete(upload_id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "Some chunks are missing.")
+        self.assertEqual(response.data["received_chunks"], [0, 2])
+
+    def test_complete_twice(self):
+        data = os.urandom(2500)
+        upload_id = self.start_upload(data)
+        self.put_chunks(upload_id, data, [0, 1, 2])
+
+        first = self.complete(upload_id)
+        second = self.complete(upload_id)
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.data["status"], "assembling")
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(second.data["status"], "assembling")
+
+    def test_complete_expired(self):
+        data = os.urandom(2500)
+        upload_id = self.start_upload(data)
+        self.put_chunks(upload_id, data, [0, 1, 2])
+        DirectUpload.objects.filter(id=upload_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.complete(upload_id)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(DirectUpload.objects.get(id=upload_id).status, "receiving")
+
+    def test_complete_failed(self):
+        data = os.urandom(2500)
+        upload_id = self.start_upload(data)
+        DirectUpload.objects.filter(id=upload_id).update(status="failed", error="Expired before completion.")
+
+        response = self.complete(upload_id)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["status"], "failed")
+
+
+class StreamingUploadTests(UploadTestCase):
+    """upload_file_to_s3 streams files to storage with bounded memory"""
+
+    def make_upload(self, size):
+        file = TemporaryUploadedFile("clip.mp4", "video/mp4", size, None)
+        self.addCleanup(file.close)
+        block = os.urandom(64 * 1024)
+        for _ in range(size // len(block)):
+            file.write(block)
+        file.seek(0)
+        return file
+
+    def measure_peak_memory(self, function, *args):
+        tracemalloc.start()
+        try:
+            result = function(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, peak
+
+    def test_local_upload_memory_bounded(self):
+        file = self.make_upload(32 * MB)
+
+        (path, _), peak = self.measure_peak_memory(upload_file_to_s3, file, "post_media")
+
+        self.assertLess(peak, 2 * MB)
+        self.assertEqual(os.path.getsize(os.path.join(self.media_dir, path)), 32 * MB)
+
+    @override_settings(MEDIA_STORAGE_BACKEND="storages.backends.s3boto3.S3Boto3Storage", MEDIA_STORAGE_OPTIONS=S3_STORAGE_OPTIONS)
+    def test_s3_upload_sent_in_parts(self):
+        file = self.make_upload(32 * MB)
+        client = get_media_storage().connection.meta.client
+        parts = []
+
+        def upload_part(**kwargs):
+            parts.append(len(kwargs["Body"].read()))
+            return {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+        not_found = ClientError({"Error": {"Code": "404"}, "ResponseMetadata": {"HTTPStatusCode": 404}}, "HeadObject")
+        with mock.patch.object(client, "head_object", side_effect=not_found), \
+                mock.patch.object(client, "create_multipart_upload", return_value={"UploadId": "upload"}), \
+                mock.patch.object(client, "upload_part", side_effect=upload_part), \
+                mock.patch.object(client, "complete_multipart_upload", return_value={}) as complete, \
+                mock.patch.object(client, "put_object") as put_object:
+            (path, _), peak = self.measure_peak_memory(upload_file_to_s3, file, "post_media")
+
+        put_object.assert_not_called()
+        complete.assert_called_once()
+        self.assertEqual(path, "post_media/clip.mp4")
+        self.assertEqual(sorted(parts), [2 * MB] + [5 * MB] * 6)
+        # At most a few parts in memory at once, not the whole file
+        self.assertLess(peak, 16 * MB)
+
+    @override_settings(MEDIA_STORAGE_BACKEND="uploads.storage.LocalMediaStorage")
+    def test_failed_upload_leaves_no_partial_file(self):
+        with override_settings(MEDIA_ROOT=self.media_dir):
+            file = self.make_upload(1 * MB)
+
+            with mock.patch("uploads.storage.os.replace", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    upload_file_to_s3(file, "post_media")
+
+            self.assertEqual([name for _, _, files in os.walk(self.media_dir) for name in files], [])
+
+    def test_temporary_upload_removed_after_failed_request(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        image = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(image, "PNG")
+
+        # Every upload is spooled to disk; storing it fails
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0, FILE_UPLOAD_TEMP_DIR=temp_dir), \
+                mock.patch("utils.media.store_media_file", side_effect=OSError("storage down")) as store_media_file:
+            response = self.client.post("/api/stories/create/", {
+                "content": "story",
+                "media_files": SimpleUploadedFile("s.png", image.getvalue(), content_type="image/png"),
+            })
+
+        self.assertIsInstance(store_media_file.call_args[0][0], TemporaryUploadedFile)
+        self.assertEqual(response.data["failed_media"][0]["error"], "Upload failed.")
+        self.assertEqual(os.listdir(temp_dir), [])
+
+
+class DirectUploadTests(UploadTestCase):
+    """Presigned slots are scoped to their user; posts only attach valid ones"""
+
+    def get_storage_settings(self):
+        return {
+            "MEDIA_STORAGE_BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+            "MEDIA_STORAGE_OPTIONS": S3_STORAGE_OPTIONS,
+        }
+
+    def request_slot(self, client=None):
+        response = (client or self.client).post("/api/uploads/", {
+            "filename": "photo.jpg", "content_type": "image/jpeg", "size": 1000,
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def create_post(self, upload_id, uploaded=True):
+        """Creates a post with a slot; `uploaded`: whether storage has the file"""
+
+        client = get_media_storage().connection.meta.client
+        head_object = {"return_value": {"ContentLength": 1000}} if uploaded else {
+            "side_effect": ClientError({"Error": {"Code": "404"}, "ResponseMetadata": {"HTTPStatusCode": 404}}, "HeadObject")}
+        with mock.patch.object(client, "head_object", **head_object):
+            return self.client.post("/api/posts/", {"content": "photo", "upload_ids": [str(upload_id)]}, format="json")
+
+    def test_slot_scoped_to_user(self):
+        slot = self.request_slot()
+
+        upload = DirectUpload.objects.get(id=slot["id"])
+        self.assertTrue(upload.key.startswith(f"uploads/{self.user.id}/"))
+        self.assertEqual(slot["fields"]["key"], upload.key)
+        # The signed policy pins the key, type and size
+        policy = json.loads(base64.b64decode(slot["fields"]["policy"]))
+        self.assertIn({"key": upload.key}, policy["conditions"])
+        self.assertIn({"Content-Type": "image/jpeg"}, policy["conditions"])
+        self.assertIn(["content-length-range", 1, 1000], policy["conditions"])
+
+    def test_post_attaches_own_upload(self):
+        slot = self.request_slot()
+
+        response = self.create_post(slot["id"])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn("failed_media", response.data)
+        upload = DirectUpload.objects.get(id=slot["id"])
+        self.assertEqual(upload.status, "confirmed")
+        self.assertEqual(PostMedia.objects.get().media_file.name, upload.key)
+
+    def test_post_rejects_foreign_upload(self):
+        other = APIClient()
+        other.force_authenticate(create_user("other"))
+        slot = self.request_slot(other)
+
+        response = self.create_post(slot["id"])
+
+        self.assertEqual(response.data["failed_media"][0]["error"], "Unknown or expired upload.")
+        self.assertEqual(DirectUpload.objects.get(id=slot["id"]).status, "pending")
+        self.assertFalse(PostMedia.objects.exists())
+
+    def test_post_rejects_expired_upload(self):
+        slot = self.request_slot()
+        DirectUpload.objects.filter(id=slot["id"]).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.create_post(slot["id"])
+
+        self.assertEqual(response.data["failed_media"][0]["error"], "Unknown or expired upload.")
+        self.assertFalse(PostMedia.objects.exists())
+
+    def test_post_rejects_missing_file(self):
+        slot = self.request_slot()
+
+        response = self.create_post(slot["id"], uploaded=False)
+
+        self.assertEqual(response.data["failed_media"][0]["error"], "File was not uploaded.")
+        self.assertEqual(DirectUpload.objects.get(id=slot["id"]).status, "pending")
+
+    def test_upload_confirmed_once(self):
+        slot = self.request_slot()
+        self.create_post(slot["id"])
+
+        response = self.create_post(slot["id"])
+
+        self.assertEqual(response.data["failed_media"][0]["error"], "Unknown or expired upload.")
+        self.assertEqual(PostMedia.objects.count(), 1)
@@ -0,0 +1,261 @@
+import os
+import uuid
+import hashlib
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files import locks
+from django.core.signals import setting_changed
+from utils.aws import get_media_storage
+from utils.images import decode_image, get_display_size
+from utils.media import OUTPUT_EXTENSIONS, encode_image, get_accepted_formats, get_variant_formats
+
+logger = logging.getLogger(__name__)
+
+FIT_CHOICES = ('contain', 'cover')
+
+# Renders of different keys share one lock file per stripe
+LOCK_STRIPES = 256
+
+
+class TransformError(ValueError):
+    """Raised for transform parameters that cannot be rendered"""
+
+
+class DiskLRUCache:
+    """
+    Size-bounded cache of rendered files on local disk, shared by every
+    process pointing at the same directory:
+    - A hit bumps the file's mtime, which serves as its last-use time
+    - Writes are atomic (temporary file, then rename)
+    - When the directory grows past `max_bytes`, the least recently used
+      files are evicted down to 90% of it
+    - lock() serializes work on one key across threads and processes
+
+    Each process tracks the bytes it wrote since its last scan, and rescans
+    the directory once that reaches 10% of the budget, so the directory is
+    never scanned on the request path of a hit.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.written = None  # Bytes written since the last scan; None: never scanned
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def open(self, key):
+        """Returns the cached file opened for reading, or None on a miss"""
+
+        path = self.get_path(key)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted after we opened it; the open handle stays readable
+            pass
+        return file
+
+    def put(self, key, data):
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        if self.written is None or self.written + len(data) >= self.max_bytes // 10:
+            self.evict()
+        else:
+            self.written += len(data)
+
+    def evict(self):
+        """Deletes least recently used files until the cache fits its budget"""
+
+        entries = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            if os.path.basename(root) == 'locks':
+                continue
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total > self.max_bytes:
+            target = self.max_bytes * 9 // 10
+            entries.sort()
+            evicted = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+            logger.info(f"Evicted {evicted} files from {self.directory}")
+
+        self.written = 0
+
+    @contextmanager
+    def lock(self, key):
+        """Exclusive lock for one key (striped: one lock file per key prefix)"""
+
+        lock_dir = os.path.join(self.directory, 'locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        stripe = int(key[:2], 16) % LOCK_STRIPES
+        with open(os.path.join(lock_dir, f"{stripe:02x}.lock"), 'a') as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock_file)
+
+
+@lru_cache(maxsize=None)
+def get_transform_cache():
+    """Process-wide cache of rendered transforms (MEDIA_TRANSFORM_CACHE_*)"""
+
+    return DiskLRUCache(settings.MEDIA_TRANSFORM_CACHE_DIR, settings.MEDIA_TRANSFORM_CACHE_SIZE)
+
+
+def reset_transform_cache(*, setting, **kwargs):
+    if setting in ("MEDIA_TRANSFORM_CACHE_DIR", "MEDIA_TRANSFORM_CACHE_SIZE"):
+        get_transform_cache.cache_clear()
+
+
+setting_changed.connect(reset_transform_cache)
+
+
+def parse_transform(params, request):
+    """
+    Validates ?w=&h=&fit=&format= into a transform dict.
+    format=auto (the default) picks WebP/AVIF from the Accept header, like
+    the srcset; otherwise the source format is kept.
+    """
+
+    transform = {}
+    for name in ('w', 'h'):
+        value = params.get(name)
+        if value in (None, ''):
+            transform[name] = None
+            continue
+        try:
+            transform[name] = int(value)
+        except ValueError:
+            raise TransformError(f"'{name}' must be a whole number of pixels.")
+        if not 1 <= transform[name] <= settings.MEDIA_TRANSFORM_MAX_EDGE:
+            raise TransformError(f"'{name}' must be between 1 and {settings.MEDIA_TRANSFORM_MAX_EDGE}.")
+    if transform['w'] is None and transform['h'] is None:
+        raise TransformError("Give a width ('w'), a height ('h') or both.")
+
+    transform['fit'] = params.get('fit', 'contain')
+    if transform['fit'] not in FIT_CHOICES:
+        raise TransformError(f"'fit' must be one of: {', '.join(FIT_CHOICES)}.")
+    if transform['fit'] == 'cover' and None in (transform['w'], transform['h']):
+        raise TransformError("fit=cover needs both 'w' and 'h'.")
+
+    requested = params.get('format', 'auto').lower()
+    writable = ['jpeg', 'png'] + get_variant_formats()
+    if requested == 'auto':
+        accepted = [fmt for fmt in get_accepted_formats(request) if fmt in writable]
+        transform['format'] = accepted[0] if accepted else None
+    elif requested in writable or requested == 'jpg':
+        transform['format'] = 'jpeg' if requested == 'jpg' else requested
+    else:
+        raise TransformError(f"'format' must be auto or one of: {', '.join(writable)}.")
+    return transform
+
+
+def get_transform_key(path, transform, image_format):
+    """Cache key (and ETag) of one rendering of a stored file"""
+
+    spec = f"{path}|{transform['w']}|{transform['h']}|{transform['fit']}|{image_format}"
+    return hashlib.sha256(spec.encode()).hexdigest()
+
+
+def get_target_size(full_size, transform):
+    """Output size: inside (contain) or covering (cover) the box; never enlarged"""
+
+    width, height = full_size
+    if transform['fit'] == 'cover':
+        scale = min(1, max(transform['w'] / width, transform['h'] / height))
+        return (min(transform['w'], round(width * scale)), min(transform['h'], round(height * scale))), scale
+
+    scales = [transform[name] / size for name, size in (('w', width), ('h', height)) if transform[name]]
+    scale = min(1, *scales)
+    return (max(1, round(width * scale)), max(1, round(height * scale))), scale
+
+
+def get_output_format(path, transform):
+    """Pillow format name of the output: requested, else the source's by extension"""
+
+    if transform['format']:
+        return transform['format'].upper()
+    extension = os.path.splitext(path)[1].lower()
+    for image_format in ('JPEG', 'PNG', 'WEBP'):
+        if OUTPUT_EXTENSIONS[image_format] == extension or (image_format == 'JPEG' and extension == '.jpeg'):
+            return image_format
+    # GIFs (first frame) become PNGs; anything else JPEG
+    return 'PNG' if extension == '.gif' else 'JPEG'
+
+
+def render_transform(path, transform, image_format):
+    """
+    Renders a stored image for `transform` in `image_format`.
+    The original is decoded once, at the smallest scale that still covers
+    the output (see utils.images.decode_image).
+    """
+
+    with get_media_storage().open(path, 'rb') as original:
+        with Image.open(original) as header:
+            full_size = get_display_size(header)
+        target, scale = get_target_size(full_size, transform)
+
+        original.seek(0)
+        image, _, _ = decode_image(
+            original, max_edge=max(1, round(max(full_size) * scale)),
+            max_pixels=settings.MEDIA_MAX_PIXELS)
+        image.load()
+
+    if transform['fit'] == 'cover':
+        image = ImageOps.fit(image, target, Image.Resampling.LANCZOS)
+    elif image.size != target:
+        image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    params = {"quality": settings.MEDIA_VARIANT_QUALITY} if image_format in ('JPEG', 'WEBP', 'AVIF') else {}
+    return encode_image(image, image_format, **params)
+
+
+def get_transformed_file(path, transform):
+    """
+    Returns (open file, format) of a rendering, rendering it on first use.
+    Concurrent requests for the same rendering, in any thread or process
+    sharing the cache, wait for a single render instead of repeating it.
+    """
+
+    cache = get_transform_cache()
+    image_format = get_output_format(path, transform)
+    key = get_transform_key(path, transform, image_format)
+
+    file = cache.open(key)
+    if file is None:
+        with cache.lock(key):
+            # Rendered by another request while we waited for the lock
+            file = cache.open(key)
+            if file is None:
+                cache.put(key, render_transform(path, transform, image_format))
+                file = cache.open(key)
+    return file, image_format
@@ -0,0 +1,39 @@
+import re
+from urllib.parse import urlsplit
+from django.urls import path, re_path
+from .views import serve_media, transform_image, DirectUploadView, ResumableUploadView, ResumableUploadDetailView, ResumableUploadChunkView, ResumableUploadCompleteView
+
+# Uploads Application URL Configuration
+urlpatterns = [
+    path('', DirectUploadView.as_view(), name='direct-upload'),
+    # POST: Requests a presigned slot for uploading a file straight to storage
+
+    path('resumable/', ResumableUploadView.as_view(), name='resumable-upload'),
+    # POST: Starts a chunked, resumable upload
+
+    path('resumable/<uuid:upload_id>/', ResumableUploadDetailView.as_view(), name='resumable-upload-detail'),
+    # GET: Received chunks and the offset to resume from
+
+    path('resumable/<uuid:upload_id>/chunks/<int:index>/', ResumableUploadChunkView.as_view(), name='resumable-upload-chunk'),
+    # PUT: Uploads one chunk (raw body)
+
+    path('resumable/<uuid:upload_id>/complete/', ResumableUploadCompleteView.as_view(), name='resumable-upload-complete'),
+    # POST: Queues assembly once every chunk has arrived
+
+    path('transform/<path:path>', transform_image, name='image-transform'),
+    # GET: Image resized on demand (?w=&h=&fit=&format=)
+]
+
+
+def media_urlpatterns(prefix):
+    """
+    Route for local media (uploads.storage.LocalMediaStorage) under
+    MEDIA_URL; none when media is served from elsewhere (an S3 URL)
+    """
+
+    if not prefix or urlsplit(prefix).netloc:
+        return []
+    return [
+        re_path(rf"^{re.escape(prefix.lstrip('/'))}(?P<path>.+)$", serve_media, name='media-file'),
+        # GET/HEAD: Serves a stored file (Range and conditional requests)
+    ]
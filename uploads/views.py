@@ -0,0 +1,353 @@
+import os
+import re
+import stat
+import uuid
+import mimetypes
+from PIL import Image
+from datetime import timedelta
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from utils.aws import create_presigned_upload, get_media_storage, supports_direct_upload
+from uploads import spool
+from uploads.transforms import TransformError, get_output_format, get_transform_key, get_transformed_file, parse_transform
+from utils.images import ImageTooLarge
+from .models import DirectUpload, MediaBlob
+from .serializers import DirectUploadSerializer, ResumableUploadSerializer
+from .tasks import assemble_resumable_upload
+
+# Bytes per read when streaming local media
+MEDIA_BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Create your views here.
+
+
+class DirectUploadView(APIView):
+    """
+    Hands out a slot for uploading one file straight to storage:
+    - Returns a presigned POST (URL plus form fields) for a fresh key
+    - The client uploads there, then passes the slot ID as 'upload_ids'
+      when creating a post or story (or as profile_picture_upload_id)
+    - The file never passes through the web workers
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if not supports_direct_upload():
+            return Response({"error": "Direct uploads need S3-compatible media storage."}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        serializer = DirectUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        extension = os.path.splitext(data["filename"])[1].lower()
+        upload = DirectUpload.objects.create(
+            user=request.user,
+            kind='presigned',
+            key=f"uploads/{request.user.id}/{uuid.uuid4().hex}{extension}",
+            filename=data["filename"],
+            content_type=data["content_type"],
+            media_type=data["media_type"],
+            expires_at=timezone.now() + timedelta(seconds=settings.MEDIA_DIRECT_UPLOAD_EXPIRY),
+        )
+        presigned = create_presigned_upload(
+            upload.key, upload.content_type, data["size"], settings.MEDIA_DIRECT_UPLOAD_EXPIRY)
+
+        return Response({
+            "id": upload.id,
+            "url": presigned["url"],
+            "fields": presigned["fields"],
+            "expires_at": upload.expires_at,
+        }, status=status.HTTP_201_CREATED)
+
+
+def get_resumable_status(upload):
+    """Progress of a resumable upload, as returned by all its endpoints"""
+
+    received_chunks = spool.get_received_chunks(upload) if upload.status == 'receiving' else []
+    return {
+        "id": upload.id,
+        "status": upload.status,
+        "size": upload.size,
+        "chunk_size": settings.MEDIA_RESUMABLE_CHUNK_SIZE,
+        "chunk_count": spool.get_chunk_count(upload.size),
+        "received_chunks": received_chunks,
+        # Where to resume after a dropped connection
+        "offset": spool.get_received_offset(upload, received_chunks),
+        "error": upload.error,
+        "expires_at": upload.expires_at,
+    }
+
+
+class ResumableUploadView(APIView):
+    """
+    Starts a resumable upload, for large files over unreliable connections:
+    - The file is sent as numbered chunks of MEDIA_RESUMABLE_CHUNK_SIZE
+    - After a dropped connection, GET the upload and resume from 'offset'
+    - Completing it hands assembly to a worker; once 'pending', the ID is
+      confirmed like any other direct upload ('upload_ids')
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = ResumableUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        upload = DirectUpload.objects.create(
+            user=request.user,
+            kind='resumable',
+            filename=data["filename"],
+            content_type=data["content_type"],
+            media_type=data["media_type"],
+            size=data["size"],
+            status='receiving',
+            expires_at=timezone.now() + timedelta(seconds=settings.MEDIA_RESUMABLE_UPLOAD_EXPIRY),
+        )
+        return Response(get_resumable_status(upload), status=status.HTTP_201_CREATED)
+
+
+class ResumableUploadDetailView(APIView):
+    """Reports which chunks have arrived and the offset to resume from"""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, upload_id):
+        upload = get_object_or_404(DirectUpload, id=upload_id, user=request.user, kind='resumable')
+        return Response(get_resumable_status(upload))
+
+
+class ResumableUploadChunkView(APIView):
+    """
+    Receives one chunk as the raw request body (PUT, any content type).
+    The body is streamed to the spool, never loaded into memory.
+    Chunks may arrive in any order; re-sending one replaces it.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, upload_id, index):
+        upload = get_object_or_404(DirectUpload, id=upload_id, user=request.user, kind='resumable')
+        if upload.status != 'receiving' or upload.expires_at <= timezone.now():
+            return Response({"error": "This upload no longer accepts chunks."}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            spool.write_chunk(upload, index, request.stream, length)
+        except spool.ChunkError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(get_resumable_status(upload))
+
+
+class ResumableUploadCompleteView(APIView):
+    """
+    Checks every chunk arrived, then queues assembly on a worker (202).
+    Completing an upload that is no longer receiving chunks (already
+    completed, failed or expired) is answered with 409 and its status.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, upload_id):
+        upload = get_object_or_404(DirectUpload, id=upload_id, user=request.user, kind='resumable')
+        if upload.status != 'receiving' or upload.expires_at <= timezone.now():
+            return self.conflict(upload)
+
+        if len(spool.get_received_chunks(upload)) != spool.get_chunk_count(upload.size):
+            return Response({**get_resumable_status(upload), "error": "Some chunks are missing."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Atomic, so assembly is queued once even if completed twice at once
+        if not DirectUpload.objects.filter(id=upload.id, status='receiving').update(status='assembling'):
+            upload.refresh_from_db()
+            return self.conflict(upload)
+
+        transaction.on_commit(lambda: assemble_resumable_upload.delay(upload.id))
+        upload.status = 'assembling'
+        return Response(get_resumable_status(upload), status=status.HTTP_202_ACCEPTED)
+
+    def conflict(self, upload):
+        return Response(
+            {**get_resumable_status(upload), "error": "This upload is not receiving chunks."},
+            status=status.HTTP_409_CONFLICT)
+
+
+def parse_range(header, size):
+    """
+    Parses a single-range Range header into (start, end), inclusive.
+    Returns None for headers to ignore (malformed, or several ranges, which
+    are answered with the whole file) and raises ValueError when the range
+    lies outside the file.
+    """
+
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(file, start, length):
+    """Yields `length` bytes of `file` from `start`, then closes it"""
+
+    with file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(MEDIA_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves media stored by uploads.storage.LocalMediaStorage:
+    - With MEDIA_ACCEL_REDIRECT_PREFIX set, only answers with an
+      X-Accel-Redirect header and lets the front proxy (nginx) send the file
+    - ETag / Last-Modified, answering If-None-Match / If-Modified-Since
+      with 304 Not Modified
+    - Single byte ranges (Range, If-Range) for video seeking, with 206
+    - Whole files go out as a FileResponse, which WSGI servers with
+      wsgi.file_wrapper (gunicorn) send with sendfile()
+    """
+
+    storage = get_media_storage()
+    try:
+        full_path = storage.path(path)
+    except (NotImplementedError, SuspiciousFileOperation):
+        raise Http404("Media is not stored locally.")
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        return response
+
+    try:
+        file_stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Media file not found.")
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404("Media file not found.")
+
+    size = file_stat.st_size
+    last_modified = int(file_stat.st_mtime)
+    etag = f'"{file_stat.st_mtime_ns:x}-{size:x}"'
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": settings.MEDIA_CACHE_CONTROL,
+    }
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # If-Range: only honour the range if the client's copy is still current
+    if range_header and (not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response["Content-Length"] = size
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+        response.block_size = MEDIA_BLOCK_SIZE
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        read_range(open(full_path, 'rb'), start, length),
+        status=206, content_type=content_type, headers=headers)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = length
+    return response
+
+
+@require_safe
+def transform_image(request, path):
+    """
+    Serves a stored image resized on demand: ?w=&h=&fit=contain|cover&format=
+    - Renders lazily on first request into a size-bounded LRU disk cache
+      (uploads.transforms); concurrent requests share one render
+    - The ETag is derived from the key and parameters, so revalidation
+      (If-None-Match) is answered without touching the image
+    - Only image blobs can be transformed; their content never changes
+      under a key, so responses are cacheable for a year
+    """
+
+    sha256 = os.path.splitext(os.path.basename(path))[0]
+    if not MediaBlob.objects.filter(sha256=sha256, path=path, media_type='image').exists():
+        raise Http404("Image not found.")
+
+    try:
+        transform = parse_transform(request.GET, request)
+    except TransformError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    image_format = get_output_format(path, transform)
+    headers = {
+        "ETag": f'"{get_transform_key(path, transform, image_format)}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+
+    not_modified = get_conditional_response(request, etag=headers["ETag"])
+    if not_modified is None:
+        try:
+            file, image_format = get_transformed_file(path, transform)
+        except ImageTooLarge as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        response = FileResponse(file, content_type=Image.MIME[image_format], headers=headers)
+    else:
+        response = not_modified
+        for header, value in headers.items():
+            response[header] = value
+
+    if request.GET.get('format', 'auto') == 'auto':
+        # The format was negotiated from the Accept header
+        patch_vary_headers(response, ['Accept'])
+    return response
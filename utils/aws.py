@@ -1,19 +1,49 @@
-from storages.backends.s3boto3 import S3Boto3Storage
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+from storages.utils import clean_name
+
+
+@lru_cache(maxsize=None)
+def get_media_storage():
+    """
+    Returns the process-wide media storage (MEDIA_STORAGE_BACKEND).
+
+    Built once and reused, so boto3 sessions and their HTTP connection pools
+    survive across requests instead of being recreated on every upload.
+    """
+
+    storage_class = import_string(settings.MEDIA_STORAGE_BACKEND)
+    return storage_class(**settings.MEDIA_STORAGE_OPTIONS)
+
+
+def reset_media_storage(*, setting, **kwargs):
+    # Lets override_settings() swap the backend (e.g. local files in tests)
+    if setting in ("MEDIA_STORAGE_BACKEND", "MEDIA_STORAGE_OPTIONS", "MEDIA_ROOT"):
+        get_media_storage.cache_clear()
+
+
+setting_changed.connect(reset_media_storage)
+
 
 def upload_file_to_s3(file, folder, filename=None):
     """
-    Uploads a file to AWS S3 and returns the saved file path and URL.
+    Uploads a file to media storage and returns the saved file path and URL.
+
+    The file is streamed from its current location (memory or the upload's
+    temporary file on disk); S3 receives files above AWS_S3_MULTIPART_THRESHOLD
+    as multipart chunks, so memory use stays bounded whatever the file size.
 
-    :param file: A file-like object (e.g., InMemoryUploadedFile).
-    :param folder: The folder (prefix) on S3 where the file sholud be stored.
+    :param file: A Django File (e.g., InMemoryUploadedFile, TemporaryUploadedFile).
+    :param folder: The folder (prefix) on S3 where the file should be stored.
     :param filename: Optional custom filename. If not provided, uses file.name.
     :return: (saved_file_path, file_url)
     """
 
-    # Create an S3 storage instance
-    storage = S3Boto3Storage(bucket_name=settings.AWS_STORAGE_BUCKET_NAME)
+    storage = get_media_storage()
 
     # Use provided filename or default to the original file name
     filename = filename or file.name
@@ -21,13 +51,119 @@ def upload_file_to_s3(file, folder, filename=None):
     # Build the full file path
     file_path = f"{folder}/{filename}"
 
-    # Read the file content and wrap it in a ContentFile
-    content_file = ContentFile(file.read())
+    # Rewind in case the caller already read the file
+    file.seek(0)
 
-    # Save the file to S3
-    saved_file_path = storage.save(file_path, content_file)
+    # Save the file to storage without reading it into memory
+    saved_file_path = storage.save(file_path, file)
 
     # Retrieve the URL for the saved file
     file_url = storage.url(saved_file_path)
 
-    return saved_file_path, file_url
\ No newline at end of file
+    return saved_file_path, file_url
+
+
+def supports_direct_upload():
+    """Direct uploads need an S3-compatible storage (AWS S3, MinIO, ...)"""
+
+    return hasattr(get_media_storage(), 'bucket_name')
+
+
+def create_presigned_upload(key, content_type, max_size, expires_in):
+    """
+    Presigns a browser-style POST upload of one object to `key`.
+
+    The signed policy pins the key and Content-Type and caps the size at
+    `max_size` bytes, so the storage rejects anything else.
+    Returns {"url", "fields"}: POST the fields plus a "file" part to the URL.
+    """
+
+    storage = get_media_storage()
+    client = storage.connection.meta.client
+    return client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        # Adds the storage's location prefix, as storage.save() would
+        Key=storage._normalize_name(clean_name(key)),
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, max_size],
+        ],
+        ExpiresIn=expires_in,
+    )
+
+
+def create_presigned_download(key, filename, expires_in):
+    """
+    Presigns a GET of one object, downloaded as `filename`.
+    Returns None for storages without presigning (serve the file instead).
+    """
+
+    storage = get_media_storage()
+    if not hasattr(storage, 'bucket_name'):
+        return None
+    return storage.connection.meta.client.generate_presigned_url(
+        'get_object',
+        Params={
+            "Bucket": storage.bucket_name,
+            "Key": storage._normalize_name(clean_name(key)),
+            "ResponseContentDisposition": f'attachment; filename="{filename}"',
+        },
+        ExpiresIn=expires_in,
+    )
+
+def delete_stored_files(keys):
+    """
+    Deletes up to 1000 keys from media storage. On S3 this is a single
+    DeleteObjects request; other backends delete one file at a time.
+    Returns {key: error message} for the keys that could not be deleted.
+    """
+
+    storage = get_media_storage()
+    errors = {}
+
+    if not hasattr(storage, 'bucket_name'):
+        for key in keys:
+            try:
+                storage.delete(key)
+            except Exception as e:
+                errors[key] = str(e)
+        return errors
+
+    names = {storage._normalize_name(clean_name(key)): key for key in keys}
+    response = storage.connection.meta.client.delete_objects(
+        Bucket=storage.bucket_name,
+        Delete={"Objects": [{"Key": name} for name in names], "Quiet": True},
+    )
+    for error in response.get("Errors", []):
+        errors[names.get(error["Key"], error["Key"])] = error.get("Message", error.get("Code", ""))
+    return errors
+
+
+def iter_stored_files(prefix):
+    """
+    Yields (key, last modified) for every file under `prefix` in media
+    storage: a paginated listing on S3 (1000 keys per request), a directory
+    walk for local storage.
+    """
+
+    storage = get_media_storage()
+
+    if hasattr(storage, 'bucket_name'):
+        # Keys are listed with the storage's location prefix (AWS_LOCATION)
+        location = f"{storage.location.strip('/')}/" if storage.location else ""
+        paginator = storage.connection.meta.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=storage.bucket_name, Prefix=location + prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(location):], item["LastModified"]
+        return
+
+    root = storage.path('')
+    for directory, _, names in os.walk(os.path.join(root, prefix)):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                modified = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            yield os.path.relpath(path, root).replace(os.sep, '/'), datetime.fromtimestamp(modified, timezone.utc)
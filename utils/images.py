@@ -0,0 +1,74 @@
+from PIL import Image, ImageOps
+
+# EXIF orientations that rotate the image by 90 or 270 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+EXIF_ORIENTATION = 0x0112
+
+
+class ImageTooLarge(ValueError):
+    """Raised for images above the pixel-count ceiling (MEDIA_MAX_PIXELS)"""
+
+
+def get_display_size(image):
+    """Returns (width, height) after applying EXIF orientation, from the header only"""
+
+    width, height = image.size
+    if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def check_pixels(image, max_pixels):
+    """Rejects images above `max_pixels` before anything is decoded"""
+
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge(
+            f"Image is {width}x{height}; the limit is {max_pixels // 1_000_000} megapixels.")
+
+
+def check_image_file(file, max_pixels):
+    """Reads an upload's header and enforces the pixel ceiling; no decoding"""
+
+    file.seek(0)
+    with Image.open(file) as image:
+        check_pixels(image, max_pixels)
+    file.seek(0)
+
+
+def decode_image(file, max_edge=None, max_pixels=None):
+    """
+    Decodes an image once, at the smallest scale that still covers `max_edge`
+    on its longest side:
+    - Enforces the pixel ceiling from the header, before decoding
+    - JPEGs use draft mode, so the decoder scales by 1/2, 1/4 or 1/8 (DCT
+      scaling) instead of materializing every pixel
+    - Applies EXIF orientation
+
+    Returns (image, format, full_size), where full_size is the oriented size
+    of the original, independent of any draft scaling.
+    """
+
+    image = Image.open(file)
+    check_pixels(image, max_pixels)
+    image_format = image.format
+    full_size = get_display_size(image)
+
+    if max_edge and max(image.size) > max_edge:
+        ratio = max_edge / max(image.size)
+        image.draft(None, (max(1, int(image.width * ratio)), max(1, int(image.height * ratio))))
+
+    # In place: avoids the full-size copy exif_transpose() otherwise returns
+    ImageOps.exif_transpose(image, in_place=True)
+    return image, image_format, full_size
+
+
+def fit_image(image, max_edge):
+    """Returns a copy resized so its longest side is `max_edge` (never enlarges)"""
+
+    if max(image.size) <= max_edge:
+        return image.copy()
+    ratio = max_edge / max(image.size)
+    size = (max(1, round(image.width * ratio)), max(1, round(image.height * ratio)))
+    # reducing_gap: box-reduce by an integer factor first, then resample
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
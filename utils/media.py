@@ -0,0 +1,492 @@
+import io
+import os
+import uuid
+import hashlib
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.utils import timezone
+from uploads.models import DirectUpload, MediaBlob
+from utils.aws import get_media_storage, upload_file_to_s3
+from utils.images import ImageTooLarge, check_image_file, decode_image, fit_image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif')
+
+# Formats derivatives are written in (others are converted to JPEG)
+OUTPUT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+# Extra formats each derivative can be stored in, best first
+VARIANT_CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+@lru_cache(maxsize=None)
+def get_upload_executor():
+    """
+    Returns the process-wide thread pool for media uploads.
+    Shared by all requests, so MEDIA_UPLOAD_WORKERS bounds the total number
+    of uploads in flight per process.
+    """
+
+    return ThreadPoolExecutor(
+        max_workers=settings.MEDIA_UPLOAD_WORKERS, thread_name_prefix='media-upload')
+
+
+def get_media_type(filename):
+    return 'image' if filename.lower().endswith(IMAGE_EXTENSIONS) else 'video'
+
+
+def get_variant_formats():
+    """Configured variant formats (MEDIA_VARIANT_FORMATS) this Pillow build can write"""
+
+    Image.init()
+    return [
+        variant_format for variant_format in settings.MEDIA_VARIANT_FORMATS
+        if variant_format.upper() in Image.SAVE
+    ]
+
+
+def encode_image(image, image_format, **params):
+    """Encodes an image in `image_format`, converting modes it cannot store"""
+
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif image_format in ('WEBP', 'AVIF') and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **params)
+    return buffer.getvalue()
+
+
+def save_rendition(image, image_format, folder, filename, **params):
+    """Encodes and uploads one rendition; returns {"path", "bytes"}"""
+
+    data = encode_image(image, image_format, **params)
+    saved_path, url = upload_file_to_s3(ContentFile(data), folder=folder, filename=filename)
+    logger.info(f"Rendition saved to storage: {url}")
+    return {"path": saved_path, "bytes": len(data)}
+
+
+def build_derivatives(path, folder):
+    """
+    Generates the MEDIA_DERIVATIVES ladder for a stored image.
+
+    Returns {name: {"path", "width", "height", "bytes", "variants"}}, where
+    variants holds a {"path", "bytes"} copy of the rung per format in
+    MEDIA_VARIANT_FORMATS (e.g. WebP). Rungs at least as large as the
+    original point at the original instead of upscaling it. The original
+    is decoded once at reduced scale (see utils.images.decode_image), and
+    each rung is resized from the next larger one.
+    """
+
+    storage = get_media_storage()
+    rungs = sorted(settings.MEDIA_DERIVATIVES.items(), key=lambda rung: -rung[1])
+    variant_formats = get_variant_formats()
+
+    # Decoded once, only as large as the biggest rung needs
+    with storage.open(path, 'rb') as original:
+        original_bytes = original.size
+        image, image_format, full_size = decode_image(
+            original, max_edge=rungs[0][1], max_pixels=settings.MEDIA_MAX_PIXELS)
+        image.load()
+
+    image_format = image_format if image_format in OUTPUT_EXTENSIONS else 'JPEG'
+    stem = os.path.splitext(os.path.basename(path))[0]
+    derivatives_folder = f"{folder}/derivatives"
+
+    def save_variants(rendition, name):
+        return {
+            variant_format: save_rendition(
+                rendition, variant_format.upper(), derivatives_folder,
+                f"{stem}_{name}.{variant_format}", quality=settings.MEDIA_VARIANT_QUALITY)
+            for variant_format in variant_formats
+        }
+
+    derivatives = {}
+    original_rung = None
+    source = image
+    for name, size in rungs:
+        if max(full_size) <= size:
+            # Every rung this large shares the original and its variants
+            if original_rung is None:
+                original_rung = {
+                    "path": path, "width": full_size[0], "height": full_size[1],
+                    "bytes": original_bytes, "variants": save_variants(image, "original"),
+                }
+            derivatives[name] = original_rung
+            continue
+
+        rendition = fit_image(source, size)
+        source = rendition
+
+        saved = save_rendition(
+            rendition, image_format, derivatives_folder,
+            f"{stem}_{name}{OUTPUT_EXTENSIONS[image_format]}")
+        derivatives[name] = {
+            **saved, "width": rendition.width, "height": rendition.height,
+            "variants": save_variants(rendition, name),
+        }
+
+    return derivatives
+
+
+def get_derivative_paths(derivatives):
+    """Every storage key in a derivatives dict, variants included"""
+
+    paths = set()
+    for rung in derivatives.values():
+        paths.add(rung["path"])
+        paths.update(variant["path"] for variant in rung.get("variants", {}).values())
+    return paths
+
+
+def get_accepted_formats(request):
+    """
+    Variant formats the client asked for, best first: an explicit
+    ?image_format=webp, otherwise image types listed in the Accept header.
+    """
+
+    if request is None:
+        return []
+    explicit = request.GET.get('image_format')
+    if explicit:
+        return [explicit.lower()]
+    accept = request.META.get('HTTP_ACCEPT', '')
+    return [
+        variant_format for variant_format, content_type in VARIANT_CONTENT_TYPES.items()
+        if content_type in accept
+    ]
+
+
+def pick_rendition(rung, formats):
+    """Returns (path, format, bytes) of a rung's best variant among `formats`"""
+
+    variants = rung.get("variants", {})
+    for variant_format in formats:
+        if variant_format in variants:
+            variant = variants[variant_format]
+            return variant["path"], variant_format, variant["bytes"]
+    base_format = os.path.splitext(rung["path"])[1].lstrip('.').lower()
+    return rung["path"], base_format, rung.get("bytes")
+
+
+def get_derivative_urls(derivatives):
+    """Maps stored derivatives to {name: {"url", "width", "height", "bytes", "variants"}}"""
+
+    storage = get_media_storage()
+    return {
+        name: {
+            "url": storage.url(rung["path"]),
+            "width": rung["width"],
+            "height": rung["height"],
+            "bytes": rung.get("bytes"),
+            "variants": {
+                variant_format: {"url": storage.url(variant["path"]), "bytes": variant["bytes"]}
+                for variant_format, variant in rung.get("variants", {}).items()
+            },
+        }
+        for name, rung in derivatives.items()
+    }
+
+
+def get_derivative_url(derivatives, name, request):
+    """URL of one rung in the client's preferred format, or None"""
+
+    if name not in derivatives:
+        return None
+    path, _, _ = pick_rendition(derivatives[name], get_accepted_formats(request))
+    return get_media_storage().url(path)
+
+
+def get_srcset(derivatives, request):
+    """
+    srcset-style list of the derivatives in the client's preferred format,
+    smallest first: [{"url", "width", "height", "format", "bytes"}, ...]
+    """
+
+    storage = get_media_storage()
+    formats = get_accepted_formats(request)
+
+    srcset = {}
+    for rung in derivatives.values():
+        path, rendition_format, size = pick_rendition(rung, formats)
+        srcset[path] = {
+            "url": storage.url(path),
+            "width": rung["width"],
+            "height": rung["height"],
+            "format": rendition_format,
+            "bytes": size,
+        }
+    return sorted(srcset.values(), key=lambda entry: entry["width"])
+
+
+def get_file_hash(file):
+    """
+    SHA-256 of an upload. Computed while the request streamed in
+    (uploads.handlers); other files are read once, chunk by chunk.
+    """
+
+    sha256 = getattr(file, 'sha256', None)
+    if sha256:
+        return sha256
+
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def inspect_media_file(index, file):
+    """
+    Hashes one upload and checks it can be accepted; nothing is stored yet.
+    Runs on the upload pool; must not touch the database.
+    """
+
+    result = {
+        "index": index,
+        "name": file.name,
+        "media_type": get_media_type(file.name),
+        "sha256": None,
+        "blob": None,
+        "path": None,
+        "error": None,
+    }
+
+    if result["media_type"] == 'image':
+        try:
+            check_image_file(file, settings.MEDIA_MAX_PIXELS)
+        except ImageTooLarge as e:
+            result["error"] = str(e)
+            return result
+        except Exception:
+            # Not decodable here; stored as-is and marked failed by the worker
+            pass
+
+    result["sha256"] = get_file_hash(file)
+    return result
+
+
+def store_media_file(file, sha256):
+    """
+    Uploads new content under its content-addressed key,
+    blobs/<sha[:2]>/<sha[2:4]>/<sha><ext>. Runs on the upload pool.
+    """
+
+    extension = os.path.splitext(file.name)[1].lower()
+    saved_path, url = upload_file_to_s3(
+        file, folder=f"blobs/{sha256[:2]}/{sha256[2:4]}", filename=f"{sha256}{extension}")
+    logger.info(f"File uploaded to storage: {url}")
+    return saved_path
+
+
+def register_blob(sha256, path, size, media_type):
+    """
+    Records freshly uploaded content. If a concurrent request registered the
+    same content first, its blob wins and our copy is removed (unless both
+    were written to the same key).
+    """
+
+    blob, created = MediaBlob.objects.get_or_create(
+        sha256=sha256,
+        defaults={"path": path, "size": size, "media_type": media_type},
+    )
+    if not created and blob.path != path:
+        get_media_storage().delete(path)
+    return blob
+
+
+def adopt_blob(path, media_type):
+    """
+    Deduplicates a file that was uploaded straight to storage: hashes it by
+    streaming it back (in the worker, not the web process), then either
+    registers it or drops it in favour of an existing blob with the same
+    content. Takes one reference on the returned blob.
+    """
+
+    digest = hashlib.sha256()
+    with get_media_storage().open(path, 'rb') as stored:
+        for chunk in stored.chunks():
+            digest.update(chunk)
+        size = stored.size
+
+    blob = register_blob(digest.hexdigest(), path, size, media_type)
+    acquire_blobs([blob.id])
+    return blob
+
+
+def acquire_blobs(blob_ids):
+    """Adds one reference per ID (repeat an ID to add several)"""
+
+    by_count = {}
+    for blob_id, count in Counter(blob_ids).items():
+        by_count.setdefault(count, []).append(blob_id)
+    for count, ids in by_count.items():
+        MediaBlob.objects.filter(id__in=ids).update(ref_count=F('ref_count') + count)
+
+
+def release_blobs(blob_ids):
+    """
+    Drops one reference per ID. Blobs reaching zero references are
+    collected later (uploads.cleanup), after MEDIA_GC_GRACE.
+    """
+
+    for blob_id in blob_ids:
+        MediaBlob.objects.filter(id=blob_id, ref_count__gt=0).update(
+            ref_count=F('ref_count') - 1, released_at=timezone.now())
+
+
+def get_blob_media_fields(blob, media_type):
+    """
+    Initial processing state of a media row backed by `blob`: images whose
+    content already has derivatives are ready at once; other images are
+    queued for the derivative worker. Direct uploads (no blob yet) are
+    queued too, so the worker can deduplicate them.
+    """
+
+    if blob is None:
+        return {"processing_status": 'processing', "derivatives": {}, "thumbnail": ''}
+    if media_type != 'image':
+        return {"processing_status": 'ready', "derivatives": {}, "thumbnail": ''}
+    if blob.derivatives:
+        return {
+            "processing_status": 'ready',
+            "derivatives": blob.derivatives,
+            "thumbnail": blob.derivatives.get('thumbnail', {}).get('path', ''),
+        }
+    return {"processing_status": 'processing', "derivatives": {}, "thumbnail": ''}
+
+
+def build_blob_derivatives(blob, folder):
+    """Derivatives of a blob, generated on first use and shared by its duplicates"""
+
+    # Another upload of the same content may have generated them meanwhile
+    blob.refresh_from_db(fields=['derivatives'])
+    if not blob.derivatives:
+        blob.derivatives = build_derivatives(blob.path, folder)
+        blob.save(update_fields=['derivatives'])
+    return blob.derivatives
+
+
+def upload_media_files(files):
+    """
+    Stores a request's files, deduplicated by content:
+    - Files are hashed and checked concurrently on the shared upload pool
+    - Content already stored (by anyone) is not uploaded again
+    - New content is uploaded once, even if sent twice in the request
+
+    Returns one result dict per file, in request order:
+    {"index", "name", "media_type", "sha256", "blob", "path", "error"}
+    A failed file has "error" set; the others are unaffected. Callers take
+    references on the blobs they attach (acquire_blobs).
+    """
+
+    executor = get_upload_executor()
+    results = list(executor.map(inspect_media_file, range(len(files)), files))
+
+    hashes = {result["sha256"] for result in results if not result["error"]}
+    blobs = MediaBlob.objects.in_bulk(hashes, field_name='sha256')
+
+    pending = {}
+    for result, file in zip(results, files):
+        if not result["error"] and result["sha256"] not in blobs:
+            pending.setdefault(result["sha256"], (result, file))
+
+    futures = {
+        sha256: executor.submit(store_media_file, file, sha256)
+        for sha256, (_, file) in pending.items()
+    }
+    for sha256, future in futures.items():
+        result, file = pending[sha256]
+        try:
+            blobs[sha256] = register_blob(sha256, future.result(), file.size, result["media_type"])
+        except Exception as e:
+            logger.error(f"Error uploading file {file.name}: {e}")
+
+    for result in results:
+        if result["error"]:
+            continue
+        result["blob"] = blobs.get(result["sha256"])
+        if result["blob"] is None:
+            result["error"] = "Upload failed."
+        else:
+            result["path"] = result["blob"].path
+
+    return results
+
+
+def get_upload_ids(data):
+    """Direct upload IDs sent with a request, as JSON or form data"""
+
+    if hasattr(data, 'getlist'):
+        return data.getlist('upload_ids')
+    return data.get('upload_ids') or []
+
+
+def claim_direct_uploads(user, upload_ids, start_index=0):
+    """
+    Confirms a user's direct uploads (uploads.models.DirectUpload) by ID.
+
+    Returns one result per ID in the same shape as upload_media_files, with
+    indexes from `start_index`. Slots that are unknown, expired, already
+    confirmed, unfinished or never uploaded to get "error". Presigned
+    uploads are hashed and deduplicated later by the media worker, so this
+    only costs a HEAD request per file; resumable ones arrive with their
+    blob.
+    """
+
+    valid_ids = []
+    for upload_id in upload_ids:
+        try:
+            valid_ids.append(uuid.UUID(str(upload_id)))
+        except ValueError:
+            pass
+    slots = DirectUpload.objects.filter(
+        id__in=valid_ids, user=user, status='pending', expires_at__gt=timezone.now()
+    ).select_related('blob').in_bulk()
+
+    storage = get_media_storage()
+    results = []
+    for index, upload_id in enumerate(upload_ids, start=start_index):
+        result = {
+            "index": index,
+            "name": str(upload_id),
+            "media_type": None,
+            "sha256": None,
+            "blob": None,
+            "path": None,
+            "error": None,
+        }
+        results.append(result)
+
+        try:
+            slot = slots.get(uuid.UUID(str(upload_id)))
+        except ValueError:
+            slot = None
+        if slot is None:
+            result["error"] = "Unknown or expired upload."
+            continue
+
+        result["name"] = slot.filename
+        result["media_type"] = slot.media_type
+        # Resumable uploads are already deduplicated by the assembly worker
+        if slot.blob is None and not storage.exists(slot.key):
+            result["error"] = "File was not uploaded."
+            continue
+
+        # Atomic, so a slot is attached at most once
+        claimed = DirectUpload.objects.filter(id=slot.id, status='pending').update(status='confirmed')
+        if not claimed:
+            result["error"] = "Unknown or expired upload."
+            continue
+        result["blob"] = slot.blob
+        result["path"] = slot.blob.path if slot.blob else slot.key
+
+    return results